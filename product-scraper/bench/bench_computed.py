@@ -0,0 +1,85 @@
+"""Time JSON dumps and repeated derived-field access over a product catalogue.
+
+Reads a stored catalogue dump (a JSON array of VinmonopolProduct records) when
+`--input` is given, otherwise generates `--products` synthetic products for
+each retailer.
+
+    python bench/bench_computed.py --input vinmonopol_products.json
+    python bench/bench_computed.py --products 5000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+from synth import make_product, make_systembolaget_product
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from systembolaget import Systembolagetprodukt  # noqa: E402
+from vinmonopolet import VinmonopolProduct  # noqa: E402
+
+VINMONOPOLET_FIELDS = ("parsed_size", "price_per_liter", "alcohol_per_nok")
+SYSTEMBOLAGET_FIELDS = ("price_per_liter", "alcohol_per_sek", "category", "origin")
+
+
+def timed(label: str, products, fields, repeat: int) -> None:
+    start = time.perf_counter()
+    for product in products:
+        product.model_dump_json()
+    dump = time.perf_counter() - start
+
+    # Reading derived fields off a model, outside of a dump
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for product in products:
+            for field in fields:
+                getattr(product, field)
+    access = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for product in products:
+        product.model_dump_json()
+    redump = time.perf_counter() - start
+
+    per_product = 1e6 / len(products)
+    print(
+        f"{label:<14}{dump * per_product:>12.1f}"
+        f"{access * per_product / repeat:>16.2f}{redump * per_product:>16.1f}"
+        f"{(dump + access + redump) * 1e3:>12.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", type=Path, help="stored Vinmonopolet dump")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    else:
+        raw = [make_product(str(i), rng) for i in range(args.products)]
+    vinmonopolet = [VinmonopolProduct(**p) for p in raw]
+    systembolaget = [
+        Systembolagetprodukt(**make_systembolaget_product(str(i), rng))
+        for i in range(len(raw))
+    ]
+
+    print(f"products: {len(raw)}, field reads per product: {args.repeat}")
+    print(
+        f"{'model':<14}{'dump us/prod':>12}{'access us/prod':>16}"
+        f"{'redump us/prod':>16}{'total ms':>12}"
+    )
+    timed("Vinmonopolet", vinmonopolet, VINMONOPOLET_FIELDS, args.repeat)
+    timed("Systembolaget", systembolaget, SYSTEMBOLAGET_FIELDS, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
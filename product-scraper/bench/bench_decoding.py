@@ -0,0 +1,59 @@
+"""Per-product cost of the legacy latin-1 decode + process_object repair pass
+compared with decoding page bytes as UTF-8 once.
+
+    python bench/bench_decoding.py --products 1000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+from synth import make_product, render_page
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from parse import parse_product_html, process_object  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = [
+        (str(i), render_page(make_product(str(i), rng)))
+        for i in range(10000, 10000 + args.products)
+    ]
+
+    start = time.perf_counter()
+    legacy = [parse_product_html(pid, body.decode("iso-8859-1")) for pid, body in pages]
+    legacy_parse = time.perf_counter() - start
+    start = time.perf_counter()
+    legacy = [process_object(p) for p in legacy]
+    repair = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded = [parse_product_html(pid, body.decode("utf-8")) for pid, body in pages]
+    byte_level = time.perf_counter() - start
+
+    identical = all(
+        json.loads(a.model_dump_json()) == json.loads(b.model_dump_json())
+        for a, b in zip(legacy, decoded)
+    )
+    per_product = 1e6 / args.products
+    print(f"products: {args.products}, identical results: {identical}")
+    print(f"legacy decode + parse     {legacy_parse * per_product:8.1f} us/product")
+    print(f"process_object pass       {repair * per_product:8.1f} us/product")
+    print(f"utf-8 decode + parse      {byte_level * per_product:8.1f} us/product")
+    print(
+        f"saved per product         "
+        f"{(legacy_parse + repair - byte_level) * per_product:8.1f} us"
+    )
+
+
+if __name__ == "__main__":
+    main()
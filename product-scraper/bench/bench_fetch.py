@@ -0,0 +1,61 @@
+"""Compare the serial crawl path with the async fetch engine against the stub server.
+
+    python bench/bench_fetch.py --products 500 --latency 0.05 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from stub_server import start_server
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pages", type=Path, help="directory of saved <id>.html pages")
+    args = parser.parse_args()
+
+    server = start_server(0, args.pages, args.latency)
+    # config reads this at import time, so it must be set before importing src
+    os.environ["PRODUCT_PAGE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/p"
+    sys.path.insert(0, str(SRC_DIR))
+    from main import process_single_product, stream_products
+
+    product_ids = [str(1001 + i) for i in range(args.products)]
+
+    start = time.perf_counter()
+    serial = [p for p in map(process_single_product, product_ids) if p]
+    serial_time = time.perf_counter() - start
+
+    async def crawl():
+        return [
+            p
+            async for p in stream_products(
+                product_ids, concurrency=args.concurrency, rate_limit=0
+            )
+        ]
+
+    start = time.perf_counter()
+    concurrent = asyncio.run(crawl())
+    async_time = time.perf_counter() - start
+
+    print(f"{'mode':<8}{'products':>10}{'seconds':>10}{'pages/s':>10}")
+    for mode, found, elapsed in [
+        ("serial", len(serial), serial_time),
+        ("async", len(concurrent), async_time),
+    ]:
+        print(f"{mode:<8}{found:>10}{elapsed:>10.2f}{args.products / elapsed:>10.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Load time and peak RSS for a stored catalogue, per loading strategy.
+
+Writes `--products` synthetic products to a compacted store (unless
+`--input` points at an existing one), then loads it in a fresh interpreter
+per strategy so peak RSS is not shared between them:
+
+    models   VinmonopolProduct(**p) for every stored record
+    records  dataset.load_records (read-only ProductRecord, no validation)
+    columns  dataset.load_columns, cold and from the .npz snapshot
+
+    python bench/bench_load.py --products 20000
+"""
+
+import argparse
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from synth import make_product
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from dataset import load_columns, load_records  # noqa: E402
+from storage import ProductStore  # noqa: E402
+from vinmonopolet import VinmonopolProduct  # noqa: E402
+
+STRATEGIES = ["models", "records", "columns-cold", "columns-snapshot"]
+
+
+def load(strategy: str, path: Path) -> int:
+    if strategy == "models":
+        return len([VinmonopolProduct(**p) for p in ProductStore(path).load()])
+    if strategy == "records":
+        return len(load_records(path))
+    snapshot = path.with_suffix(".columns.npz")
+    if strategy == "columns-cold" and snapshot.exists():
+        snapshot.unlink()
+    return len(load_columns("Vinmonopolet", path))
+
+
+def generate(products: int, path: Path) -> None:
+    rng = random.Random(0)
+    with ProductStore(path) as store:
+        for i in range(products):
+            store.append(VinmonopolProduct(**make_product(str(10000 + i), rng)))
+    store.compact()
+
+
+def measure(strategy: str, path: Path) -> None:
+    """Child process entry point: load once, report seconds and peak RSS."""
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    count = load(strategy, path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux
+    print(
+        f"{strategy:<18}{count:>9}{elapsed:>10.3f}{peak / 1024:>11.1f}"
+        f"{(peak - baseline) / 1024:>12.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--input", type=Path, help="existing compacted store")
+    parser.add_argument("--measure", choices=STRATEGIES, help=argparse.SUPPRESS)
+    parser.add_argument("--generate", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.input)
+        return
+    if args.generate:
+        generate(args.generate, args.input)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.input
+        if path is None:
+            path = Path(directory) / "vinmonopol_products.json"
+            # Generated in a child too: peak RSS is inherited across fork/exec
+            subprocess.run(
+                [sys.executable, __file__, "--generate", str(args.products)]
+                + ["--input", path],
+                check=True,
+            )
+        print(f"{path.stat().st_size / 2**20:.1f} MiB store")
+        print(
+            f"{'strategy':<18}{'products':>9}{'seconds':>10}{'peak MiB':>11}"
+            f"{'+MiB load':>12}"
+        )
+        for strategy in STRATEGIES:
+            subprocess.run(
+                [sys.executable, __file__, "--measure", strategy, "--input", path],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Match synthetic Vinmonopolet and Systembolaget catalogues and score the result.
+
+Both catalogues draw from one pool of products; a share of them is listed in
+both markets with the spelling differences seen between the two sites
+(legal forms, accents, vintage in the name, split product names). Reports
+precision and recall against the known pairs, a full build and an
+incremental update after a simulated crawl.
+
+    python bench/bench_matching.py --left 20000 --right 25000 --shared 6000
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from dataset import ProductColumns  # noqa: E402
+from matching import MatchTable, match_products  # noqa: E402
+
+SYLLABLES = ["ba", "ro", "lo", "mon", "tal", "ci", "no", "ri", "vel", "sa", "to"]
+STYLES = ["Riserva", "Reserva", "Brut", "Rosé", "Classico", "Superiore", "Cuvée"]
+GRAPES = ["Sangiovese", "Nebbiolo", "Tempranillo", "Riesling", "Pinot Noir", "Syrah"]
+FORMS = ["", " AS", " AB", " S.A.", " SRL", " GmbH", " & Co"]
+VOLUMES = [0.375, 0.5, 0.7, 0.75, 0.75, 0.75, 1.5, 3.0]
+
+
+def word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).title()
+
+
+def make_pool(count: int, rng: random.Random):
+    producers = [f"{word(rng)} {word(rng)}" for _ in range(count // 8 + 1)]
+    pool = []
+    for _ in range(count):
+        pool.append(
+            {
+                "producer": rng.choice(producers),
+                "name": f"{word(rng)} {rng.choice(GRAPES)} {rng.choice(STYLES)}",
+                "volume": rng.choice(VOLUMES),
+                "abv": round(rng.uniform(5.0, 40.0) * 2) / 2,
+                "vintage": rng.choice(["", "2018", "2019", "2020", "2021"]),
+            }
+        )
+    return pool
+
+
+def vinmonopolet_listing(product, rng: random.Random):
+    year = f" {product['vintage']}" if product["vintage"] else ""
+    return {
+        "name": f"{product['producer']} {product['name']}{year}",
+        "producer": product["producer"] + rng.choice(FORMS),
+        "vintage": product["vintage"],
+        "volume": product["volume"],
+        "abv": product["abv"],
+    }
+
+
+def systembolaget_listing(product, rng: random.Random):
+    name = product["name"].replace("é", "e") if rng.random() < 0.5 else product["name"]
+    return {
+        "name": name,
+        "producer": product["producer"] + rng.choice(FORMS),
+        "vintage": product["vintage"] if rng.random() < 0.8 else "",
+        "volume": product["volume"],
+        # Listings round the ABV differently now and then
+        "abv": product["abv"] + rng.choice([0.0, 0.0, 0.0, 0.1, -0.1]),
+    }
+
+
+def columns(listings, prefix: str) -> ProductColumns:
+    count = len(listings)
+    return ProductColumns(
+        code=np.array([f"{prefix}{i}" for i in range(count)]),
+        name=np.array([p["name"] for p in listings]),
+        category=np.full(count, ""),
+        country=np.full(count, ""),
+        producer=np.array([p["producer"] for p in listings]),
+        vintage=np.array([p["vintage"] for p in listings]),
+        price=np.full(count, 100.0),
+        volume=np.array([p["volume"] for p in listings]),
+        alcohol_percentage=np.array([p["abv"] for p in listings]),
+        alcohol_per_unit=np.full(count, np.nan),
+        available=np.ones(count, dtype=bool),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--left", type=int, default=20000)
+    parser.add_argument("--right", type=int, default=25000)
+    parser.add_argument("--shared", type=int, default=6000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pool = make_pool(args.left + args.right - args.shared, rng)
+    left_pool = pool[: args.left]
+    right_pool = pool[: args.shared] + pool[args.left :]
+    rng.shuffle(right_pool)
+    right_index = {id(p): i for i, p in enumerate(right_pool)}
+    truth = {
+        f"v{i}": f"s{right_index[id(p)]}" for i, p in enumerate(pool[: args.shared])
+    }
+
+    left = match_products(
+        columns([vinmonopolet_listing(p, rng) for p in left_pool], "v")
+    )
+    right = match_products(
+        columns([systembolaget_listing(p, rng) for p in right_pool], "s")
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "product_matches.json"
+        table = MatchTable(path)
+        start = time.perf_counter()
+        table.update(left, right)
+        build = time.perf_counter() - start
+        table.save()
+
+        found = {
+            m.vinmonopolet_code: m.systembolaget_id for m in table.matches.values()
+        }
+        correct = sum(1 for code, sid in found.items() if truth.get(code) == sid)
+        print(f"{len(left)} x {len(right)} products, {len(truth)} truly shared")
+        print(f"full build       {build:8.2f} s, {len(found)} matches")
+        print(f"precision        {correct / max(len(found), 1):8.3f}")
+        print(f"recall           {correct / len(truth):8.3f}")
+
+        # A later crawl: a few hundred new Systembolaget listings, some changes
+        for product in rng.sample(right, 200):
+            product.alcohol_percentage += 0.5
+        start = time.perf_counter()
+        stats = MatchTable(path).update(left, right)
+        print(f"incremental      {time.perf_counter() - start:8.2f} s, {stats}")
+
+
+if __name__ == "__main__":
+    main()
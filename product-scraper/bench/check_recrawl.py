@@ -0,0 +1,149 @@
+"""Check that re-crawls pick up products that changed, against the stub server.
+
+Each scenario crawls a small synthetic catalogue in a fresh directory, changes
+a product's price on the stub server and crawls again, then checks what the
+product store holds. Exits non-zero if any scenario fails.
+
+    python bench/check_recrawl.py
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from stub_server import start_server
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+PRODUCT_ID = "1003"
+NEW_PRICE = 1.0
+
+
+def stored_price(product_id: str):
+    from storage import ProductStore
+
+    price = None
+    for record in ProductStore("vinmonopol_products.json").iter_raw():
+        if record["code"] == product_id:
+            price = (record.get("price") or {}).get("value")
+    return price
+
+
+def change_price(prices: Dict[str, float]) -> None:
+    prices[PRODUCT_ID] = NEW_PRICE
+    # As if the cached catalogue pages had expired
+    shutil.rmtree("catalogue_cache", ignore_errors=True)
+
+
+def changed_only(prices: Dict[str, float]) -> List[str]:
+    """`--changed-only` scrapes a product whose catalogue price changed."""
+    from main import process_products
+
+    process_products(restart=True)
+    change_price(prices)
+    # Out of time before any page: the change must still be seen next run
+    process_products(restart=False, changed_only=True, deadline=time.time())
+    price = stored_price(PRODUCT_ID)
+    if price == NEW_PRICE:
+        return ["price changed by a run that scraped nothing"]
+    process_products(restart=False, changed_only=True)
+    price = stored_price(PRODUCT_ID)
+    if price != NEW_PRICE:
+        return [f"stored price {price} after --changed-only, want {NEW_PRICE}"]
+    return []
+
+
+def rerun(prices: Dict[str, float]) -> List[str]:
+    """A crawl after a finished one, without `--restart`, fetches every page."""
+    from main import process_products
+
+    process_products(restart=True)
+    change_price(prices)
+    process_products(restart=False)
+    price = stored_price(PRODUCT_ID)
+    if price != NEW_PRICE:
+        return [f"stored price {price} after a second crawl, want {NEW_PRICE}"]
+    return []
+
+
+def outcomes() -> Counter:
+    from metrics import metrics
+
+    return Counter(
+        {
+            dict(labels)["outcome"]: n
+            for labels, n in metrics.counters["products_total"].items()
+        }
+    )
+
+
+def conditional(prices: Dict[str, float]) -> List[str]:
+    """`--conditional` re-parses the changed page and only that one."""
+    from main import process_products
+    from metrics import metrics
+
+    metrics.enable("metrics.json")
+    process_products(restart=True, conditional=True)
+    change_price(prices)
+    before = outcomes()
+    process_products(restart=False, conditional=True)
+    run = outcomes() - before
+    problems = []
+    if run["stored"] != 1:
+        problems.append(f"{run['stored']} pages re-parsed, want 1")
+    if not run["unchanged"]:
+        problems.append("no page found unchanged")
+    price = stored_price(PRODUCT_ID)
+    if price != NEW_PRICE:
+        problems.append(f"stored price {price} after --conditional, want {NEW_PRICE}")
+    return problems
+
+
+SCENARIOS: Dict[str, Callable[[Dict[str, float]], List[str]]] = {
+    "changed-only": changed_only,
+    "rerun": rerun,
+    "conditional": conditional,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--catalogue-size", type=int, default=50)
+    parser.add_argument(
+        "scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)}; default all"
+    )
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+
+    prices: Dict[str, float] = {}
+    server = start_server(catalogue_size=args.catalogue_size, prices=prices)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["PRODUCT_PAGE_URL"] = f"{base_url}/p"
+    os.environ["CATALOGUE_URL"] = f"{base_url}/products/v0/details-normal"
+    os.environ["PRICE_HISTORY_PATH"] = ""
+
+    failed = 0
+    cwd = os.getcwd()
+    for name in args.scenarios or SCENARIOS:
+        prices.clear()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                problems = SCENARIOS[name](prices)
+            finally:
+                os.chdir(cwd)
+        print(f"{name}: {'ok' if not problems else 'FAILED'}")
+        for problem in problems:
+            print(f"  {problem}")
+        failed += bool(problems)
+    server.shutdown()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,100 @@
+"""Check every HTML extractor against golden results and time them per page.
+
+Golden files `corpus/<id>.json` hold the product the reference BeautifulSoup
+parser produces for `corpus/<id>.html` (`null` when it finds none). Pass
+`--update` to regenerate them after an intentional parser change.
+
+    python bench/compare_extractors.py
+    python bench/compare_extractors.py --synthetic 500 --repeat 3
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+from synth import make_product, render_page
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+from extract import EXTRACTORS  # noqa: E402
+from parse import parse_product_html  # noqa: E402
+
+
+def parse_to_json(product_id: str, html: str, extractor: str):
+    product = parse_product_html(product_id, html, extractor)
+    return json.loads(product.model_dump_json()) if product else None
+
+
+def available_extractors():
+    names = []
+    for name in EXTRACTORS:
+        try:
+            EXTRACTORS[name]("<html></html>")
+        except ImportError:
+            print(f"Skipping {name}: not installed")
+            continue
+        names.append(name)
+    return names
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", type=Path, default=BENCH_DIR / "corpus")
+    parser.add_argument("--update", action="store_true", help="rewrite golden files")
+    parser.add_argument(
+        "--synthetic", type=int, default=200, help="extra generated pages to time"
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    pages = {p.stem: p.read_text(encoding="utf-8") for p in args.corpus.glob("*.html")}
+
+    if args.update:
+        for product_id, html in pages.items():
+            golden = parse_to_json(product_id, html, "bs4")
+            with open(args.corpus / f"{product_id}.json", "w", encoding="utf-8") as f:
+                json.dump(golden, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {len(pages)} golden files")
+        return
+
+    extractors = available_extractors()
+    mismatches = 0
+    for product_id, html in sorted(pages.items()):
+        with open(args.corpus / f"{product_id}.json", "r", encoding="utf-8") as f:
+            golden = json.load(f)
+        for name in extractors:
+            if parse_to_json(product_id, html, name) != golden:
+                print(f"MISMATCH {name} on {product_id}")
+                mismatches += 1
+    print(f"{len(pages)} golden pages, {mismatches} mismatches")
+
+    rng = random.Random(0)
+    timed = list(pages.items()) + [
+        (str(i), render_page(make_product(str(i), rng)).decode("utf-8"))
+        for i in range(10000, 10000 + args.synthetic)
+    ]
+    print(f"{'extractor':<10}{'extract ms/page':>16}{'parse ms/page':>15}")
+    for name in extractors:
+        extract = EXTRACTORS[name]
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for _, html in timed:
+                extract(html)
+        extract_ms = (time.perf_counter() - start) * 1000 / (len(timed) * args.repeat)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for product_id, html in timed:
+                parse_product_html(product_id, html, name)
+        parse_ms = (time.perf_counter() - start) * 1000 / (len(timed) * args.repeat)
+        print(f"{name:<10}{extract_ms:>16.3f}{parse_ms:>15.3f}")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Local stand-in for www.vinmonopolet.no product pages and catalogue API.
+
+Serves `GET /p/<product_id>` from `<pages>/<product_id>.html` when a saved
+page exists and otherwise from a synthetic page seeded by the product ID, with
+an optional artificial latency and rate of 503 responses. Given a capacity,
+product page requests beyond that many at once get a 429 with Retry-After, as
+from a rate-limited site. Responses carry an ETag and honour If-None-Match.
+Point the scraper at it with `PRODUCT_PAGE_URL=http://127.0.0.1:8765/p`. The
+details-normal catalogue API is served at `/products/v0/details-normal` (set
+`CATALOGUE_URL`) and Systembolaget's paginated product search at
+`/sb-api-ecommerce/v1/productsearch/search` (set `SYSTEMBOLAGET_SEARCH_URL`).
+
+    python bench/stub_server.py --port 8765 --latency 0.05
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from synth import (
+    MISSING_PAGE,
+    make_catalogue_record,
+    make_product,
+    make_systembolaget_product,
+    render_page,
+    with_price,
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs
+    # add ~40ms to every keep-alive response
+    disable_nagle_algorithm = True
+    pages_dir: Optional[Path] = None
+    latency = 0.0
+    error_rate = 0.0
+    catalogue_size = 1000
+    systembolaget_size = 1000
+    # Free product page slots, if the server has a capacity
+    slots: Optional[threading.Semaphore] = None
+    # Price of a product ID in place of its synthetic one, on its page and in
+    # the catalogue; change it while serving to simulate a price change
+    prices: Dict[str, float] = {}
+
+    def do_GET(self) -> None:
+        slots = self.slots if self.path.startswith("/p/") else None
+        if slots is not None and not slots.acquire(blocking=False):
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        try:
+            status, body = self.route(self.path)
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            if slots is not None:
+                slots.release()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        self.send_response(status)
+        # The real site sends no charset, which is why requests decodes as latin-1
+        self.send_header("Content-Type", "text/html")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self, path: str):
+        url = urlsplit(path)
+        if url.path == "/products/v0/details-normal":
+            return self.catalogue_page(parse_qs(url.query))
+        if url.path == "/sb-api-ecommerce/v1/productsearch/search":
+            if self.error_rate and random.random() < self.error_rate:
+                return 503, b"Service Unavailable"
+            return self.search_page(parse_qs(url.query))
+
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "p" or not parts[1].isdigit():
+            return 404, MISSING_PAGE
+        product_id = parts[1]
+
+        if self.error_rate and random.random() < self.error_rate:
+            return 503, b"Service Unavailable"
+
+        if self.pages_dir is not None:
+            saved = self.pages_dir / f"{product_id}.html"
+            if saved.exists():
+                return 200, saved.read_bytes()
+
+        rng = random.Random(int(product_id))
+        if rng.random() < 0.02:
+            return 404, MISSING_PAGE
+        return 200, render_page(self.product(product_id, rng))
+
+    def product(self, product_id: str, rng: random.Random):
+        product = make_product(product_id, rng)
+        if product_id in self.prices:
+            product = with_price(product, self.prices[product_id])
+        return product
+
+    def catalogue_page(self, query: Dict[str, List[str]]):
+        start = int(query.get("start", ["0"])[0])
+        size = int(query.get("maxResults", ["100"])[0])
+        # A few low IDs stand in for the bags and gift cards the scraper skips
+        ids = [str(i) for i in range(100, 105)] + [
+            str(1001 + i) for i in range(self.catalogue_size)
+        ]
+        records = [
+            make_catalogue_record(self.product(pid, random.Random(int(pid))))
+            for pid in ids[start : start + size]
+        ]
+        return 200, json.dumps(records, ensure_ascii=False).encode("utf-8")
+
+    def search_page(self, query: Dict[str, List[str]]):
+        page = int(query.get("page", ["1"])[0])
+        size = int(query.get("size", ["30"])[0])
+        start = (page - 1) * size
+        end = min(start + size, self.systembolaget_size)
+        products = [
+            make_systembolaget_product(str(5000000 + i), random.Random(i))
+            for i in range(start, end)
+        ]
+        metadata = {
+            "docCount": self.systembolaget_size,
+            "nextPage": page + 1 if end < self.systembolaget_size else -1,
+        }
+        body = {"metadata": metadata, "products": products}
+        return 200, json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def start_server(
+    port: int = 0,
+    pages_dir: Optional[Path] = None,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    catalogue_size: int = 1000,
+    systembolaget_size: int = 1000,
+    capacity: int = 0,
+    prices: Optional[Dict[str, float]] = None,
+) -> ThreadingHTTPServer:
+    """Start the stub server on a background thread; port 0 picks a free port.
+
+    `prices` is read on every request, so changes to it show up right away.
+    """
+    handler = type(
+        "ConfiguredStubHandler",
+        (StubHandler,),
+        {
+            "pages_dir": pages_dir,
+            "latency": latency,
+            "error_rate": error_rate,
+            "catalogue_size": catalogue_size,
+            "systembolaget_size": systembolaget_size,
+            "slots": threading.Semaphore(capacity) if capacity else None,
+            "prices": {} if prices is None else prices,
+        },
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=Path, help="directory of saved <id>.html pages")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per response"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="fraction of 503 responses"
+    )
+    parser.add_argument("--catalogue-size", type=int, default=1000)
+    parser.add_argument("--systembolaget-size", type=int, default=1000)
+    parser.add_argument(
+        "--capacity",
+        type=int,
+        default=0,
+        help="product page requests served at once; more get a 429",
+    )
+    args = parser.parse_args()
+
+    server = start_server(
+        args.port,
+        args.pages,
+        args.latency,
+        args.error_rate,
+        args.catalogue_size,
+        args.systembolaget_size,
+        args.capacity,
+    )
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"Serving product pages on {base_url}/p")
+    print(f"Serving the catalogue API on {base_url}/products/v0/details-normal")
+    print(
+        "Serving Systembolaget search on "
+        f"{base_url}/sb-api-ecommerce/v1/productsearch/search"
+    )
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
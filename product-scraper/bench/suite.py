@@ -0,0 +1,310 @@
+"""Benchmark the whole product pipeline offline, with a comparable JSON report.
+
+For each catalogue size, a fresh interpreter renders synthetic product pages
+(see `synth.py`) in chunks and times every stage on them: page decoding, HTML
+extraction, JSON decoding, pydantic validation, the full `parse_product_page`,
+the legacy `process_object` repair, dumping to a `ProductStore`, and loading
+the store back as models, read-only records and an `analyse`-style frame.
+Peak RSS is recorded after each stage. The recorded pages in `corpus/` are
+checked against their golden products first, and a short crawl against the
+stub server measures end-to-end pages/s over loopback. Reports of two commits
+are compared with `--compare`:
+
+    python bench/suite.py --sizes 1000 10000 --output before.json
+    python bench/suite.py --sizes 1000 10000 --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from synth import make_product, render_page
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+# In pipeline order
+STAGES = [
+    "decode",
+    "extract",
+    "json",
+    "validate",
+    "parse",
+    "process_object",
+    "dump",
+    "load_models",
+    "load_records",
+    "load_frame_cold",
+    "load_frame_snapshot",
+]
+
+
+def peak_rss_mib() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_size(products: int, chunk_size: int) -> Dict[str, Any]:
+    """Child process entry point: time every stage for one catalogue size."""
+    from comparison import load_frame
+    from dataset import load_records
+    from extract import extract_page
+    from parse import decode_page, parse_product_html, parse_product_page
+    from parse import process_object
+    from storage import ProductStore
+    from vinmonopolet import VinmonopolProduct
+
+    seconds: Dict[str, float] = defaultdict(float)
+    rss: Dict[str, float] = {}
+    rng = random.Random(0)
+
+    def timed(stage: str, function, items):
+        start = time.perf_counter()
+        results = [function(item) for item in items]
+        seconds[stage] += time.perf_counter() - start
+        rss[stage] = peak_rss_mib()
+        return results
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "vinmonopol_products.json"
+        store = ProductStore(path, compact_every=0)
+        for first in range(0, products, chunk_size):
+            ids = [
+                str(10000 + i) for i in range(first, min(first + chunk_size, products))
+            ]
+            pages = [(pid, render_page(make_product(pid, rng))) for pid in ids]
+
+            htmls = timed("decode", lambda p: decode_page(p[1]), pages)
+            extracted = timed("extract", extract_page, htmls)
+            data = timed("json", lambda e: json.loads(e.react_props), extracted)
+            timed("validate", lambda d: VinmonopolProduct(**d["product"]), data)
+            parsed = timed("parse", lambda p: parse_product_page(*p), pages)
+
+            legacy = [
+                parse_product_html(pid, body.decode("iso-8859-1"))
+                for pid, body in pages
+            ]
+            timed("process_object", process_object, legacy)
+            timed("dump", store.append, parsed)
+        start = time.perf_counter()
+        store.close()
+        seconds["dump"] += time.perf_counter() - start
+        rss["dump"] = peak_rss_mib()
+        size_mib = path.stat().st_size / 2**20
+
+        # Loading stages time one call each over the whole store
+        def load_frame_from_store(_):
+            snapshots = {"Vinmonopolet": [path]}
+            return load_frame(("Vinmonopolet",), snapshots=snapshots)
+
+        timed(
+            "load_models",
+            lambda _: [VinmonopolProduct(**r) for r in ProductStore(path).load()],
+            [None],
+        )
+        timed("load_records", lambda _: load_records(path), [None])
+        path.with_suffix(".columns.npz").unlink(missing_ok=True)
+        timed("load_frame_cold", load_frame_from_store, [None])
+        timed("load_frame_snapshot", load_frame_from_store, [None])
+
+    return {
+        "products": products,
+        "store_mib": round(size_mib, 2),
+        "stages": {
+            stage: {
+                "seconds": round(seconds[stage], 4),
+                "us_per_item": round(seconds[stage] / products * 1e6, 2),
+                "items_per_second": round(products / seconds[stage], 1)
+                if seconds[stage]
+                else None,
+                "peak_rss_mib": round(rss[stage], 1),
+            }
+            for stage in STAGES
+        },
+    }
+
+
+def check_corpus() -> Dict[str, Any]:
+    """Parse the recorded pages and compare them with their golden products."""
+    from compare_extractors import parse_to_json
+    from config import HTML_EXTRACTOR
+
+    mismatches = []
+    pages = sorted((BENCH_DIR / "corpus").glob("*.html"))
+    for page in pages:
+        with open(page.with_suffix(".json"), "r", encoding="utf-8") as f:
+            golden = json.load(f)
+        html = page.read_text(encoding="utf-8")
+        if parse_to_json(page.stem, html, HTML_EXTRACTOR) != golden:
+            mismatches.append(page.stem)
+    return {"pages": len(pages), "mismatches": mismatches}
+
+
+def run_crawl(products: int, concurrency: int) -> Dict[str, Any]:
+    """Child process entry point: crawl the stub server with the async engine."""
+    from stub_server import start_server
+
+    server = start_server(0, BENCH_DIR / "corpus")
+    # config reads this at import time, so it must be set before importing src
+    os.environ["PRODUCT_PAGE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/p"
+    from main import stream_outcomes
+
+    async def crawl() -> int:
+        ids = [str(10000 + i) for i in range(products)]
+        outcomes = stream_outcomes(ids, concurrency, rate_limit=0)
+        return len([outcome async for outcome in outcomes if outcome.product])
+
+    start = time.perf_counter()
+    found = asyncio.run(crawl())
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    return {
+        "products": products,
+        "parsed": found,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(products / elapsed, 1),
+        "peak_rss_mib": round(peak_rss_mib(), 1),
+    }
+
+
+def child(*args: str) -> Dict[str, Any]:
+    """Run a measurement in a fresh interpreter, so peak RSS is its own."""
+    output = subprocess.run(
+        [sys.executable, __file__, *args], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--", str(BENCH_DIR.parent)],
+            cwd=BENCH_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def environment() -> Dict[str, Any]:
+    import numpy
+    import pydantic
+
+    return {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pydantic": pydantic.VERSION,
+        "numpy": numpy.__version__,
+    }
+
+
+def print_report(
+    report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None
+) -> None:
+    env = report["environment"]
+    print(f"commit {env['commit']}, Python {env['python']}, {env['cpu_count']} CPUs")
+    corpus = report["corpus"]
+    print(
+        f"corpus: {corpus['pages']} recorded pages, "
+        f"{len(corpus['mismatches'])} mismatches {corpus['mismatches'] or ''}"
+    )
+    old_sizes = {s["products"]: s for s in (baseline or {}).get("sizes", [])}
+    for size in report["sizes"]:
+        old = old_sizes.get(size["products"])
+        print(f"\n{size['products']} products, {size['store_mib']} MiB store")
+        header = (
+            f"{'stage':<22}{'seconds':>9}{'us/item':>10}{'items/s':>11}{'peak MiB':>10}"
+        )
+        print(header + (f"{'vs base':>9}" if old else ""))
+        for stage in STAGES:
+            s = size["stages"][stage]
+            line = (
+                f"{stage:<22}{s['seconds']:>9.3f}{s['us_per_item']:>10.1f}"
+                f"{s['items_per_second'] or 0:>11.0f}{s['peak_rss_mib']:>10.1f}"
+            )
+            if old and old["stages"].get(stage, {}).get("us_per_item"):
+                ratio = s["us_per_item"] / old["stages"][stage]["us_per_item"]
+                line += f"{ratio:>8.2f}x"
+            print(line)
+    crawl = report.get("crawl")
+    if crawl:
+        old = (baseline or {}).get("crawl")
+        print(
+            f"\ncrawl: {crawl['products']} pages from the stub server in "
+            f"{crawl['seconds']:.2f} s, {crawl['pages_per_second']:.0f} pages/s"
+            + (f" (base {old['pages_per_second']:.0f})" if old else "")
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument(
+        "--crawl", type=int, default=500, help="pages to crawl; 0 to skip"
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", type=Path, help="report file (JSON)")
+    parser.add_argument("--compare", type=Path, help="earlier report to compare with")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--run-crawl", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size:
+        print(json.dumps(run_size(args.run_size, args.chunk_size)))
+        return
+    if args.run_crawl:
+        print(json.dumps(run_crawl(args.run_crawl, args.concurrency)))
+        return
+
+    report: Dict[str, Any] = {"environment": environment(), "corpus": check_corpus()}
+    sizes: List[Dict[str, Any]] = []
+    for products in args.sizes:
+        print(f"Benchmarking {products} products...", file=sys.stderr)
+        sizes.append(
+            child("--run-size", str(products), "--chunk-size", str(args.chunk_size))
+        )
+    report["sizes"] = sizes
+    if args.crawl:
+        report["crawl"] = child(
+            "--run-crawl", str(args.crawl), "--concurrency", str(args.concurrency)
+        )
+
+    output = args.output or Path(f"bench-{report['environment']['commit']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"\nReport written to {output}")
+    sys.exit(1 if report["corpus"]["mismatches"] else 0)
+
+
+if __name__ == "__main__":
+    main()
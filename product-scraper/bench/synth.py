@@ -0,0 +1,275 @@
+"""Synthetic Vinmonopolet product data and pages for offline benchmarks.
+
+Pages mimic the parts of the real product page that `parse.py` reads: the
+ld+json script, the expired price marker, the alcohol summary and the
+`data-react-props` blob on `main.site__body`. Text deliberately contains
+non-ASCII characters and pages are served without a charset, like the site.
+"""
+
+import html
+import json
+import random
+from typing import Any, Dict
+
+CATEGORIES = [
+    ("rødvin", "Rødvin"),
+    ("hvitvin", "Hvitvin"),
+    ("musserende_vin", "Musserende vin"),
+    ("øl", "Øl"),
+    ("brennevin", "Brennevin"),
+]
+COUNTRIES = [
+    ("italia", "Italia"),
+    ("frankrike", "Frankrike"),
+    ("spania", "Spania"),
+    ("norge", "Norge"),
+    ("østerrike", "Østerrike"),
+]
+VOLUMES = ["75 cl", "33 cl", "50 cl", "70 cl", "150 cl", "3 l", "500 ml"]
+
+
+def _named(code: str, name: str, kind: str) -> Dict[str, str]:
+    return {
+        "code": code,
+        "name": name,
+        "searchQuery": f":relevance:{kind}:{code}",
+        "url": f"/search?q=:relevance:{kind}:{code}",
+    }
+
+
+def _price(value: float) -> Dict[str, Any]:
+    formatted = f"{value:.2f}".replace(".", ",")
+    return {
+        "formattedValue": f"Kr {formatted}",
+        "readableValue": f"{formatted} kroner",
+        "value": value,
+    }
+
+
+def make_product(product_id: str, rng: random.Random) -> Dict[str, Any]:
+    """Return a product dict in the camelCase shape of the site's react props."""
+    category = rng.choice(CATEGORIES)
+    country = rng.choice(COUNTRIES)
+    size = rng.choice(VOLUMES)
+    litres = (
+        float(size.split()[0]) * {"cl": 0.01, "ml": 0.001, "l": 1.0}[size.split()[1]]
+    )
+    abv = round(rng.uniform(4.0, 45.0), 1)
+    price = round(rng.uniform(30.0, 900.0), 2)
+    producer = f"Produsent {rng.randint(1, 500)} Søn & Co"
+    abv_text = f"{abv:g}".replace(".", ",")
+
+    return {
+        "ageLimit": 18 if abv < 22 else 20,
+        "allergens": rng.choice([None, "Sulfitt"]),
+        "bioDynamic": rng.random() < 0.05,
+        "buyable": True,
+        "code": product_id,
+        "color": "Dyp rød, fiolett rand",
+        "content": {
+            "characteristics": [
+                {"name": "Fylde", "readableValue": "Fylde 8 av 12", "value": "8"},
+            ],
+            "ingredients": [
+                {
+                    "code": "druer",
+                    "formattedValue": "Sangiovese 100%",
+                    "readableValue": "Sangiovese 100 prosent",
+                }
+            ],
+            "isGoodFor": [{"code": "B", "name": "Storfe"}],
+            "storagePotential": {"code": "K02", "formattedValue": "Drikkeklar nå"},
+            "style": {
+                "code": "rødvin_frisk",
+                "description": "Frisk og fruktig",
+                "name": "Frisk og fruktig",
+            },
+            "traits": [
+                {"formattedValue": size, "name": "Størrelse", "readableValue": size},
+                {
+                    "formattedValue": f"{abv_text}%",
+                    "name": "Alkohol",
+                    "readableValue": f"{abv_text} prosent",
+                },
+            ],
+        },
+        "cork": rng.choice([None, "Naturkork", "Skrukork"]),
+        "description": "Vinen har en fin fruktighet og en lang, elegant avslutning.",
+        "distributor": "Vinmonopolets Distribusjon",
+        "distributorId": rng.randint(1, 20),
+        "district": _named("toscana", "Toscana", "district"),
+        "eco": rng.random() < 0.1,
+        "environmentalPackaging": False,
+        "expired": rng.random() < 0.1,
+        "fairTrade": False,
+        "gluten": False,
+        "images": [
+            {
+                "altText": f"Produktbilde {product_id}",
+                "format": "product",
+                "imageType": "PRIMARY",
+                "url": f"https://bilder.vinmonopolet.no/cache/515x515-0/{product_id}-1.jpg",
+            }
+        ],
+        "kosher": False,
+        "litrePrice": _price(round(price / litres, 2)),
+        "mainCategory": {"code": category[0], "name": category[1]},
+        "mainCountry": _named(country[0], country[1], "mainCountry"),
+        "mainProducer": _named(f"p{product_id}", producer, "mainProducer"),
+        "name": f"Vin {product_id} Rosé Brut Årgang",
+        "packageType": "Flaske",
+        "price": _price(price),
+        "productSelection": rng.choice(["Basisutvalget", "Bestillingsutvalget"]),
+        "releaseMode": False,
+        "similarProducts": True,
+        "smell": "Duft av mørke bær, krydder og fat.",
+        "status": rng.choice(["aktiv", "utgått"]),
+        "statusNotification": False,
+        "summary": "Frisk og fruktig rødvin.",
+        "sustainable": False,
+        "taste": "Frisk, fruktig smak med innslag av kirsebær.",
+        "url": f"/p/{product_id}",
+        "volume": {
+            "formattedValue": size,
+            "readableValue": size,
+            "value": round(litres * 100, 2),
+        },
+        "wholeSaler": "Vinforhandler Ærlig AS",
+        "year": rng.choice([None, "2019", "2020", "2021"]),
+    }
+
+
+def with_price(product: Dict[str, Any], value: float) -> Dict[str, Any]:
+    """A copy of a product made by `make_product` with a different price."""
+    litres = product["volume"]["value"] / 100
+    return {
+        **product,
+        "price": _price(value),
+        "litrePrice": _price(round(value / litres, 2)),
+    }
+
+
+def make_catalogue_record(product: Dict[str, Any]) -> Dict[str, Any]:
+    """The details-normal API record for a product made by `make_product`."""
+    abv = product["content"]["traits"][1]["readableValue"].split()[0]
+    return {
+        "basic": {
+            "productId": product["code"],
+            "productShortName": product["name"],
+            "productLongName": product["name"],
+            "volume": product["volume"]["value"] / 100,
+            "alcoholContent": float(abv.replace(",", ".")),
+            "vintage": int(product["year"]) if product["year"] else 0,
+            "ageLimit": product["ageLimit"],
+            "productStatusSaleName": product["status"],
+        },
+        "classification": {
+            "mainProductTypeName": product["mainCategory"]["name"],
+            "productTypeName": product["mainCategory"]["name"],
+        },
+        "origins": {
+            "origin": {
+                "country": product["mainCountry"]["name"],
+                "region": product["district"]["name"],
+            }
+        },
+        "prices": [{"salesPrice": product["price"]["value"]}],
+    }
+
+
+def render_page(product: Dict[str, Any]) -> bytes:
+    """Render a product dict into the HTML shape `parse_product_html` expects."""
+    ld_json = {
+        "@context": "https://schema.org",
+        "@type": "Product",
+        "name": product["name"],
+        "brand": {"@type": "Brand", "name": product["mainProducer"]["name"]},
+        "sku": product["code"],
+    }
+    abv = product["content"]["traits"][1]["readableValue"].split()[0]
+    expired = (
+        '<div class="product-price-expired">Utgått</div>' if product["expired"] else ""
+    )
+    props = html.escape(
+        json.dumps({"product": product}, ensure_ascii=False), quote=True
+    )
+
+    page = f"""<!DOCTYPE html>
+<html lang="no">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(product["name"])} | Vinmonopolet</title>
+<script type="application/ld+json">{json.dumps(ld_json, ensure_ascii=False)}</script>
+</head>
+<body>
+<header class="site__header"><nav><a href="/">Vinmonopolet</a></nav></header>
+<main class="site__body" data-react-props="{props}">
+<div class="product">
+<h1 class="product__name">{html.escape(product["name"])}</h1>
+{expired}
+<ul class="product__tab-list">
+<li><strong>Alkohol</strong> <span aria-label="{abv} prosent">{abv} %</span></li>
+<li><strong>Land</strong> <span>{html.escape(product["mainCountry"]["name"])}</span></li>
+</ul>
+<p class="product__description">{html.escape(product["description"])}</p>
+</div>
+</main>
+<footer class="site__footer"><p>Vinmonopolet AS</p></footer>
+</body>
+</html>
+"""
+    return page.encode("utf-8")
+
+
+MISSING_PAGE = b"""<!DOCTYPE html>
+<html lang="no"><head><meta charset="utf-8"><title>Finner ikke siden</title></head>
+<body><main class="site__body"><h1>Finner ikke siden</h1></main></body></html>
+"""
+
+
+SYSTEMBOLAGET_CATEGORIES = [
+    ("Vin", "Rött vin", "Fruktigt & Smakrikt"),
+    ("Vin", "Vitt vin", "Friskt & Fruktigt"),
+    ("Öl", "Ljus lager", None),
+    ("Sprit", "Whisky", "Maltwhisky"),
+    ("Cider & blanddrycker", "Cider", None),
+]
+
+
+def make_systembolaget_product(product_id: str, rng: random.Random) -> Dict[str, Any]:
+    """Return a product dict in the shape of Systembolaget's search API."""
+    level1, level2, level3 = rng.choice(SYSTEMBOLAGET_CATEGORIES)
+    volume = rng.choice([330, 500, 700, 750, 1500])
+    return {
+        "productId": product_id,
+        "productNumber": f"{product_id}01",
+        "productNumberShort": product_id,
+        "productNameBold": f"Produkt {product_id}",
+        "productNameThin": rng.choice([None, "Årgång", "Rosé Brut"]),
+        "categoryLevel1": level1,
+        "categoryLevel2": level2,
+        "categoryLevel3": level3,
+        "categoryLevel4": None,
+        "assortmentText": rng.choice(["Fast sortiment", "Ordervaror"]),
+        "originLevel1": rng.choice([None, "Toscana", "Skåne"]),
+        "originLevel2": None,
+        "country": rng.choice(["Sverige", "Italien", "Frankrike", "Österrike"]),
+        "producerName": f"Producent {rng.randint(1, 500)} & Söner",
+        "alcoholPercentage": round(rng.uniform(4.0, 45.0), 1),
+        "volume": volume,
+        "volumeText": f"{volume} ml",
+        "price": round(rng.uniform(15.0, 900.0), 2),
+        "isOrganic": rng.random() < 0.1,
+        "isCompletelyOutOfStock": rng.random() < 0.05,
+        "isDiscontinued": False,
+        "productLaunchDate": "2021-03-01T00:00:00",
+        "grapes": ["Sangiovese"],
+        "tasteSymbols": ["Nöt", "Fläsk"],
+        "images": [
+            {
+                "fileType": "png",
+                "imageUrl": f"https://product-cdn.systembolaget.se/{product_id}",
+                "size": None,
+            }
+        ],
+    }
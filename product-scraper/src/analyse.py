@@ -1,78 +1,50 @@
 from dataclasses import dataclass
-import json
-from typing import List, Dict, Any
+from typing import Dict
 
 import plotly.express as px
 import plotly.graph_objects as go
-from sklearn.linear_model import LinearRegression
 import numpy as np
 
-from vinmonopolet import VinmonopolProduct
-from systembolaget import Systembolagetprodukt
-
-
-def load_data() -> Dict[str, List[Any]]:
-    with open("vinmonopol_products.json", "r", encoding="utf-8") as f:
-        vinmonopol_products: List[VinmonopolProduct] = [
-            VinmonopolProduct(**p) for p in json.load(f)
-        ]
-    print(f"Loaded {len(vinmonopol_products)} products from Vinmonopolet")
-    vinmonopol_products = [p for p in vinmonopol_products if not p.expired]
-
-    with open("systembolaget_products.json", "r", encoding="utf-8") as f:
-        systembolaget_products: List[Systembolagetprodukt] = [
-            Systembolagetprodukt(**p) for p in json.load(f)
-        ]
-    print(f"Loaded {len(systembolaget_products)} products from Systembolaget")
-    systembolaget_products = [
-        p
-        for p in systembolaget_products
-        if not (p.is_completely_out_of_stock or p.is_discontinued)
-    ]
-
-    return {
-        "name": [p.name for p in vinmonopol_products]
-        + [p.full_name for p in systembolaget_products],
-        "alcohol_per_unit": [p.alcohol_per_nok for p in vinmonopol_products]
-        + [
-            p.alcohol_per_sek
-            for p in systembolaget_products
-            if p.alcohol_per_sek is not None
-        ],
-        "alcohol_percentage": [p.alcohol_per_nok for p in vinmonopol_products]
-        + [
-            p.alcohol_percentage
-            for p in systembolaget_products
-            if p.alcohol_percentage is not None
-        ],
-        "source": ["Vinmonopolet"] * len(vinmonopol_products)
-        + ["Systembolaget"] * len(systembolaget_products),
-    }
-
-
-def perform_regression_analysis(
-    df: Dict[str, List[Any]]
-) -> Dict[str, Dict[str, float]]:
-    results = {}
-    for source in ["Vinmonopolet", "Systembolaget"]:
-        mask = np.array(df["source"]) == source
-        X = np.array(df["alcohol_percentage"])[mask].reshape(-1, 1)
-        y = np.array(df["alcohol_per_unit"])[mask]
+from comparison import (
+    Frame,
+    compare_matched,
+    grouped_regression,
+    load_frame,
+    top_products,
+)
+from matching import update_matches
+
+
+def load_data() -> Frame:
+    df = load_frame(currency="NOK")
+    for source, count in zip(*np.unique(df["source"], return_counts=True)):
+        print(f"Loaded {count} available products from {source}")
+    return df
+
+
+def source_mask(df: Frame, source: str) -> np.ndarray:
+    """Rows of `source` that have both plotted values."""
+    return (
+        (df["source"] == source)
+        & ~np.isnan(df["alcohol_percentage"])
+        & ~np.isnan(df["alcohol_per_unit"])
+    )
 
-        model = LinearRegression()
-        model.fit(X, y)
 
-        results[source] = {
-            "slope": model.coef_[0],
-            "intercept": model.intercept_,
-            "r_squared": model.score(X, y),
+def perform_regression_analysis(df: Frame) -> Dict[str, Dict[str, float]]:
+    groups = grouped_regression(df, keys=("source",))
+    return {
+        source: {
+            "slope": groups["slope"][i],
+            "intercept": groups["intercept"][i],
+            "r_squared": groups["r_squared"][i],
         }
-
-    return results
+        for i, source in enumerate(groups["source"])
+    }
 
 
 def create_scatter_plot(
-    df: Dict[str, List[Any]], regression_results: Dict[str, Dict[str, float]]
+    df: Dict[str, np.ndarray], regression_results: Dict[str, Dict[str, float]]
 ):
     fig = px.scatter(
         df,
@@ -84,9 +56,7 @@ def create_scatter_plot(
     )
 
     for source, color in [("Vinmonopolet", "red"), ("Systembolaget", "blue")]:
-        mask = np.array(df["source"]) == source
-        x = np.array(df["alcohol_percentage"])[mask]
-        y = np.array(df["alcohol_per_unit"])[mask]
+        x = df["alcohol_percentage"][source_mask(df, source)]
 
         slope = regression_results[source]["slope"]
         intercept = regression_results[source]["intercept"]
@@ -108,7 +78,7 @@ def create_scatter_plot(
     fig.update_layout(
         title=f"Products from Vinmonopolet and Systembolaget - Total products: {len(df['name'])}",
         xaxis_title="Alcohol percentage",
-        yaxis_title="Milliliters of pure alcohol per NOK/SEK",
+        yaxis_title="Milliliters of pure alcohol per NOK",
         hoverlabel=dict(namelength=-1),
     )
 
@@ -130,6 +100,21 @@ def main():
         print(f"  Intercept: {results['intercept']:.4f}")
         print(f"  R-squared: {results['r_squared']:.4f}")
 
+    print("\nMost alcohol per NOK across both markets:")
+    top = top_products(df, count=10)
+    for rank, name, source, value in zip(
+        top["rank"], top["name"], top["source"], top["alcohol_per_unit"]
+    ):
+        print(f"  {rank:>2}. {name} ({source}): {value:.3f} ml/NOK")
+
+    matched = compare_matched(df, *update_matches().pairs())
+    if len(matched["name"]):
+        print(
+            f"\n{len(matched['name'])} products sold in both markets; Vinmonopolet "
+            f"charges {np.median(matched['price_ratio']):.2f}x the Systembolaget "
+            "price (median)"
+        )
+
 
 if __name__ == "__main__":
     main()
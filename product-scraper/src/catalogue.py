@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Union
+
+from pydantic import BaseModel, Field
+
+from config import (
+    CATALOGUE_CACHE_MAX_AGE,
+    CATALOGUE_CONCURRENCY,
+    CATALOGUE_PAGE_SIZE,
+    CATALOGUE_URL,
+)
+from fetch import AsyncFetcher
+from storage import ProductStore
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogueProduct(BaseModel):
+    """Lightweight product record built from the details-normal API alone."""
+
+    product_id: str = Field(alias="productId")
+    name: Optional[str] = None
+    volume: Optional[float] = None
+    alcohol_content: Optional[float] = Field(alias="alcoholContent", default=None)
+    vintage: Optional[str] = None
+    age_limit: Optional[int] = Field(alias="ageLimit", default=None)
+    status: Optional[str] = None
+    main_category: Optional[str] = Field(alias="mainCategory", default=None)
+    product_type: Optional[str] = Field(alias="productType", default=None)
+    country: Optional[str] = None
+    region: Optional[str] = None
+    price: Optional[float] = None
+    # Hash of the raw API record, to tell whether the product changed
+    fingerprint: str
+
+    model_config = {"populate_by_name": True}
+
+    @classmethod
+    def from_api(cls, record: Dict[str, Any]) -> "CatalogueProduct":
+        basic = record.get("basic") or {}
+        classification = record.get("classification") or {}
+        origin = (record.get("origins") or {}).get("origin") or {}
+        prices = record.get("prices") or []
+        return cls(
+            product_id=basic["productId"],
+            name=basic.get("productLongName") or basic.get("productShortName"),
+            volume=basic.get("volume"),
+            alcohol_content=basic.get("alcoholContent"),
+            vintage=str(basic["vintage"]) if basic.get("vintage") else None,
+            age_limit=basic.get("ageLimit"),
+            status=basic.get("productStatusSaleName"),
+            main_category=classification.get("mainProductTypeName"),
+            product_type=classification.get("productTypeName"),
+            country=origin.get("country"),
+            region=origin.get("region"),
+            price=prices[-1].get("salesPrice") if prices else None,
+            fingerprint=fingerprint(record),
+        )
+
+
+def fingerprint(record: Dict[str, Any]) -> str:
+    return hashlib.sha1(
+        json.dumps(record, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def page_url(start: int, page_size: int) -> str:
+    return f"{CATALOGUE_URL}?start={start}&maxResults={page_size}"
+
+
+class CatalogueCache:
+    """Raw details-normal pages on disk, reused while younger than `max_age`."""
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = "catalogue_cache",
+        max_age: float = CATALOGUE_CACHE_MAX_AGE,
+    ):
+        self.directory = Path(directory)
+        self.max_age = max_age
+
+    def _path(self, start: int, page_size: int) -> Path:
+        return self.directory / f"details-normal-{start}-{page_size}.json"
+
+    def get(self, start: int, page_size: int) -> Optional[bytes]:
+        path = self._path(start, page_size)
+        if path.exists() and time.time() - path.stat().st_mtime < self.max_age:
+            return path.read_bytes()
+        return None
+
+    def put(self, start: int, page_size: int, body: bytes) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(start, page_size)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(body)
+        tmp_path.replace(path)
+
+
+async def fetch_catalogue(
+    page_size: int = CATALOGUE_PAGE_SIZE,
+    concurrency: int = CATALOGUE_CONCURRENCY,
+    cache: Optional[CatalogueCache] = None,
+    attempts: int = 3,
+) -> List[Dict[str, Any]]:
+    """Walk the whole details-normal API, `concurrency` pages at a time.
+
+    The total is unknown upfront, so pages are requested in waves until one
+    comes back short. A page that keeps failing aborts the load rather than
+    silently truncating the catalogue.
+    """
+    cache = cache or CatalogueCache()
+    pages: Dict[int, List[Dict[str, Any]]] = {}
+    start = 0
+
+    async with AsyncFetcher(concurrency=concurrency, rate_limit=0) as fetcher:
+        while True:
+            wave = [start + i * page_size for i in range(concurrency)]
+            missing = []
+            for page_start in wave:
+                cached = cache.get(page_start, page_size)
+                if cached is not None:
+                    pages[page_start] = json.loads(cached)
+                else:
+                    missing.append(page_start)
+
+            for attempt in range(1, attempts + 1):
+                if not missing:
+                    break
+                failed = []
+                requests_ = [(str(s), page_url(s, page_size)) for s in missing]
+                async for result in fetcher.fetch_many(requests_):
+                    page_start = int(result.key)
+                    if result.status == 404:
+                        pages[page_start] = []
+                    elif result.ok:
+                        pages[page_start] = json.loads(result.body)
+                        cache.put(page_start, page_size, result.body)
+                    else:
+                        failed.append(page_start)
+                missing = failed
+                if missing and attempt < attempts:
+                    await asyncio.sleep(2**attempt)
+            if missing:
+                raise RuntimeError(
+                    f"Failed to fetch catalogue pages starting at {sorted(missing)}"
+                )
+
+            logger.info(
+                f"Fetched catalogue pages up to {wave[-1] + page_size} "
+                f"({sum(len(pages[s]) for s in pages)} products)"
+            )
+            if any(len(pages[s]) < page_size for s in wave):
+                break
+            start = wave[-1] + page_size
+
+    return [record for page_start in sorted(pages) for record in pages[page_start]]
+
+
+def load_catalogue(**kwargs) -> List[Dict[str, Any]]:
+    return asyncio.run(fetch_catalogue(**kwargs))
+
+
+def refresh_catalogue(
+    records: List[Dict[str, Any]],
+    path: Union[str, Path] = "vinmonopol_catalogue.json",
+) -> List[CatalogueProduct]:
+    """Replace the stored lightweight records with ones built from `records`."""
+    store = ProductStore(path, key="productId")
+    products = [CatalogueProduct.from_api(record) for record in records]
+    store.clear()
+    with store:
+        for product in products:
+            store.append(product.model_dump(mode="json", by_alias=True))
+    logger.info(f"Stored {len(products)} catalogue records in {path}")
+    return products
+
+
+class ScrapedFingerprints:
+    """Catalogue fingerprint of each product when its page was last scraped.
+
+    Like page validators, a fingerprint is only recorded once the product
+    scraped for it has been stored, so a product whose catalogue record
+    changed keeps being selected for scraping until its page is.
+    """
+
+    def __init__(self, path: Union[str, Path] = "scraped_fingerprints.json"):
+        self.path = Path(path)
+        self.fingerprints: Dict[str, str] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.fingerprints = json.load(f)
+
+    def get(self, product_id: str) -> Optional[str]:
+        return self.fingerprints.get(product_id)
+
+    def set(self, product_id: str, fingerprint: str) -> None:
+        self.fingerprints[product_id] = fingerprint
+
+    def save(self) -> None:
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.fingerprints, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self) -> None:
+        self.fingerprints.clear()
+        self.path.unlink(missing_ok=True)
+
+
+def select_for_scraping(
+    products: List[CatalogueProduct],
+    scraped: ScrapedFingerprints,
+    stored_ids: Set[str],
+) -> List[str]:
+    """IDs whose page-only fields we lack: never scraped, or changed in the API
+    since their page was last scraped."""
+    return [
+        p.product_id
+        for p in products
+        if p.product_id not in stored_ids or scraped.get(p.product_id) != p.fingerprint
+    ]
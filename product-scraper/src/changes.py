@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set, Union
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PageValidator:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class ValidatorCache:
+    """ETag, Last-Modified and body hash of the last stored version of each page.
+
+    Validators are only recorded once the product parsed from that page has been
+    stored, so a page is never treated as unchanged unless the store already
+    holds what it would have produced.
+    """
+
+    def __init__(self, path: Union[str, Path] = "page_validators.json"):
+        self.path = Path(path)
+        self.validators: Dict[str, PageValidator] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.validators = {
+                    product_id: PageValidator(**v)
+                    for product_id, v in json.load(f).items()
+                }
+
+    def request_headers(self, product_id: str) -> Dict[str, str]:
+        """Conditional request headers for a page we have stored before."""
+        validator = self.validators.get(product_id)
+        headers = {}
+        if validator is not None:
+            if validator.etag:
+                headers["If-None-Match"] = validator.etag
+            if validator.last_modified:
+                headers["If-Modified-Since"] = validator.last_modified
+        return headers
+
+    def is_unchanged(self, product_id: str, status: int, body: bytes) -> bool:
+        validator = self.validators.get(product_id)
+        if validator is None:
+            return False
+        # Servers that ignore conditional headers still get caught by the hash
+        return status == 304 or (
+            status == 200 and content_hash(body) == validator.content_hash
+        )
+
+    def set(self, product_id: str, validator: PageValidator) -> None:
+        self.validators[product_id] = validator
+
+    def prune(self, keep: Set[str]) -> None:
+        """Forget validators for products that are no longer stored."""
+        self.validators = {
+            product_id: v
+            for product_id, v in self.validators.items()
+            if product_id in keep
+        }
+
+    def save(self) -> None:
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {product_id: asdict(v) for product_id, v in self.validators.items()},
+                f,
+            )
+        os.replace(tmp_path, self.path)
+
+    def reset(self) -> None:
+        self.validators.clear()
+        self.path.unlink(missing_ok=True)
+
+
+def page_validator(headers: Dict[str, str], body: bytes) -> PageValidator:
+    return PageValidator(
+        headers.get("ETag"), headers.get("Last-Modified"), content_hash(body)
+    )
+
+
+def snapshot(records: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Reduce stored product records to the fields the diff report tracks."""
+    return {
+        record["code"]: {
+            "name": record.get("name"),
+            "price": (record.get("price") or {}).get("value"),
+            "expired": record.get("expired"),
+            "status": record.get("status"),
+        }
+        for record in records
+    }
+
+
+def diff_snapshots(
+    before: Dict[str, Dict[str, Any]],
+    after: Dict[str, Dict[str, Any]],
+    catalogue_ids: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """Compare two snapshots by product code.
+
+    Products missing from `catalogue_ids` are reported as removed, even if an
+    older version is still in storage.
+    """
+    if catalogue_ids is not None:
+        catalogue = set(catalogue_ids)
+        after = {code: p for code, p in after.items() if code in catalogue}
+
+    changed = []
+    for code, new in after.items():
+        old = before.get(code)
+        if old is None:
+            continue
+        changes = {
+            field: [old[field], new[field]]
+            for field in ("price", "expired", "status")
+            if old[field] != new[field]
+        }
+        if changes:
+            changed.append({"code": code, "name": new["name"], "changes": changes})
+
+    return {
+        "added": sorted(code for code in after if code not in before),
+        "removed": sorted(code for code in before if code not in after),
+        "changed": changed,
+    }
+
+
+def write_diff_report(
+    report: Dict[str, Any], path: Union[str, Path] = "crawl_diff.json"
+) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(
+        f"Crawl diff: {len(report['added'])} added, {len(report['removed'])} removed, "
+        f"{len(report['changed'])} changed (written to {path})"
+    )
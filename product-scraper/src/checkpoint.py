@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import random
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Union
+
+logger = logging.getLogger(__name__)
+
+COMPLETED = "completed"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+@dataclass
+class CheckpointEntry:
+    product_id: str
+    state: str
+    attempts: int = 0
+    reason: Optional[str] = None
+    next_attempt_at: float = 0.0
+    updated_at: float = 0.0
+
+
+class Checkpoint:
+    """Crash-safe record of which product IDs a crawl has finished.
+
+    Every outcome is appended to a JSON Lines log and flushed immediately, so a
+    killed crawl loses at most the entry being written. Replaying the log (last
+    entry per ID wins) restores the state, and `rounds` schedules exactly the
+    IDs that still need work: never-attempted IDs first, then failed IDs whose
+    exponential backoff has expired, until they succeed or run out of attempts.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = "crawl_checkpoint.jsonl",
+        max_attempts: int = 4,
+        backoff_base: float = 30.0,
+        backoff_max: float = 15 * 60.0,
+    ):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.entries: Dict[str, CheckpointEntry] = {}
+        self._file = None
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = CheckpointEntry(**json.loads(line))
+                except (json.JSONDecodeError, TypeError):
+                    logger.warning(
+                        f"Skipping unreadable checkpoint line in {self.path}"
+                    )
+                    continue
+                self.entries[entry.product_id] = entry
+        logger.info(f"Loaded checkpoint: {self.summary()}")
+
+    def _record(self, entry: CheckpointEntry) -> None:
+        entry.updated_at = time.time()
+        self.entries[entry.product_id] = entry
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def completed(self, product_id: str, reason: Optional[str] = None) -> None:
+        attempts = self._attempts(product_id) + 1
+        self._record(CheckpointEntry(product_id, COMPLETED, attempts, reason))
+
+    def skipped(self, product_id: str, reason: str) -> None:
+        attempts = self._attempts(product_id) + 1
+        self._record(CheckpointEntry(product_id, SKIPPED, attempts, reason))
+
+    def failed(self, product_id: str, reason: str) -> None:
+        attempts = self._attempts(product_id) + 1
+        self._record(
+            CheckpointEntry(
+                product_id,
+                FAILED,
+                attempts,
+                reason,
+                next_attempt_at=time.time() + self.backoff(attempts),
+            )
+        )
+        if attempts >= self.max_attempts:
+            logger.warning(
+                f"Giving up on product {product_id} after {attempts} attempts: {reason}"
+            )
+
+    def backoff(self, attempts: int) -> float:
+        """Exponential backoff with jitter, so retries don't arrive in lockstep."""
+        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _attempts(self, product_id: str) -> int:
+        entry = self.entries.get(product_id)
+        return entry.attempts if entry else 0
+
+    def is_retryable(self, product_id: str) -> bool:
+        entry = self.entries.get(product_id)
+        return (
+            entry is not None
+            and entry.state == FAILED
+            and entry.attempts < self.max_attempts
+        )
+
+    def remaining(
+        self, product_ids: Iterable[str], stored_ids: Optional[Set[str]] = None
+    ) -> List[str]:
+        """IDs that still need fetching now, in catalogue order.
+
+        Pass `stored_ids` to reschedule IDs marked completed whose product never
+        reached storage, e.g. because the crawl died before the store committed.
+        """
+        now = time.time()
+        remaining = []
+        for product_id in product_ids:
+            entry = self.entries.get(product_id)
+            if entry is None:
+                remaining.append(product_id)
+            elif entry.state == COMPLETED:
+                if stored_ids is not None and product_id not in stored_ids:
+                    remaining.append(product_id)
+            elif self.is_retryable(product_id) and entry.next_attempt_at <= now:
+                remaining.append(product_id)
+        return remaining
+
+    def is_done(
+        self, product_ids: Iterable[str], stored_ids: Optional[Set[str]] = None
+    ) -> bool:
+        """Whether none of `product_ids` needs fetching now or in a later round."""
+        product_ids = list(product_ids)
+        return not self.remaining(product_ids, stored_ids) and not any(
+            self.is_retryable(product_id) for product_id in product_ids
+        )
+
+    def forget_completed(self, product_ids: Iterable[str]) -> None:
+        """Schedule completed IDs again, e.g. because their source changed.
+
+        Only in memory: the log still has them completed, which is why callers
+        must choose the same IDs again after a crash.
+        """
+        for product_id in product_ids:
+            entry = self.entries.get(product_id)
+            if entry is not None and entry.state == COMPLETED:
+                del self.entries[product_id]
+
+    def rounds(
+        self,
+        product_ids: List[str],
+        stored_ids: Optional[Set[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> Iterator[List[str]]:
+        """Yield batches to crawl, sleeping between rounds until retries are due.
+
+        With a `deadline` (a `time.time()` value), no round starts after it and
+        no retry is waited for past it; whatever is left stays in the log for
+        the next run.
+        """
+        batch = self.remaining(product_ids, stored_ids)
+        while True:
+            if deadline is not None and time.time() >= deadline:
+                return
+            if batch:
+                yield batch
+            retryable = [p for p in product_ids if self.is_retryable(p)]
+            if not retryable:
+                return
+            batch = self.remaining(retryable)
+            if not batch:
+                wait = (
+                    min(self.entries[p].next_attempt_at for p in retryable)
+                    - time.time()
+                )
+                if deadline is not None and time.time() + wait >= deadline:
+                    logger.info(
+                        f"Not waiting {wait:.0f}s to retry {len(retryable)} failed "
+                        "products: past the time budget"
+                    )
+                    return
+                logger.info(
+                    f"Waiting {wait:.0f}s to retry {len(retryable)} failed products"
+                )
+                time.sleep(max(wait, 0.0))
+                batch = self.remaining(retryable)
+
+    def summary(self) -> Dict[str, int]:
+        counts = {COMPLETED: 0, FAILED: 0, SKIPPED: 0}
+        for entry in self.entries.values():
+            counts[entry.state] += 1
+        return counts
+
+    def compact(self) -> None:
+        """Rewrite the log with one line per product ID."""
+        self.close()
+        tmp_path = self.path.with_suffix(".jsonl.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def reset(self) -> None:
+        self.close()
+        self.entries.clear()
+        self.path.unlink(missing_ok=True)
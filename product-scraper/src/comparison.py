@@ -0,0 +1,204 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from config import EXCHANGE_RATES
+from dataset import SOURCES, ProductColumns, load_columns
+
+SOURCE_CURRENCIES = {"Vinmonopolet": "NOK", "Systembolaget": "SEK"}
+
+Frame = Dict[str, np.ndarray]
+
+
+def load_frame(
+    sources: Sequence[str] = ("Vinmonopolet", "Systembolaget"),
+    currency: str = "NOK",
+    snapshots: Optional[Dict[str, Sequence[Union[str, Path]]]] = None,
+    available_only: bool = True,
+    rates: Optional[Dict[str, float]] = None,
+) -> Frame:
+    """Stack the columns of every source (and snapshot) into one frame.
+
+    Prices and alcohol per currency unit are converted to `currency`, so rows
+    from different markets are directly comparable. `snapshots` maps a source
+    to the store files of earlier crawls; each file becomes its own snapshot,
+    numbered in the `snapshot` column in the order given.
+    """
+    rates = rates or EXCHANGE_RATES
+    parts: List[Tuple[str, int, ProductColumns]] = []
+    for source in sources:
+        paths = (snapshots or {}).get(source) or [SOURCES[source][0]]
+        for snapshot, path in enumerate(paths):
+            columns = load_columns(source, path)
+            if available_only:
+                columns = columns.filter(columns.available)
+            parts.append((source, snapshot, columns))
+
+    def stacked(name: str) -> np.ndarray:
+        return np.concatenate([getattr(c, name) for _, _, c in parts])
+
+    # Local currency per target currency unit, one factor per row
+    factor = np.concatenate(
+        [
+            np.full(len(c), rates[currency] / rates[SOURCE_CURRENCIES[source]])
+            for source, _, c in parts
+        ]
+    )
+    return {
+        "code": stacked("code"),
+        "name": stacked("name"),
+        "category": stacked("category"),
+        "country": stacked("country"),
+        "volume": stacked("volume"),
+        "alcohol_percentage": stacked("alcohol_percentage"),
+        "price": stacked("price") / factor,
+        "alcohol_per_unit": stacked("alcohol_per_unit") * factor,
+        "source": np.concatenate([np.full(len(c), source) for source, _, c in parts]),
+        "snapshot": np.concatenate(
+            [np.full(len(c), snapshot, dtype=np.int32) for _, snapshot, c in parts]
+        ),
+    }
+
+
+def group_ids(frame: Frame, keys: Sequence[str]) -> Tuple[np.ndarray, Frame]:
+    """Dense group number per row for the combination of `keys`, plus the key
+    values of each group."""
+    row_count = len(next(iter(frame.values())))
+    combined = np.zeros(row_count, dtype=np.int64)
+    uniques = []
+    for key in keys:
+        values, inverse = np.unique(frame[key], return_inverse=True)
+        uniques.append(values)
+        combined = combined * len(values) + inverse.reshape(-1)
+
+    group_keys, ids = np.unique(combined, return_inverse=True)
+    labels = {}
+    for key, values in reversed(list(zip(keys, uniques))):
+        labels[key] = values[group_keys % len(values)]
+        group_keys = group_keys // len(values)
+    return ids.reshape(-1), {key: labels[key] for key in keys}
+
+
+def grouped_regression(
+    frame: Frame,
+    keys: Sequence[str] = ("source", "category", "country"),
+    x: str = "alcohol_percentage",
+    y: str = "alcohol_per_unit",
+) -> Frame:
+    """Ordinary least squares of `y` on `x` for every group, in one pass.
+
+    Uses the closed-form solution from per-group sums (via `np.bincount`)
+    instead of fitting a model per group. Rows missing either value are left
+    out; groups with fewer than two usable rows or no spread in `x` get NaN.
+    """
+    ids, labels = group_ids(frame, keys)
+    group_count = int(ids.max()) + 1 if len(ids) else 0
+    valid = ~np.isnan(frame[x]) & ~np.isnan(frame[y])
+    ids, xs, ys = ids[valid], frame[x][valid], frame[y][valid]
+
+    def total(weights: Optional[np.ndarray] = None) -> np.ndarray:
+        return np.bincount(ids, weights=weights, minlength=group_count)
+
+    n = total()
+    sx, sy = total(xs), total(ys)
+    sxx, sxy, syy = total(xs * xs), total(xs * ys), total(ys * ys)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var_x = n * sxx - sx * sx
+        var_y = n * syy - sy * sy
+        cov = n * sxy - sx * sy
+        # Relative tolerance: a constant x leaves float noise in var_x
+        spread = var_x > 1e-9 * n * sxx
+        slope = np.where((n >= 2) & spread, cov / var_x, np.nan)
+        intercept = (sy - slope * sx) / n
+        r_squared = np.where(var_y > 0, cov * cov / (var_x * var_y), 1.0)
+        r_squared = np.where(np.isnan(slope), np.nan, r_squared)
+
+    return {
+        **labels,
+        "count": n.astype(np.int64),
+        "slope": slope,
+        "intercept": intercept,
+        "r_squared": r_squared,
+    }
+
+
+def rank_within(
+    frame: Frame,
+    keys: Sequence[str] = (),
+    value: str = "alcohol_per_unit",
+) -> np.ndarray:
+    """1-based rank of every row by descending `value` within its group.
+
+    The result lines up with the frame's rows; rows without a value get 0.
+    """
+    row_count = len(frame[value])
+    ids = group_ids(frame, keys)[0] if keys else np.zeros(row_count, dtype=np.int64)
+    values = frame[value]
+    missing = np.isnan(values)
+    # Missing values sort last within their group
+    order = np.lexsort((np.where(missing, np.inf, -values), ids))
+    sorted_ids = ids[order]
+    group_start = np.r_[0, np.flatnonzero(np.diff(sorted_ids)) + 1]
+    starts = np.repeat(group_start, np.diff(np.r_[group_start, row_count]))
+
+    ranks = np.empty(row_count, dtype=np.int64)
+    ranks[order] = np.arange(row_count) - starts + 1
+    ranks[missing] = 0
+    return ranks
+
+
+def top_products(
+    frame: Frame,
+    count: int = 20,
+    keys: Sequence[str] = (),
+    value: str = "alcohol_per_unit",
+) -> Frame:
+    """The best `count` rows by `value` in every group, best first."""
+    ranks = rank_within(frame, keys, value)
+    selected = np.flatnonzero((ranks > 0) & (ranks <= count))
+    if keys:
+        ids = group_ids(frame, keys)[0]
+        selected = selected[np.lexsort((ranks[selected], ids[selected]))]
+    else:
+        selected = selected[np.argsort(ranks[selected], kind="stable")]
+    return {**{k: v[selected] for k, v in frame.items()}, "rank": ranks[selected]}
+
+
+def _rows_for(frame: Frame, source: str, codes: np.ndarray, snapshot: int):
+    """Frame row of each code in `source`, and whether it was found."""
+    candidates = np.flatnonzero(
+        (frame["source"] == source) & (frame["snapshot"] == snapshot)
+    )
+    if not len(candidates):
+        return np.zeros(len(codes), dtype=np.int64), np.zeros(len(codes), dtype=bool)
+    candidates = candidates[np.argsort(frame["code"][candidates])]
+    sorted_codes = frame["code"][candidates]
+    positions = np.searchsorted(sorted_codes, codes).clip(0, len(sorted_codes) - 1)
+    return candidates[positions], sorted_codes[positions] == codes
+
+
+def compare_matched(
+    frame: Frame,
+    vinmonopolet_codes: np.ndarray,
+    systembolaget_ids: np.ndarray,
+    snapshot: int = 0,
+) -> Frame:
+    """Matched products side by side, prices in the frame's currency.
+
+    Pairs where either product is missing from the frame (e.g. unavailable)
+    are left out.
+    """
+    left, left_found = _rows_for(frame, "Vinmonopolet", vinmonopolet_codes, snapshot)
+    right, right_found = _rows_for(frame, "Systembolaget", systembolaget_ids, snapshot)
+    found = left_found & right_found
+    left, right = left[found], right[found]
+    return {
+        "name": frame["name"][left],
+        "vinmonopolet_code": frame["code"][left],
+        "systembolaget_id": frame["code"][right],
+        "vinmonopolet_price": frame["price"][left],
+        "systembolaget_price": frame["price"][right],
+        "price_ratio": frame["price"][left] / frame["price"][right],
+    }
@@ -1,3 +1,4 @@
+import importlib.util
 import logging
 import os
 
@@ -12,9 +13,82 @@ load_dotenv()
 OCPM_API_KEY = os.getenv("OCPM_API_KEY")
 USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36"
 
-PRODUCT_PAGE_URL = "https://www.vinmonopolet.no/p"
+PRODUCT_PAGE_URL = os.getenv("PRODUCT_PAGE_URL", "https://www.vinmonopolet.no/p")
+
+CATALOGUE_URL = os.getenv(
+    "CATALOGUE_URL", "https://apis.vinmonopolet.no/products/v0/details-normal"
+)
+CATALOGUE_PAGE_SIZE = 5000
+CATALOGUE_CONCURRENCY = 4
+# Seconds a cached catalogue page stays fresh
+CATALOGUE_CACHE_MAX_AGE = 6 * 60 * 60
+
+SYSTEMBOLAGET_SEARCH_URL = os.getenv(
+    "SYSTEMBOLAGET_SEARCH_URL",
+    "https://api-extern.systembolaget.se/sb-api-ecommerce/v1/productsearch/search",
+)
+# The search API caps page size at 30
+SYSTEMBOLAGET_PAGE_SIZE = 30
+SYSTEMBOLAGET_CONCURRENCY = 4
+SYSTEMBOLAGET_RATE_LIMIT = 4.0
+# Subscription key for Systembolaget's API, sent only there
+SYSTEMBOLAGET_API_KEY = os.getenv("SYSTEMBOLAGET_API_KEY")
+
+# NOK per unit of each source's currency, for comparing prices across markets
+EXCHANGE_RATES = {
+    "NOK": 1.0,
+    "SEK": float(os.getenv("NOK_PER_SEK", "0.98")),
+}
+
+# Where to write crawl metrics (`.prom` for Prometheus text format, else JSON);
+# unset, metrics are not collected
+METRICS_PATH = os.getenv("METRICS_PATH")
+
+# Where fetched product pages are archived for replay, compressed with
+# PAGE_ARCHIVE_CODEC ("gzip", or "zstd" with the zstandard package); unset,
+# pages are not kept
+PAGE_ARCHIVE_DIR = os.getenv("PAGE_ARCHIVE_DIR")
+PAGE_ARCHIVE_CODEC = os.getenv("PAGE_ARCHIVE_CODEC", "gzip")
+
+# SQLite database every crawl's prices and availability are added to; empty to
+# not keep a history
+PRICE_HISTORY_PATH = os.getenv("PRICE_HISTORY_PATH", "price_history.sqlite3")
+
+# Seconds before a single product page request is abandoned
+REQUEST_TIMEOUT = 30
+
+# Threaded crawl mode: requests in flight at the start and at most; in between
+# the crawl adapts to how the site responds
+CRAWL_INITIAL_WORKERS = 2
+CRAWL_MAX_WORKERS = 32
+# Retries of a failed page within a crawl round, before the checkpoint takes over
+CRAWL_RETRY_ATTEMPTS = 3
+# Fetched pages allowed to wait per parse process before fetching pauses
+PARSE_BACKLOG_PER_WORKER = 4
+# MiB of resident memory above which the crawl stops starting requests until
+# it is back under; 0 for no ceiling
+CRAWL_MEMORY_LIMIT_MB = int(os.getenv("CRAWL_MEMORY_LIMIT_MB", "0"))
+
+# Async crawl mode: open connections and request starts per second per host
+FETCH_CONCURRENCY = 16
+FETCH_RATE_LIMIT = 8.0
+
+# How product pages are scanned: "lxml", "fast" (regex lexer) or "bs4". By
+# default lxml, the fastest, when it is installed, and the regex lexer if not
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR") or (
+    "lxml" if importlib.util.find_spec("lxml") else "fast"
+)
+
+# Set to 1 to decode pages as ISO-8859-1 and repair each parsed product with
+# process_object afterwards, as the scraper originally did
+LEGACY_PAGE_DECODING = os.getenv("LEGACY_PAGE_DECODING") == "1"
 
 HEADERS = {
     "User-Agent": USER_AGENT,
     "Ocp-Apim-Subscription-Key": OCPM_API_KEY,
 }
+
+SYSTEMBOLAGET_HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Ocp-Apim-Subscription-Key": SYSTEMBOLAGET_API_KEY,
+}
@@ -0,0 +1,176 @@
+import logging
+import os
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+import numpy as np
+
+from storage import ProductStore
+from vinmonopolet import ProductRecord, parse_abv
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 2
+
+
+@dataclass
+class ProductColumns:
+    """One typed array per field, row `i` of every array being the same product.
+
+    Missing numbers are NaN and missing strings are empty, so rows never shift
+    when a value is absent.
+    """
+
+    code: np.ndarray
+    name: np.ndarray
+    category: np.ndarray
+    country: np.ndarray
+    producer: np.ndarray
+    vintage: np.ndarray
+    price: np.ndarray
+    # Litres
+    volume: np.ndarray
+    alcohol_percentage: np.ndarray
+    # Millilitres of pure alcohol per unit of local currency
+    alcohol_per_unit: np.ndarray
+    available: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.code)
+
+    def filter(self, mask: np.ndarray) -> "ProductColumns":
+        return ProductColumns(
+            **{f.name: getattr(self, f.name)[mask] for f in fields(self)}
+        )
+
+
+Row = Tuple[str, str, str, str, str, str, float, float, float, float, bool]
+
+
+def _number(value: Any) -> float:
+    return float(value) if value is not None else np.nan
+
+
+def vinmonopolet_row(record: Dict[str, Any]) -> Row:
+    traits = (record.get("content") or {}).get("traits") or []
+    alcohol = next((t for t in traits if t.get("name") == "Alkohol"), None)
+    abv = parse_abv(alcohol["readableValue"]) if alcohol else np.nan
+    return (
+        record["code"],
+        record.get("name") or "",
+        (record.get("mainCategory") or {}).get("name") or "",
+        (record.get("mainCountry") or {}).get("name") or "",
+        (record.get("mainProducer") or {}).get("name") or "",
+        record.get("year") or "",
+        _number((record.get("price") or {}).get("value")),
+        _number(record.get("parsedSize")),
+        abv,
+        _number(record.get("alcoholPerNok")),
+        not record.get("expired", False),
+    )
+
+
+def systembolaget_row(record: Dict[str, Any]) -> Row:
+    abv = record.get("alcoholPercentage")
+    volume = record.get("volume")
+    price = record.get("price")
+    alcohol_per_sek = (
+        round((abv / 100) * volume / price, 3)
+        if None not in (abv, volume, price) and price != 0
+        else None
+    )
+    name = record.get("productNameBold") or ""
+    if record.get("productNameThin"):
+        name = f"{record['productNameThin']} {name}".strip()
+    return (
+        record["productId"],
+        name,
+        record.get("categoryLevel1") or "",
+        record.get("country") or "",
+        record.get("producerName") or "",
+        record.get("vintage") or "",
+        _number(price),
+        _number(volume / 1000 if volume is not None else None),
+        _number(abv),
+        _number(alcohol_per_sek),
+        not (record.get("isCompletelyOutOfStock") or record.get("isDiscontinued")),
+    )
+
+
+SOURCES: Dict[str, Tuple[str, str, Callable[[Dict[str, Any]], Row]]] = {
+    "Vinmonopolet": ("vinmonopol_products.json", "code", vinmonopolet_row),
+    "Systembolaget": ("systembolaget_products.json", "productId", systembolaget_row),
+}
+
+
+def build_columns(store: ProductStore, row: Callable[[Dict[str, Any]], Row]):
+    """Stream a store into columns, keeping only the latest record per key."""
+    index: Dict[Any, int] = {}
+    rows: List[Row] = []
+    for record in store.iter_raw():
+        key = record.get(store.key)
+        if key in index:
+            rows[index[key]] = row(record)
+        else:
+            index[key] = len(rows)
+            rows.append(row(record))
+
+    columns = list(zip(*rows)) if rows else [()] * len(fields(ProductColumns))
+    dtypes = [str] * 6 + [np.float64, np.float64, np.float64, np.float64, bool]
+    return ProductColumns(
+        *(np.array(column, dtype=dtype) for column, dtype in zip(columns, dtypes))
+    )
+
+
+def source_stamp(store: ProductStore) -> np.ndarray:
+    stamp = [SNAPSHOT_VERSION]
+    for path in (store.path, store.log_path):
+        stat = path.stat() if path.exists() else None
+        stamp += [stat.st_size, stat.st_mtime_ns] if stat else [0, 0]
+    return np.array(stamp, dtype=np.int64)
+
+
+def load_columns(
+    source: str = "Vinmonopolet", path: Union[str, Path, None] = None
+) -> ProductColumns:
+    """Columns for one source, from a cached `.columns.npz` snapshot when the
+    store has not changed since it was written."""
+    default_path, key, row = SOURCES[source]
+    store = ProductStore(path or default_path, key=key)
+    snapshot_path = store.path.with_suffix(".columns.npz")
+    stamp = source_stamp(store)
+
+    if snapshot_path.exists():
+        with np.load(snapshot_path) as cached:
+            if np.array_equal(cached["_stamp"], stamp):
+                return ProductColumns(
+                    **{f.name: cached[f.name] for f in fields(ProductColumns)}
+                )
+
+    columns = build_columns(store, row)
+    tmp_path = snapshot_path.with_suffix(".tmp.npz")
+    np.savez(
+        tmp_path,
+        _stamp=stamp,
+        **{f.name: getattr(columns, f.name) for f in fields(columns)},
+    )
+    os.replace(tmp_path, snapshot_path)
+    logger.info(
+        f"Wrote columnar snapshot of {len(columns)} products to {snapshot_path}"
+    )
+    return columns
+
+
+def load_records(
+    path: Union[str, Path] = "vinmonopol_products.json"
+) -> List[ProductRecord]:
+    """Stored Vinmonopolet products as compact read-only records.
+
+    Skips pydantic validation of the nested submodels, which dominates loading
+    full `VinmonopolProduct`s; use the model when the data is not our own.
+    """
+    records: Dict[str, ProductRecord] = {}
+    for raw in ProductStore(path).iter_raw():
+        records[raw["code"]] = ProductRecord.from_stored(raw)
+    return list(records.values())
@@ -0,0 +1,150 @@
+import html as html_lib
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import bs4
+
+_TAG = re.compile(
+    r"<(?:!--.*?-->|(script|style|div|main)\b((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>)",
+    re.IGNORECASE | re.DOTALL,
+)
+_RAW_TEXT_END = {
+    "script": re.compile(r"</script\s*>", re.IGNORECASE),
+    "style": re.compile(r"</style\s*>", re.IGNORECASE),
+}
+_ATTRIBUTE = re.compile(
+    r"([^\s=/>\"']+)(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+)))?", re.DOTALL
+)
+_ALCOHOL = re.compile(
+    r'<strong>Alkohol</strong> <span aria-label="(\d+(?:,\d+)?) prosent">'
+)
+
+
+@dataclass
+class ExtractedPage:
+    """The parts of a product page `parse_product_html` needs."""
+
+    ld_json: Optional[str]
+    react_props: Optional[str]
+    expired: bool
+    alcohol_percentage: float
+
+
+def _alcohol_percentage(html: str) -> float:
+    match = _ALCOHOL.search(html)
+    return float(match.group(1).replace(",", ".")) if match else 0.0
+
+
+def _attributes(source: str) -> Dict[str, str]:
+    """Parse a tag's attributes the way html.parser does: lowercased names,
+    unescaped values, first occurrence wins."""
+    attributes: Dict[str, str] = {}
+    for match in _ATTRIBUTE.finditer(source):
+        name = match.group(1).lower()
+        if name in attributes:
+            continue
+        value = next((v for v in match.group(2, 3, 4) if v is not None), "")
+        attributes[name] = html_lib.unescape(value)
+    return attributes
+
+
+def _has_class(attributes: Dict[str, str], name: str) -> bool:
+    return name in attributes.get("class", "").split()
+
+
+def extract_fast(html: str) -> ExtractedPage:
+    """Single forward scan over the tags we care about, without building a DOM.
+
+    Script and style bodies are skipped as raw text and comments are ignored,
+    matching what html.parser (and therefore BeautifulSoup) would see.
+    """
+    ld_json = None
+    react_props = None
+    expired = False
+    position = 0
+
+    while True:
+        match = _TAG.search(html, position)
+        if match is None:
+            break
+        position = match.end()
+        name = match.group(1)
+        if name is None:
+            continue
+        name = name.lower()
+        source = match.group(2)
+
+        if name in _RAW_TEXT_END:
+            end = _RAW_TEXT_END[name].search(html, position)
+            content_end = end.start() if end else len(html)
+            if (
+                name == "script"
+                and ld_json is None
+                and "ld+json" in source
+                and _attributes(source).get("type") == "application/ld+json"
+            ):
+                ld_json = html[position:content_end]
+            position = end.end() if end else len(html)
+        elif name == "div":
+            if (
+                not expired
+                and "product-price-expired" in source
+                and _has_class(_attributes(source), "product-price-expired")
+            ):
+                expired = True
+        elif react_props is None and "site__body" in source:
+            attributes = _attributes(source)
+            if _has_class(attributes, "site__body"):
+                # Mirrors bs4's find(): the first matching main wins even if
+                # it has no props, in which case there is nothing to parse
+                react_props = attributes.get("data-react-props", "")
+
+    return ExtractedPage(
+        ld_json, react_props or None, expired, _alcohol_percentage(html)
+    )
+
+
+def extract_lxml(html: str) -> ExtractedPage:
+    """Same fields via lxml's C parser; needs the optional `lxml` package."""
+    import lxml.html
+
+    root = lxml.html.document_fromstring(html)
+    scripts = root.xpath('//script[@type="application/ld+json"]')
+    mains = root.xpath(
+        '//main[contains(concat(" ", normalize-space(@class), " "), " site__body ")]'
+    )
+    expired = root.xpath(
+        '//div[contains(concat(" ", normalize-space(@class), " "),'
+        ' " product-price-expired ")]'
+    )
+    return ExtractedPage(
+        scripts[0].text if scripts else None,
+        (mains[0].get("data-react-props") or None) if mains else None,
+        bool(expired),
+        _alcohol_percentage(html),
+    )
+
+
+def extract_bs4(html: str) -> ExtractedPage:
+    """Reference implementation with a full BeautifulSoup tree."""
+    soup = bs4.BeautifulSoup(html, "html.parser")
+    json_ld_script = soup.find("script", type="application/ld+json")
+    more_data = soup.find("main", class_="site__body")
+    return ExtractedPage(
+        json_ld_script.string if json_ld_script is not None else None,
+        more_data.get("data-react-props") or None if more_data is not None else None,
+        soup.find("div", class_="product-price-expired") is not None,
+        _alcohol_percentage(html),
+    )
+
+
+EXTRACTORS: Dict[str, Callable[[str], ExtractedPage]] = {
+    "fast": extract_fast,
+    "lxml": extract_lxml,
+    "bs4": extract_bs4,
+}
+
+
+def extract_page(html: str, backend: str = "fast") -> ExtractedPage:
+    return EXTRACTORS[backend](html)
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from config import FETCH_CONCURRENCY, FETCH_RATE_LIMIT, HEADERS, REQUEST_TIMEOUT
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FetchResult:
+    key: str
+    url: str
+    status: int
+    body: bytes
+    elapsed: float
+    error: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and 200 <= self.status < 300
+
+
+class HostRateLimiter:
+    """Hands out request start slots so each host sees at most `rate` requests/s."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot: Dict[str, float] = {}
+
+    async def wait(self, host: str) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncFetcher:
+    """Pooled aiohttp client with bounded concurrency and a per-host rate limit.
+
+    Use as an async context manager so the connection pool is shared by every
+    request of a crawl and closed once at the end.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = FETCH_CONCURRENCY,
+        rate_limit: float = FETCH_RATE_LIMIT,
+        timeout: float = REQUEST_TIMEOUT,
+        headers: Optional[Dict[str, Optional[str]]] = None,
+    ):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        # aiohttp rejects None header values, e.g. a missing API key
+        self.headers = {k: v for k, v in (headers or HEADERS).items() if v is not None}
+        self.limiter = HostRateLimiter(rate_limit)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncFetcher":
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.headers,
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._session.close()
+
+    async def fetch(
+        self, key: str, url: str, headers: Optional[Dict[str, str]] = None
+    ) -> FetchResult:
+        host = urlsplit(url).netloc
+        async with self._semaphore:
+            await self.limiter.wait(host)
+            start = time.perf_counter()
+            try:
+                async with self._session.get(url, headers=headers) as response:
+                    body = await response.read()
+                    elapsed = time.perf_counter() - start
+                    metrics.request(host, response.status, elapsed, len(body))
+                    return FetchResult(
+                        key,
+                        url,
+                        response.status,
+                        body,
+                        elapsed,
+                        headers=dict(response.headers),
+                    )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Request for {url} failed: {e!r}")
+                metrics.request(host, 0, 0.0, 0, error=type(e).__name__)
+                return FetchResult(
+                    key, url, 0, b"", time.perf_counter() - start, error=repr(e)
+                )
+
+    async def fetch_many(
+        self,
+        requests: Iterable[Tuple[str, str]],
+        headers_for: Optional[Callable[[str], Dict[str, str]]] = None,
+    ) -> AsyncIterator[FetchResult]:
+        """Fetch `(key, url)` pairs, yielding results in completion order.
+
+        `headers_for(key)` adds per-request headers, e.g. conditional ones. Only
+        a small window of tasks beyond `concurrency` is scheduled at a time, so
+        a full catalogue does not create one task per product upfront.
+        """
+        pending = set()
+        requests = iter(requests)
+        window = self.concurrency * 2
+        exhausted = False
+
+        try:
+            while True:
+                while not exhausted and len(pending) < window:
+                    try:
+                        key, url = next(requests)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    headers = headers_for(key) if headers_for else None
+                    pending.add(asyncio.ensure_future(self.fetch(key, url, headers)))
+
+                if not pending:
+                    return
+
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        finally:
+            # The consumer stopped early: abandon requests still in flight
+            for task in pending:
+                task.cancel()
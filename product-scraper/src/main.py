@@ -1,13 +1,85 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+import argparse
+import asyncio
+import contextlib
+from datetime import datetime
+import gc
+import itertools
 import requests
-import json
-from typing import Optional, List, Any
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    List,
+    Tuple,
+)
 from tqdm import tqdm
 import time
 import logging
+import os
+from pathlib import Path
 
-from parse import parse_product_site
-from config import HEADERS
+from parse import (
+    RETRYABLE_STATUSES,
+    fetch_product_page,
+    parse_product_site,
+    product_url,
+)
+from config import (
+    CRAWL_INITIAL_WORKERS,
+    CRAWL_MEMORY_LIMIT_MB,
+    CRAWL_MAX_WORKERS,
+    CRAWL_RETRY_ATTEMPTS,
+    FETCH_CONCURRENCY,
+    FETCH_RATE_LIMIT,
+    PAGE_ARCHIVE_CODEC,
+    PAGE_ARCHIVE_DIR,
+    PARSE_BACKLOG_PER_WORKER,
+    PRICE_HISTORY_PATH,
+)
+from catalogue import (
+    ScrapedFingerprints,
+    load_catalogue,
+    refresh_catalogue,
+    select_for_scraping,
+)
+from changes import (
+    PageValidator,
+    ValidatorCache,
+    diff_snapshots,
+    page_validator,
+    snapshot,
+    write_diff_report,
+)
+from checkpoint import Checkpoint
+from fetch import AsyncFetcher
+from metrics import metrics
+from page_archive import PageArchive
+from price_history import PriceHistory
+from product_index import open_index
+from pipeline import (
+    MemoryCeiling,
+    ParseResult,
+    PipelineStats,
+    parse_archived,
+    parse_page,
+    parse_pool,
+)
+from storage import ProductStore
+from systembolaget_crawl import refresh_systembolaget
+from throttle import AimdLimiter, RetryQueue, parse_retry_after
 from vinmonopolet import VinmonopolProduct
 
 logging.basicConfig(
@@ -16,148 +88,797 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def load_products(exclude_non_drinks=True) -> List[str]:
-    url = "https://apis.vinmonopolet.no/products/v0/details-normal?start=0"
-    response = requests.get(url, headers=HEADERS)
-    data = response.json()
-    ret = [p["basic"]["productId"] for p in data if int(p["basic"]["productId"]) > 1000]
-    logger.info(f"Loaded {len(ret)} products")
-    return ret
+def load_products(
+    exclude_non_drinks=True, changed_only=False
+) -> Tuple[List[str], List[str], Dict[str, str]]:
+    """Load the full catalogue and return `(catalogue IDs, IDs to scrape,
+    catalogue fingerprint of every ID)`.
+
+    With `changed_only`, products already stored whose catalogue record is
+    unchanged since their page was last scraped are left out of the IDs to
+    scrape.
+    """
+    records = load_catalogue()
+    if exclude_non_drinks:
+        records = [r for r in records if int(r["basic"]["productId"]) > 1000]
+    products = refresh_catalogue(records)
+    catalogue_ids = [p.product_id for p in products]
+    fingerprints = {p.product_id: p.fingerprint for p in products}
+    logger.info(f"Loaded {len(catalogue_ids)} products")
+
+    if not changed_only:
+        return catalogue_ids, catalogue_ids, fingerprints
+    stored_ids = set(ProductStore("vinmonopol_products.json").keys())
+    product_ids = select_for_scraping(
+        products, ScrapedFingerprints("scraped_fingerprints.json"), stored_ids
+    )
+    logger.info(f"{len(product_ids)} products are new or changed in the catalogue")
+    return catalogue_ids, product_ids, fingerprints
 
 
 def process_single_product(product_id: str) -> Optional[VinmonopolProduct]:
-    product = parse_product_site(product_id)
-    if product:
-        return process_object(product)
-    return None
-
-
-def process_object(obj: Any) -> Any:
-    if isinstance(obj, str):
-        return obj.encode("iso-8859-1").decode("utf-8")
-    elif isinstance(obj, dict):
-        return {key: process_object(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [process_object(item) for item in obj]
-    elif hasattr(obj, "__dict__"):
-        for field, value in obj.__dict__.items():
-            setattr(obj, field, process_object(value))
-        return obj
-    else:
-        return obj
+    return parse_product_site(product_id)
 
 
-def process_products_multithreaded(restart=True, workers=1) -> None:
-    product_ids = load_products()
-    products: List[VinmonopolProduct] = []
-    total_products = len(product_ids)
-    start_time = time.time()
+class CrawlOutcome(NamedTuple):
+    product_id: str
+    product: Optional[VinmonopolProduct] = None
+    # Set when fetching failed in a way worth retrying
+    error: Optional[str] = None
+    # Set when the page matched its stored validator and was not parsed
+    unchanged: bool = False
+    validator: Optional[PageValidator] = None
+    # HTTP status (0 if there was no response), seconds the request took, and
+    # seconds the server asked to wait before retrying
+    status: int = 0
+    elapsed: float = 0.0
+    retry_after: Optional[float] = None
+    # Set when the page was fetched but could not be parsed
+    parse_error: Optional[str] = None
+
+
+class FetchedPage(NamedTuple):
+    body: bytes
+    content_type: Optional[str]
+
+
+def fetch_product(
+    product_id: str,
+    validators: Optional[ValidatorCache] = None,
+    archive: Optional[PageArchive] = None,
+) -> Tuple[CrawlOutcome, Optional[FetchedPage]]:
+    """Fetch one product page, conditionally if `validators` is given.
+
+    Returns the outcome so far, and the page if it still needs parsing, which
+    is then also added to `archive` if given.
+    """
+    headers = validators.request_headers(product_id) if validators else None
+    start = time.perf_counter()
+    try:
+        response = fetch_product_page(product_id, headers)
+    except requests.RequestException as e:
+        logger.warning(f"Failed to fetch product {product_id}: {e!r}")
+        elapsed = time.perf_counter() - start
+        # Retryable statuses are raised with their response attached
+        if e.response is None:
+            return CrawlOutcome(product_id, error=repr(e), elapsed=elapsed), None
+        outcome = CrawlOutcome(
+            product_id,
+            error=repr(e),
+            status=e.response.status_code,
+            elapsed=elapsed,
+            retry_after=parse_retry_after(e.response.headers.get("Retry-After")),
+        )
+        return outcome, None
+    elapsed = time.perf_counter() - start
+    status = response.status_code
+
+    validator = None
+    if validators is not None:
+        if validators.is_unchanged(product_id, status, response.content):
+            outcome = CrawlOutcome(
+                product_id, unchanged=True, status=status, elapsed=elapsed
+            )
+            return outcome, None
+        validator = page_validator(response.headers, response.content)
+    content_type = response.headers.get("Content-Type")
+    if archive is not None:
+        archive.add(product_id, response.content, status, content_type)
+
+    outcome = CrawlOutcome(
+        product_id, validator=validator, status=status, elapsed=elapsed
+    )
+    return outcome, FetchedPage(response.content, content_type)
+
+
+def crawl_product(
+    product_id: str,
+    validators: Optional[ValidatorCache] = None,
+    archive: Optional[PageArchive] = None,
+) -> CrawlOutcome:
+    """Fetch and parse one product page, conditionally if `validators` is given."""
+    outcome, page = fetch_product(product_id, validators, archive)
+    if page is None:
+        return outcome
+    outcome, _ = parse_fetched(outcome, partial(parse_page, outcome.product_id, *page))
+    return outcome
+
 
-    if not restart:
-        with open("vinmonopol_products.json", "r", encoding="utf-8") as f:
-            products = [VinmonopolProduct(**p) for p in json.load(f)]
-            logger.info(f"Loaded {len(products)} products from file")
-            continuation_index = product_ids.index(products[-1].product_id)
-            product_ids = product_ids[continuation_index + 1 :]
-
-    def process_and_save(product_id: str) -> Optional[VinmonopolProduct]:
-        product = process_single_product(product_id)
-        if product:
-            logger.info(f"Processed product: {product.name}")
-        return product
-
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = [
-            executor.submit(process_and_save, product_id) for product_id in product_ids
-        ]
-
-        for future in tqdm(
-            as_completed(futures), total=len(product_ids), desc="Processing products"
+def parse_fetched(
+    outcome: CrawlOutcome, parse: Callable[[], ParseResult]
+) -> Tuple[CrawlOutcome, Optional[float]]:
+    """`outcome` with the product `parse` returns, or why there is none, and
+    the seconds parsing took if it finished.
+
+    Every crawl mode parses through here, whether `parse` runs `parse_page`
+    itself or collects it from a parse process.
+    """
+    try:
+        product, seconds, timings = parse()
+    except BrokenProcessPool as e:
+        # The parse process died, not necessarily because of this page
+        return outcome._replace(error=repr(e)), None
+    except Exception as e:
+        # A page the parser chokes on will do so again; it is skipped, not retried
+        logger.warning(f"Failed to parse product {outcome.product_id}: {e!r}")
+        return outcome._replace(parse_error=repr(e)), None
+    metrics.observe_stages(timings)
+    return outcome._replace(product=product), seconds
+
+
+class Crawl:
+    """Storage, checkpoint and change tracking shared by every crawl mode."""
+
+    def __init__(
+        self,
+        restart: bool,
+        conditional: bool = False,
+        incremental: bool = False,
+        deadline: Optional[float] = None,
+        archive_dir: Optional[str] = None,
+        fingerprints: Optional[Dict[str, str]] = None,
+    ):
+        self.store = ProductStore("vinmonopol_products.json")
+        self.checkpoint = Checkpoint("crawl_checkpoint.jsonl")
+        self.validators = ValidatorCache("page_validators.json")
+        self.scraped = ScrapedFingerprints("scraped_fingerprints.json")
+        # Catalogue fingerprint of each product, recorded in `scraped` once the
+        # product is stored
+        self.fingerprints = fingerprints or {}
+        self.conditional = conditional
+        self.incremental = incremental
+        # Raw pages are kept here for `replay_archive`, if set
+        self.archive = (
+            PageArchive(archive_dir, PAGE_ARCHIVE_CODEC) if archive_dir else None
+        )
+        # `time.time()` after which no more product pages are requested
+        self.deadline = deadline
+        self.previous = snapshot(self.store.iter_raw())
+        self.unchanged_count = 0
+        self.start_time = time.time()
+        # What `rounds` was asked to crawl
+        self.product_ids: List[str] = []
+
+        if restart or conditional:
+            # A conditional crawl requests every page again, cheaply
+            self.checkpoint.reset()
+        if restart and not (conditional or incremental):
+            # A full, unconditional crawl rewrites every product anyway
+            self.store.clear()
+        if not conditional:
+            self.validators.reset()
+
+        self.stored_ids = set(self.store.keys())
+        self.validators.prune(self.stored_ids)
+        logger.info(f"Loaded {len(self.stored_ids)} products from file")
+
+    @property
+    def conditional_validators(self) -> Optional[ValidatorCache]:
+        return self.validators if self.conditional else None
+
+    def in_time(self, *_) -> bool:
+        return self.deadline is None or time.time() < self.deadline
+
+    def __enter__(self) -> "Crawl":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.store.close()
+        self.checkpoint.close()
+        if self.archive is not None:
+            self.archive.close()
+        if self.conditional:
+            self.validators.save()
+        self.scraped.save()
+
+    def record(self, outcome: CrawlOutcome) -> None:
+        product_id = outcome.product_id
+        if outcome.error is not None:
+            metrics.count("products_total", outcome="failed")
+            self.checkpoint.failed(product_id, outcome.error)
+        elif outcome.unchanged:
+            metrics.count("products_total", outcome="unchanged")
+            self.unchanged_count += 1
+            self.checkpoint.completed(product_id, "unchanged")
+            self._scraped(product_id)
+        elif outcome.parse_error is not None:
+            metrics.count("products_total", outcome="skipped")
+            self.checkpoint.skipped(product_id, outcome.parse_error)
+        elif outcome.product is None:
+            metrics.count("products_total", outcome="skipped")
+            self.checkpoint.skipped(product_id, "no product data on page")
+        else:
+            metrics.count("products_total", outcome="stored")
+            with metrics.stage("store"):
+                self.store.append(outcome.product)
+            self.stored_ids.add(product_id)
+            self.checkpoint.completed(product_id)
+            self._scraped(product_id)
+            if outcome.validator is not None:
+                self.validators.set(product_id, outcome.validator)
+
+    def _scraped(self, product_id: str) -> None:
+        fingerprint = self.fingerprints.get(product_id)
+        if fingerprint is not None:
+            self.scraped.set(product_id, fingerprint)
+
+    def rounds(self, product_ids: List[str]) -> Iterator[List[str]]:
+        """Yield the IDs still to crawl, then retry rounds for failed IDs."""
+        self.product_ids = product_ids
+        if self.incremental:
+            # Chosen because they changed since they were last stored, so an
+            # earlier completion no longer counts
+            self.checkpoint.forget_completed(product_ids)
+        for batch in self.checkpoint.rounds(
+            product_ids, self.stored_ids, self.deadline
         ):
-            product = future.result()
-            if product:
-                products.append(product)
+            logger.info(f"Crawling {len(batch)}/{len(product_ids)} products")
+            yield batch
+            # Persist this round before the checkpoint decides what to retry,
+            # and validators and fingerprints only once the products they
+            # describe are stored
+            with metrics.stage("commit"):
+                self.store.commit()
+            if self.conditional:
+                self.validators.save()
+            self.scraped.save()
+
+    def finish(self, product_ids: List[str]) -> None:
+        self.store.close()
+        report = diff_snapshots(
+            self.previous, snapshot(self.store.iter_raw()), product_ids
+        )
+        write_diff_report(report)
+        if PRICE_HISTORY_PATH:
+            with PriceHistory(PRICE_HISTORY_PATH) as history:
+                history.ingest(self.store.iter_raw(), self.start_time)
+        open_index("Vinmonopolet", self.store.path)
+
+        elapsed_time = time.time() - self.start_time
+        logger.info(f"Processing completed. Time taken: {elapsed_time:.2f} seconds")
+        logger.info(
+            f"Crawl checkpoint: {self.checkpoint.summary()}, "
+            f"{self.unchanged_count} unchanged pages not re-parsed"
+        )
+        # Only a crawl cut short has anything to resume; the next one starts over
+        if self.checkpoint.is_done(self.product_ids, self.stored_ids):
+            self.checkpoint.reset()
+        metrics.write()
+
+
+def crawl_round_threaded(
+    batch: List[str],
+    crawl: Crawl,
+    fetcher: ThreadPoolExecutor,
+    limiter: AimdLimiter,
+    fetch_one: Callable[[str], Tuple[CrawlOutcome, Optional[FetchedPage]]],
+    parser: Optional[ProcessPoolExecutor] = None,
+    parse_backlog: int = 0,
+    memory: Optional[MemoryCeiling] = None,
+) -> None:
+    """Crawl one round of IDs as a fetch, parse and write pipeline.
+
+    `fetch_one` runs on `fetcher` threads, as many at once as `limiter`
+    allows, and failed fetches are retried from a `RetryQueue` within the
+    round. Pages it returns are parsed on the `parser` processes, outside the
+    GIL; no new fetches start while `parse_backlog` pages are waiting there.
+    Outcomes are written by this thread alone, and released once stored. Over
+    the `memory` ceiling, only one page at a time is in the pipeline until
+    memory use is back under it. Pages that still fail, or whose retry is due
+    after the deadline, are recorded as failed and left to the checkpoint's
+    next round.
+    """
+    memory = memory or MemoryCeiling()
+    retries = RetryQueue(CRAWL_RETRY_ATTEMPTS)
+    queued = iter(batch)
+    # Every request in flight, with the `time.monotonic()` it started
+    fetching: Dict[Future, float] = {}
+    # Every page being parsed, with its outcome so far
+    parsing: Dict[Future, CrawlOutcome] = {}
+    stats = PipelineStats("fetch", "parse", "write")
+
+    def write(outcome: CrawlOutcome) -> None:
+        start = time.perf_counter()
+        crawl.record(outcome)
+        stats["write"].add(time.perf_counter() - start)
+        progress.update()
+        if outcome.product:
+            logger.info(f"Processed product: {outcome.product.name}")
+
+    with tqdm(total=len(batch), desc="Processing products") as progress:
+        while True:
+            now = time.monotonic()
+            was_exceeded = memory.exceeded
+            if memory.check() and not was_exceeded:
+                logger.warning(
+                    f"Over the memory ceiling of {memory.limit // 2**20} MiB; "
+                    "crawling one page at a time"
+                )
+                metrics.count("memory_ceiling_hits_total")
+                crawl.store.commit()
+                gc.collect()
+            elif was_exceeded and not memory.exceeded:
+                logger.info("Back under the memory ceiling")
+            while (
+                crawl.in_time()
+                and len(fetching) < limiter.concurrency
+                and (parser is None or len(parsing) < parse_backlog)
+                and not (memory.exceeded and (fetching or parsing))
+                and not limiter.paused(now)
+            ):
+                retry = retries.pop_ready(now)
+                product_id = retry.product_id if retry else next(queued, None)
+                if product_id is None:
+                    break
+                fetching[fetcher.submit(fetch_one, product_id)] = now
+
+            # Wake up when a stage finishes, a pause ends or a retry is due
+            wake_times = [
+                t for t in (limiter.paused_until, retries.next_ready()) if t and t > now
+            ]
+            timeout = min(min(wake_times) - now, 1.0) if wake_times else 1.0
+            if not fetching and not parsing:
+                if not retries or not crawl.in_time():
+                    break
+                time.sleep(timeout)
+                continue
 
-                with open("vinmonopol_products.json", "w", encoding="utf-8") as f:
+            done, _ = wait([*fetching, *parsing], timeout, FIRST_COMPLETED)
+            for future in done:
+                if future in parsing:
+                    outcome, seconds = parse_fetched(parsing.pop(future), future.result)
+                    if seconds is not None:
+                        stats["parse"].add(seconds)
+                    write(outcome)
+                    continue
+
+                started = fetching.pop(future)
+                outcome, page = future.result()
+                stats["fetch"].add(outcome.elapsed, len(fetching) + 1)
+                limiter.record(
+                    started,
+                    outcome.status,
+                    outcome.elapsed,
+                    outcome.retry_after,
+                    error=outcome.error is not None,
+                )
+                if (
+                    outcome.error is not None
+                    and crawl.in_time()
+                    and retries.schedule(
+                        outcome.product_id, outcome, outcome.retry_after
+                    )
+                ):
+                    continue
+                if page is None:
+                    write(outcome)
+                    continue
+                if parser is not None:
                     try:
-                        json.dump(
-                            [json.loads(p.model_dump_json()) for p in products],
-                            f,
-                            ensure_ascii=False,
-                            indent=2,
+                        future = parser.submit(
+                            parse_page, outcome.product_id, *page, metrics.enabled
+                        )
+                    except BrokenProcessPool:
+                        logger.error(
+                            "A parse process died; parsing the rest of the round "
+                            "on this thread"
                         )
-                    except Exception as e:
-                        logger.error(f"Failed to write to file: {e}")
-                        time.sleep(10)
-                        print(products[-1].model_dump_json())
+                        parser = None
+                    else:
+                        parsing[future] = outcome
+                        stats["parse"].peak_backlog = max(
+                            stats["parse"].peak_backlog, len(parsing)
+                        )
+                        continue
+                outcome, seconds = parse_fetched(
+                    outcome, partial(parse_page, outcome.product_id, *page)
+                )
+                if seconds is not None:
+                    stats["parse"].add(seconds)
+                write(outcome)
 
-    end_time = time.time()
-    elapsed_time = end_time - start_time
-    logger.info(f"Time taken: {elapsed_time:.2f} seconds")
+        # Retries not due before the deadline: the checkpoint has them
+        for outcome in retries.drain():
+            write(outcome)
+    logger.info(f"Round pipeline: {stats.summary()}")
 
 
-def process_products(restart=True) -> None:
-    """Process products and save every 1000 new products fetched"""
-    product_ids = load_products()
-    products: List[VinmonopolProduct] = []
-    total_products = len(product_ids)
-    start_time = time.time()
-    save_threshold = 1000
-    new_products_count = 0
-
-    if not restart:
-        with open("vinmonopol_products.json", "r", encoding="utf-8") as f:
-            products = [VinmonopolProduct(**p) for p in json.load(f)]
-            logger.info(f"Loaded {len(products)} products from file")
-            continuation_index = product_ids.index(products[-1].code)
-            product_ids = product_ids[continuation_index + 1 :]
-
-    for index, product_id in enumerate(product_ids):
-        product = process_single_product(product_id)
-        if product:
-            logger.info(
-                f"Processed product {index + 1}/{total_products}: {product.name}"
+def process_products_multithreaded(
+    restart=True,
+    workers: Optional[int] = None,
+    conditional=False,
+    changed_only=False,
+    deadline=None,
+    max_workers: int = CRAWL_MAX_WORKERS,
+    parse_workers: Optional[int] = None,
+    memory_limit_mb: int = CRAWL_MEMORY_LIMIT_MB,
+    archive_dir: Optional[str] = PAGE_ARCHIVE_DIR,
+) -> None:
+    """Process products on a thread pool, appending each one to the product store.
+
+    By default the number of requests in flight adapts to the site: it grows
+    while responses are fast and healthy, up to `max_workers`, and backs off
+    on 429/503, server errors and rising latency. `workers` fixes it instead.
+    Either way a Retry-After header pauses new requests until it expires.
+
+    Pages are parsed on `parse_workers` processes, one per core by default,
+    so parsing scales past the GIL; with 0 each fetch thread parses its own
+    pages, as on a single core. Only a window of pages is in the pipeline at
+    a time, so memory use does not grow with the catalogue; `memory_limit_mb`
+    narrows the window to one page while the process is over it.
+    """
+    catalogue_ids, product_ids, fingerprints = load_products(changed_only=changed_only)
+    crawl = Crawl(
+        restart,
+        conditional,
+        changed_only,
+        deadline,
+        archive_dir=archive_dir,
+        fingerprints=fingerprints,
+    )
+    validators = crawl.conditional_validators
+    if workers:
+        limiter = AimdLimiter(workers, minimum=workers, maximum=workers)
+    else:
+        limiter = AimdLimiter(CRAWL_INITIAL_WORKERS, maximum=max_workers)
+    if parse_workers is None:
+        cores = os.cpu_count() or 1
+        parse_workers = cores if cores > 1 else 0
+
+    memory = MemoryCeiling(memory_limit_mb)
+
+    def fetch_and_parse(product_id: str) -> Tuple[CrawlOutcome, None]:
+        return crawl_product(product_id, validators, crawl.archive), None
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(crawl)
+        fetcher = stack.enter_context(ThreadPoolExecutor(limiter.maximum))
+        parser = None
+        if parse_workers:
+            parser = stack.enter_context(parse_pool(parse_workers))
+            logger.info(f"Parsing pages on {parse_workers} processes")
+        for batch in crawl.rounds(product_ids):
+            crawl_round_threaded(
+                batch,
+                crawl,
+                fetcher,
+                limiter,
+                partial(fetch_product, validators=validators, archive=crawl.archive)
+                if parser
+                else fetch_and_parse,
+                parser,
+                parse_workers * PARSE_BACKLOG_PER_WORKER,
+                memory,
             )
-            products.append(product)
-            new_products_count += 1
+            logger.info(f"Round done at {limiter.concurrency} concurrent requests")
 
-            if new_products_count >= save_threshold:
-                with open("vinmonopol_products.json", "w", encoding="utf-8") as f:
-                    try:
-                        json.dump(
-                            [json.loads(p.model_dump_json()) for p in products],
-                            f,
-                            ensure_ascii=False,
-                            indent=2,
-                        )
-                        logger.info(f"Saved {new_products_count} new products to file")
-                        new_products_count = 0
-                    except Exception as e:
-                        logger.error(f"Failed to write to file: {e}")
-                        time.sleep(10)
-                        print(products[-1].model_dump_json())
-
-    # Save any remaining products
-    if new_products_count > 0:
-        with open("vinmonopol_products.json", "w", encoding="utf-8") as f:
-            try:
-                json.dump(
-                    [json.loads(p.model_dump_json()) for p in products],
-                    f,
-                    ensure_ascii=False,
-                    indent=2,
+        crawl.finish(catalogue_ids)
+
+
+def process_products(
+    restart=True,
+    conditional=False,
+    changed_only=False,
+    deadline=None,
+    archive_dir: Optional[str] = PAGE_ARCHIVE_DIR,
+) -> None:
+    """Process products, appending each one to the product store"""
+    catalogue_ids, product_ids, fingerprints = load_products(changed_only=changed_only)
+    crawl = Crawl(
+        restart,
+        conditional,
+        changed_only,
+        deadline,
+        archive_dir=archive_dir,
+        fingerprints=fingerprints,
+    )
+    validators = crawl.conditional_validators
+
+    with crawl:
+        for batch in crawl.rounds(product_ids):
+            for index, product_id in enumerate(batch):
+                if not crawl.in_time():
+                    break
+                outcome = crawl_product(product_id, validators, crawl.archive)
+                if outcome.product:
+                    logger.info(
+                        f"Processed product {index + 1}/{len(batch)}: "
+                        f"{outcome.product.name}"
+                    )
+                crawl.record(outcome)
+
+        crawl.finish(catalogue_ids)
+
+
+async def stream_outcomes(
+    product_ids: Iterable[str],
+    concurrency: int = FETCH_CONCURRENCY,
+    rate_limit: float = FETCH_RATE_LIMIT,
+    validators: Optional[ValidatorCache] = None,
+    archive: Optional[PageArchive] = None,
+) -> AsyncIterator[CrawlOutcome]:
+    """Fetch product pages concurrently and yield outcomes as they are parsed."""
+    async with AsyncFetcher(concurrency=concurrency, rate_limit=rate_limit) as fetcher:
+        requests_ = (
+            (product_id, product_url(product_id)) for product_id in product_ids
+        )
+        headers_for = validators.request_headers if validators else None
+        async for result in fetcher.fetch_many(requests_, headers_for):
+            product_id = result.key
+            outcome = CrawlOutcome(
+                product_id, status=result.status, elapsed=result.elapsed
+            )
+            if result.error is not None:
+                yield outcome._replace(error=result.error)
+                continue
+            if result.status in RETRYABLE_STATUSES:
+                yield outcome._replace(
+                    error=f"HTTP {result.status}",
+                    retry_after=parse_retry_after(result.headers.get("Retry-After")),
+                )
+                continue
+
+            if validators is not None:
+                if validators.is_unchanged(product_id, result.status, result.body):
+                    yield outcome._replace(unchanged=True)
+                    continue
+                outcome = outcome._replace(
+                    validator=page_validator(result.headers, result.body)
                 )
-                logger.info(f"Saved final {new_products_count} products to file")
-            except Exception as e:
-                logger.error(f"Failed to write to file: {e}")
-                time.sleep(10)
-                print(products[-1].model_dump_json())
+            content_type = result.headers.get("Content-Type")
+            if archive is not None:
+                archive.add(product_id, result.body, result.status, content_type)
+
+            outcome, _ = parse_fetched(
+                outcome, partial(parse_page, product_id, result.body, content_type)
+            )
+            yield outcome
+
+
+async def stream_products(
+    product_ids: List[str],
+    concurrency: int = FETCH_CONCURRENCY,
+    rate_limit: float = FETCH_RATE_LIMIT,
+) -> AsyncIterator[VinmonopolProduct]:
+    """Fetch product pages concurrently and yield products as they are parsed."""
+    async for outcome in stream_outcomes(product_ids, concurrency, rate_limit):
+        if outcome.product:
+            yield outcome.product
+
+
+def process_products_async(
+    restart=True,
+    concurrency: int = FETCH_CONCURRENCY,
+    rate_limit: float = FETCH_RATE_LIMIT,
+    conditional=False,
+    changed_only=False,
+    deadline=None,
+    archive_dir: Optional[str] = PAGE_ARCHIVE_DIR,
+) -> None:
+    """Process products with the async fetch engine, appending each to the store"""
+    catalogue_ids, product_ids, fingerprints = load_products(changed_only=changed_only)
+    crawl = Crawl(
+        restart,
+        conditional,
+        changed_only,
+        deadline,
+        archive_dir=archive_dir,
+        fingerprints=fingerprints,
+    )
+    validators = crawl.conditional_validators
+
+    async def run(batch: List[str]) -> None:
+        async for outcome in stream_outcomes(
+            itertools.takewhile(crawl.in_time, batch),
+            concurrency,
+            rate_limit,
+            validators,
+            crawl.archive,
+        ):
+            crawl.record(outcome)
+            if outcome.product:
+                logger.info(f"Processed product: {outcome.product.name}")
+            if not crawl.in_time():
+                # Requests still in flight are abandoned and retried next run
+                break
+
+    with crawl:
+        for batch in crawl.rounds(product_ids):
+            asyncio.run(run(batch))
+
+        crawl.finish(catalogue_ids)
 
-    end_time = time.time()
-    elapsed_time = end_time - start_time
-    logger.info(f"Processing completed. Time taken: {elapsed_time:.2f} seconds")
-    logger.info(f"Total products processed: {len(products)}/{total_products}")
+
+def replay_archive(
+    archive_dir: str = "page_archive",
+    as_of: Optional[float] = None,
+    workers: Optional[int] = None,
+) -> None:
+    """Rebuild the product store from archived pages, without the network.
+
+    The latest archived page of every product, up to `as_of` (a `time.time()`)
+    if given, is parsed again on `workers` processes, one per core by default
+    and none with 0, so a changed parser or product model can be applied
+    without re-crawling.
+    The store is replaced and the crawl diff report written as usual.
+    """
+    pages = list(PageArchive(archive_dir).latest(as_of).values())
+    if not pages:
+        logger.warning(f"No archived pages in {archive_dir}")
+        return
+    if workers is None:
+        workers = os.cpu_count() or 1
+    store = ProductStore("vinmonopol_products.json")
+    previous = snapshot(store.iter_raw())
+    store.clear()
+    start_time = time.time()
+
+    stored = 0
+    parse = partial(parse_archived, archive_dir)
+    with contextlib.ExitStack() as stack:
+        if workers:
+            pool = stack.enter_context(parse_pool(workers))
+            results = pool.map(
+                parse, pages, chunksize=max(1, min(64, len(pages) // (workers * 4)))
+            )
+        else:
+            results = map(parse, pages)
+        for product, _, _ in tqdm(results, total=len(pages), desc="Replaying pages"):
+            if product is not None:
+                store.append(product)
+                stored += 1
+    store.close()
+
+    elapsed_time = time.time() - start_time
+    logger.info(
+        f"Replayed {len(pages)} archived pages into {stored} products in "
+        f"{elapsed_time:.2f} seconds ({len(pages) / elapsed_time:.0f} pages/s, "
+        f"{workers} parse processes)"
+    )
+    write_diff_report(diff_snapshots(previous, snapshot(store.iter_raw())))
 
 
 if __name__ == "__main__":
-    process_products(restart=False)
+    parser = argparse.ArgumentParser(
+        description="Scrape Vinmonopolet product pages and Systembolaget's catalogue"
+    )
+    parser.add_argument(
+        "--source",
+        choices=["vinmonopolet", "systembolaget", "all"],
+        default="vinmonopolet",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["serial", "threaded", "async", "replay"],
+        default="serial",
+        help="replay re-parses the pages in --archive instead of crawling",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="discard stored products and the crawl checkpoint",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="threaded mode: fixed number of concurrent requests; by default it "
+        "adapts to how the site responds",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=CRAWL_MAX_WORKERS,
+        help="threaded mode: most concurrent requests when adapting",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        help="threaded and replay modes: processes parsing pages; default one "
+        "per core, 0 to parse without them (on the fetch threads when crawling)",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        default=CRAWL_MEMORY_LIMIT_MB,
+        help="threaded mode: MiB of memory above which requests are made one "
+        "at a time; 0 for no limit",
+    )
+    parser.add_argument("--concurrency", type=int, default=FETCH_CONCURRENCY)
+    parser.add_argument("--rate-limit", type=float, default=FETCH_RATE_LIMIT)
+    parser.add_argument(
+        "--conditional",
+        action="store_true",
+        help="keep stored products and only re-parse pages that changed",
+    )
+    parser.add_argument(
+        "--changed-only",
+        action="store_true",
+        help="only scrape pages of products that are new or changed in the API",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        help="seconds after which no new requests are made; the rest resumes "
+        "on the next run",
+    )
+    parser.add_argument(
+        "--archive",
+        default=PAGE_ARCHIVE_DIR,
+        help="directory to keep every fetched page in, compressed, and for "
+        "replay mode to read them from",
+    )
+    parser.add_argument(
+        "--as-of",
+        type=datetime.fromisoformat,
+        help="replay mode: use the pages fetched up to this ISO 8601 time",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        help="collect per-request and per-stage metrics and write them to this "
+        "file at the end of the crawl (.prom for Prometheus text format, else JSON)",
+    )
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable(args.metrics)
+    deadline = time.time() + args.time_budget if args.time_budget else None
+
+    if args.source in ("systembolaget", "all"):
+        refresh_systembolaget(args.restart, deadline=deadline)
+    if args.source in ("vinmonopolet", "all"):
+        if args.mode == "replay":
+            replay_archive(
+                args.archive or "page_archive",
+                args.as_of.timestamp() if args.as_of else None,
+                args.parse_workers,
+            )
+        elif args.mode == "async":
+            process_products_async(
+                args.restart,
+                args.concurrency,
+                args.rate_limit,
+                args.conditional,
+                args.changed_only,
+                deadline,
+                args.archive,
+            )
+        elif args.mode == "threaded":
+            process_products_multithreaded(
+                args.restart,
+                args.workers,
+                args.conditional,
+                args.changed_only,
+                deadline,
+                args.max_workers,
+                args.parse_workers,
+                args.memory_limit,
+                args.archive,
+            )
+        else:
+            process_products(
+                restart=args.restart,
+                conditional=args.conditional,
+                changed_only=args.changed_only,
+                deadline=deadline,
+                archive_dir=args.archive,
+            )
@@ -0,0 +1,361 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from dataset import ProductColumns, load_columns
+
+logger = logging.getLogger(__name__)
+
+MATCH_TABLE_VERSION = 1
+
+# Letters NFKD does not split into a base letter and an accent
+_TRANSLITERATE = str.maketrans({"ø": "o", "æ": "ae", "œ": "oe", "ß": "ss"})
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_YEAR = re.compile(r"\b(?:19|20)\d\d\b")
+# Legal forms and filler words that differ between the two retailers' listings
+_STOPWORDS = {
+    "ab",
+    "ag",
+    "as",
+    "asa",
+    "and",
+    "co",
+    "et",
+    "gmbh",
+    "ltd",
+    "och",
+    "og",
+    "sa",
+    "sas",
+    "spa",
+    "srl",
+    "the",
+    "und",
+}
+
+
+def normalise(text: str) -> str:
+    """Lowercase ASCII words without accents, punctuation or legal forms."""
+    text = unicodedata.normalize("NFKD", text.lower().translate(_TRANSLITERATE))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(w for w in _NON_WORD.split(text) if w and w not in _STOPWORDS)
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    """Dice coefficient of two trigram sets."""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+@dataclass
+class MatchProduct:
+    """The fields of one product that matching looks at, normalised."""
+
+    key: str
+    name: str
+    producer: str
+    # Millilitres, so volumes compare exactly
+    volume: int
+    alcohol_percentage: float
+    vintage: str
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha1(
+            json.dumps(asdict(self), sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+
+def match_products(columns: ProductColumns) -> List[MatchProduct]:
+    products = []
+    for code, name, producer, volume, abv, vintage in zip(
+        columns.code,
+        columns.name,
+        columns.producer,
+        columns.volume,
+        columns.alcohol_percentage,
+        columns.vintage,
+    ):
+        producer = normalise(str(producer))
+        name = normalise(_YEAR.sub(" ", str(name)))
+        # Vinmonopolet names usually start with the producer
+        if producer and name.startswith(producer + " "):
+            name = name[len(producer) + 1 :]
+        products.append(
+            MatchProduct(
+                str(code),
+                name,
+                producer,
+                int(round(volume * 1000)) if not np.isnan(volume) else 0,
+                float(abv),
+                str(vintage),
+            )
+        )
+    return products
+
+
+def abv_bucket(abv: float) -> int:
+    """Half-percent buckets; candidates are looked up in neighbouring buckets too."""
+    return -1 if np.isnan(abv) else int(round(abv * 2))
+
+
+def blocks_of(product: MatchProduct) -> Set[Tuple]:
+    """The blocks a product is filed under in a `MatchIndex`."""
+    volume = product.volume
+    return {
+        ("abv", volume, abv_bucket(product.alcohol_percentage)),
+        ("producer", volume, product.producer),
+    }
+
+
+def blocks_near(product: MatchProduct) -> Set[Tuple]:
+    """The blocks whose products could have `product` as a candidate."""
+    bucket = abv_bucket(product.alcohol_percentage)
+    return {
+        ("abv", product.volume, bucket - 1),
+        ("abv", product.volume, bucket),
+        ("abv", product.volume, bucket + 1),
+        ("producer", product.volume, product.producer),
+    }
+
+
+class MatchIndex:
+    """Candidate lookup over one retailer's products.
+
+    Two blocking keys narrow the search: (volume, ABV bucket) and (volume,
+    normalised producer). Inside a block, an inverted index over name and
+    producer tokens finds the products sharing at least one informative
+    token, and only those are scored with trigram similarity. Tokens found
+    in more than `max_token_share` of a block say nothing and are ignored.
+    """
+
+    def __init__(
+        self,
+        products: Iterable[MatchProduct],
+        max_token_share: float = 0.05,
+        min_block_for_pruning: int = 50,
+    ):
+        self.products: Dict[str, MatchProduct] = {}
+        self.by_abv: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+        self.by_producer: Dict[Tuple[int, str], Set[str]] = defaultdict(set)
+        self.tokens: Dict[Tuple[int, str], Set[str]] = defaultdict(set)
+        self.block_sizes: Counter = Counter()
+        self.max_token_share = max_token_share
+        self.min_block_for_pruning = min_block_for_pruning
+        self._grams: Dict[str, Tuple[Set[str], Set[str]]] = {}
+        for product in products:
+            self.add(product)
+
+    def add(self, product: MatchProduct) -> None:
+        self.products[product.key] = product
+        self.by_abv[product.volume, abv_bucket(product.alcohol_percentage)].add(
+            product.key
+        )
+        if product.producer:
+            self.by_producer[product.volume, product.producer].add(product.key)
+        for token in set(f"{product.name} {product.producer}".split()):
+            self.tokens[product.volume, token].add(product.key)
+        self.block_sizes[product.volume] += 1
+        self._grams[product.key] = (trigrams(product.name), trigrams(product.producer))
+
+    def candidates(self, product: MatchProduct) -> Set[str]:
+        bucket = abv_bucket(product.alcohol_percentage)
+        blocked: Set[str] = set()
+        for neighbour in (bucket - 1, bucket, bucket + 1):
+            blocked |= self.by_abv.get((product.volume, neighbour), set())
+        same_producer = self.by_producer.get((product.volume, product.producer), set())
+
+        limit = max(
+            self.min_block_for_pruning,
+            self.max_token_share * self.block_sizes[product.volume],
+        )
+        sharing: Set[str] = set()
+        for token in set(f"{product.name} {product.producer}".split()):
+            keys = self.tokens.get((product.volume, token), set())
+            if len(keys) <= limit:
+                sharing |= keys
+        return (blocked & sharing) | same_producer
+
+    def best(self, product: MatchProduct, threshold: float) -> List[Tuple[float, str]]:
+        """Candidates scoring at least `threshold`, best first."""
+        name_grams, producer_grams = trigrams(product.name), trigrams(product.producer)
+        scored = []
+        for key in self.candidates(product):
+            other = self.products[key]
+            if product.vintage and other.vintage and product.vintage != other.vintage:
+                continue
+            other_name_grams, other_producer_grams = self._grams[key]
+            score = similarity(name_grams, other_name_grams)
+            if product.producer and other.producer:
+                score = 0.6 * score + 0.4 * similarity(
+                    producer_grams, other_producer_grams
+                )
+            if score >= threshold:
+                scored.append((score, key))
+        return sorted(scored, reverse=True)
+
+
+@dataclass
+class Match:
+    vinmonopolet_code: str
+    systembolaget_id: str
+    score: float
+
+
+def pair_up(
+    left: Iterable[MatchProduct],
+    index: MatchIndex,
+    threshold: float,
+    taken: Optional[Set[str]] = None,
+) -> List[Match]:
+    """One-to-one matches, assigning the highest scoring pairs first."""
+    taken = set(taken or ())
+    proposals = []
+    for product in left:
+        for score, key in index.best(product, threshold):
+            proposals.append((score, product.key, key))
+    proposals.sort(key=lambda p: (-p[0], p[1], p[2]))
+
+    matched: Set[str] = set()
+    matches = []
+    for score, left_key, right_key in proposals:
+        if left_key in matched or right_key in taken:
+            continue
+        matched.add(left_key)
+        taken.add(right_key)
+        matches.append(Match(left_key, right_key, round(score, 4)))
+    return matches
+
+
+class MatchTable:
+    """Vinmonopolet ↔ Systembolaget matches, cached on disk between crawls.
+
+    Each side's products are fingerprinted by the fields matching uses. On
+    `update`, matches whose products are unchanged are kept and only new or
+    changed products are matched again; unmatched products are retried
+    when their block gained or changed products on the other side.
+    """
+
+    def __init__(
+        self, path: Union[str, Path] = "product_matches.json", threshold: float = 0.75
+    ):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.matches: Dict[str, Match] = {}
+        self.fingerprints: Dict[str, Dict[str, str]] = {"left": {}, "right": {}}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MATCH_TABLE_VERSION:
+                self.fingerprints = data["fingerprints"]
+                self.matches = {
+                    m["vinmonopolet_code"]: Match(**m) for m in data["matches"]
+                }
+
+    def update(
+        self, left: List[MatchProduct], right: List[MatchProduct]
+    ) -> Dict[str, int]:
+        """Bring the table up to date with the current products of both sides."""
+        left_prints = {p.key: p.fingerprint for p in left}
+        right_prints = {p.key: p.fingerprint for p in right}
+        changed_left = {
+            key
+            for key, fp in left_prints.items()
+            if self.fingerprints["left"].get(key) != fp
+        }
+        changed_right = {
+            key
+            for key, fp in right_prints.items()
+            if self.fingerprints["right"].get(key) != fp
+        }
+
+        right_by_key = {p.key: p for p in right}
+        touched_blocks: Set[Tuple] = set()
+        for key in changed_right:
+            touched_blocks |= blocks_near(right_by_key[key])
+
+        # Drop matches touching a changed or vanished product
+        dropped = 0
+        for code, match in list(self.matches.items()):
+            if (
+                code in changed_left
+                or code not in left_prints
+                or match.systembolaget_id in changed_right
+                or match.systembolaget_id not in right_prints
+            ):
+                del self.matches[code]
+                dropped += 1
+                # Its partner is free again for other products in its block
+                freed = right_by_key.get(match.systembolaget_id)
+                if freed is not None:
+                    touched_blocks |= blocks_near(freed)
+
+        to_match = [
+            p
+            for p in left
+            if p.key not in self.matches
+            and (p.key in changed_left or not blocks_of(p).isdisjoint(touched_blocks))
+        ]
+        index = MatchIndex(right)
+        taken = {m.systembolaget_id for m in self.matches.values()}
+        added = pair_up(to_match, index, self.threshold, taken)
+        for match in added:
+            self.matches[match.vinmonopolet_code] = match
+
+        self.fingerprints = {"left": left_prints, "right": right_prints}
+        stats = {
+            "matched": len(self.matches),
+            "rematched": len(to_match),
+            "added": len(added),
+            "dropped": dropped,
+        }
+        logger.info(f"Updated match table: {stats}")
+        return stats
+
+    def save(self) -> None:
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": MATCH_TABLE_VERSION,
+                    "fingerprints": self.fingerprints,
+                    "matches": [asdict(m) for m in self.matches.values()],
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
+
+    def pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Matched (Vinmonopolet code, Systembolaget ID) arrays, aligned."""
+        matches = list(self.matches.values())
+        return (
+            np.array([m.vinmonopolet_code for m in matches], dtype=str),
+            np.array([m.systembolaget_id for m in matches], dtype=str),
+        )
+
+
+def update_matches(path: Union[str, Path] = "product_matches.json") -> MatchTable:
+    """Match the currently stored products of both retailers, incrementally."""
+    table = MatchTable(path)
+    table.update(
+        match_products(load_columns("Vinmonopolet")),
+        match_products(load_columns("Systembolaget")),
+    )
+    table.save()
+    return table
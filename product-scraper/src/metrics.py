@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from config import METRICS_PATH
+
+logger = logging.getLogger(__name__)
+
+# Upper bucket bounds, Prometheus style (a value lands in the first bound >= it)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = tuple(1024 * 4**i for i in range(8))
+STAGE_BUCKETS = (1e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        # One count per bound, plus the +Inf bucket
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """`(le, count)` pairs as Prometheus reports them."""
+        pairs, total = [], 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            pairs.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return pairs
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics: "Metrics", stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.metrics.stage_done(self.stage, time.perf_counter() - self.start)
+
+
+_NOT_TIMED = nullcontext()
+
+
+class Metrics:
+    """Counters and histograms for one crawl process, dumped at the end of it.
+
+    Disabled, every call returns immediately (and `stage` a shared no-op
+    context manager), so instrumented code costs next to nothing. Updates are
+    locked, since the threaded crawl records from its worker threads.
+    """
+
+    def __init__(self, path: Union[str, Path, None] = None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Counter] = defaultdict(Counter)
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = defaultdict(dict)
+        self.start_time = time.time()
+        # Set by `collect_stages`
+        self._timings: Optional[List[Tuple[str, float]]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def enable(self, path: Union[str, Path]) -> None:
+        """Start collecting, to be written to `path` (`.prom` for Prometheus
+        text format, anything else for JSON)."""
+        self.path = Path(path)
+
+    def stage(self, name: str):
+        """Context manager timing one pass through a pipeline stage."""
+        if self.path is None and self._timings is None:
+            return _NOT_TIMED
+        return _StageTimer(self, name)
+
+    def stage_done(self, stage: str, seconds: float) -> None:
+        if self._timings is not None:
+            self._timings.append((stage, seconds))
+        else:
+            self.observe("stage_seconds", seconds, STAGE_BUCKETS, stage=stage)
+
+    @contextmanager
+    def collect_stages(self) -> Iterator[List[Tuple[str, float]]]:
+        """Time stages into a list of `(stage, seconds)` instead, even while
+        disabled, for a worker process to hand back to the one recording
+        metrics (see `observe_stages`). Not for use from several threads."""
+        timings: List[Tuple[str, float]] = []
+        self._timings = timings
+        try:
+            yield timings
+        finally:
+            self._timings = None
+
+    def observe_stages(self, timings: Sequence[Tuple[str, float]]) -> None:
+        for stage, seconds in timings:
+            self.observe("stage_seconds", seconds, STAGE_BUCKETS, stage=stage)
+
+    def count(self, name: str, amount: int = 1, **labels: str) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            self.counters[name][tuple(sorted(labels.items()))] += amount
+
+    def observe(
+        self, name: str, value: float, bounds: Sequence[float], **labels: str
+    ) -> None:
+        if self.path is None:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self.histograms[name].get(key)
+            if histogram is None:
+                histogram = self.histograms[name][key] = Histogram(bounds)
+            histogram.observe(value)
+
+    def request(
+        self,
+        host: str,
+        status: int,
+        elapsed: float,
+        size: int,
+        error: Optional[str] = None,
+    ) -> None:
+        """Record one HTTP request; `error` is the exception type, if any."""
+        if self.path is None:
+            return
+        if error is not None:
+            self.count("http_errors_total", host=host, error=error)
+            return
+        self.count("http_responses_total", host=host, status=str(status))
+        self.observe("request_seconds", elapsed, LATENCY_BUCKETS, host=host)
+        self.observe("response_bytes", size, SIZE_BUCKETS, host=host)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "elapsed_seconds": time.time() - self.start_time,
+                "counters": {
+                    name: [
+                        {"labels": dict(labels), "value": value}
+                        for labels, value in sorted(counter.items())
+                    ]
+                    for name, counter in self.counters.items()
+                },
+                "histograms": {
+                    name: [
+                        {
+                            "labels": dict(labels),
+                            "count": h.count,
+                            "sum": h.sum,
+                            "buckets": dict(h.cumulative()),
+                        }
+                        for labels, h in sorted(histograms.items())
+                    ]
+                    for name, histograms in self.histograms.items()
+                },
+            }
+
+    def prometheus_text(self, prefix: str = "scraper_") -> str:
+        """The metrics in Prometheus text exposition format."""
+
+        def selector(labels: Labels, *extra: Tuple[str, str]) -> str:
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name, counter in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for labels, value in sorted(counter.items()):
+                    lines.append(f"{prefix}{name}{selector(labels)} {value}")
+            for name, histograms in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for labels, h in sorted(histograms.items()):
+                    for le, count in h.cumulative():
+                        lines.append(
+                            f"{prefix}{name}_bucket{selector(labels, ('le', le))} "
+                            f"{count}"
+                        )
+                    lines.append(f"{prefix}{name}_sum{selector(labels)} {h.sum}")
+                    lines.append(f"{prefix}{name}_count{selector(labels)} {h.count}")
+        lines.append(f"# TYPE {prefix}elapsed_seconds gauge")
+        lines.append(f"{prefix}elapsed_seconds {time.time() - self.start_time}")
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> None:
+        """Write everything recorded so far to `path`, replacing it atomically."""
+        if self.path is None:
+            return
+        if self.path.suffix == ".prom":
+            text = self.prometheus_text()
+        else:
+            text = json.dumps(self.as_dict(), indent=2)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+        logger.info(f"Wrote crawl metrics to {self.path}")
+
+
+# Shared by every module of a crawl; enabled by METRICS_PATH or `--metrics`
+metrics = Metrics(METRICS_PATH)
@@ -0,0 +1,148 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, NamedTuple, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Blob file suffix of each compression codec
+CODEC_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+class ArchivedPage(NamedTuple):
+    product_id: str
+    # `time.time()` the page was fetched
+    crawled_at: float
+    # SHA-256 of the raw body, which names its blob
+    digest: str
+    codec: str
+    status: int
+    content_type: Optional[str] = None
+
+
+class PageArchive:
+    """Content-addressed, compressed archive of raw product pages.
+
+    Each distinct body is stored once, compressed, as
+    `blobs/<digest[:2]>/<digest><suffix>`, and every fetch appends a line to
+    `index.jsonl` with the product ID, crawl time, digest and response
+    metadata. A page that did not change between crawls costs one index line.
+    Safe to add to from several threads. zstd needs the `zstandard` package;
+    gzip is always available, and blobs of either codec can be read back.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = "page_archive",
+        codec: str = "gzip",
+        level: Optional[int] = None,
+    ):
+        if codec not in CODEC_SUFFIXES:
+            raise ValueError(f"Unknown archive codec {codec!r}")
+        self.directory = Path(directory)
+        self.index_path = self.directory / "index.jsonl"
+        self.codec = codec
+        self.level = level
+        self._lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self) -> "PageArchive":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    def blob_path(self, digest: str, codec: str) -> Path:
+        return self.directory / "blobs" / digest[:2] / (digest + CODEC_SUFFIXES[codec])
+
+    def add(
+        self,
+        product_id: str,
+        body: bytes,
+        status: int = 200,
+        content_type: Optional[str] = None,
+        crawled_at: Optional[float] = None,
+    ) -> ArchivedPage:
+        """Archive one fetched page, storing its body unless already stored."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.blob_path(digest, self.codec)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Unique per thread, since two threads may store the same body
+            tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(self._compress(body))
+            os.replace(tmp_path, path)
+
+        page = ArchivedPage(
+            product_id,
+            time.time() if crawled_at is None else crawled_at,
+            digest,
+            self.codec,
+            status,
+            content_type,
+        )
+        line = json.dumps(page._asdict(), ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.index_path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+        return page
+
+    def read(self, page: ArchivedPage) -> bytes:
+        """The raw body of an archived page."""
+        with open(self.blob_path(page.digest, page.codec), "rb") as f:
+            data = f.read()
+        if page.codec == "zstd":
+            import zstandard
+
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def _compress(self, body: bytes) -> bytes:
+        if self.codec == "zstd":
+            import zstandard
+
+            return zstandard.ZstdCompressor(level=self.level or 3).compress(body)
+        # mtime=0 so equal bodies compress to equal blobs
+        return gzip.compress(body, compresslevel=self.level or 6, mtime=0)
+
+    def pages(self) -> Iterator[ArchivedPage]:
+        """Every archived fetch, in the order they were added."""
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    yield ArchivedPage(**json.loads(line))
+                except (json.JSONDecodeError, TypeError):
+                    # A crash mid-write can leave a torn final line
+                    logger.warning(
+                        f"Skipping unreadable line {line_number} in {self.index_path}"
+                    )
+
+    def latest(self, as_of: Optional[float] = None) -> Dict[str, ArchivedPage]:
+        """The last page fetched of every product, up to `as_of` if given."""
+        latest: Dict[str, ArchivedPage] = {}
+        for page in self.pages():
+            if as_of is not None and page.crawled_at > as_of:
+                continue
+            if page.product_id not in latest or (
+                page.crawled_at >= latest[page.product_id].crawled_at
+            ):
+                latest[page.product_id] = page
+        return latest
@@ -1,54 +1,140 @@
 import json
-import re
-
-import bs4
 import logging
+import re
+import time
 
-from typing import Optional
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
 
 import requests
 
-from config import HEADERS, PRODUCT_PAGE_URL
+from config import (
+    HEADERS,
+    HTML_EXTRACTOR,
+    LEGACY_PAGE_DECODING,
+    PRODUCT_PAGE_URL,
+    REQUEST_TIMEOUT,
+)
+from extract import extract_page
+from metrics import metrics
 from vinmonopolet import VinmonopolProduct
 
 logger = logging.getLogger(__name__)
 
+# Shared across calls so the serial and threaded crawls reuse keep-alive connections
+session = requests.Session()
+
+# Rate limiting and server errors, worth retrying later rather than parsing
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+_CHARSET = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+
+
+def product_url(product_id: str) -> str:
+    return f"{PRODUCT_PAGE_URL}/{product_id}"
+
+
+def fetch_product_page(
+    product_id: str, headers: Optional[Dict[str, str]] = None
+) -> requests.Response:
+    url = product_url(product_id)
+    start = time.perf_counter()
+    try:
+        response = session.get(
+            url,
+            headers={**HEADERS, **headers} if headers else HEADERS,
+            timeout=REQUEST_TIMEOUT,
+        )
+    except requests.RequestException as e:
+        metrics.request(urlsplit(url).netloc, 0, 0.0, 0, error=type(e).__name__)
+        raise
+    metrics.request(
+        urlsplit(url).netloc,
+        response.status_code,
+        time.perf_counter() - start,
+        len(response.content),
+    )
+    if response.status_code in RETRYABLE_STATUSES:
+        response.raise_for_status()
+    return response
+
+
+def decode_page(body: bytes, content_type: Optional[str] = None) -> str:
+    """Decode a page body once, at the byte level.
+
+    The site serves UTF-8 without declaring a charset, so requests falls back
+    to ISO-8859-1 for `response.text` and every non-ASCII character comes out
+    garbled. Decode as the declared charset, or UTF-8 when there is none.
+    """
+    if LEGACY_PAGE_DECODING:
+        return body.decode("iso-8859-1")
+    match = _CHARSET.search(content_type or "")
+    try:
+        return body.decode(match.group(1) if match else "utf-8", errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def process_object(obj: Any) -> Any:
+    if isinstance(obj, str):
+        return obj.encode("iso-8859-1").decode("utf-8")
+    elif isinstance(obj, dict):
+        return {key: process_object(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [process_object(item) for item in obj]
+    elif hasattr(obj, "__dict__"):
+        for field, value in obj.__dict__.items():
+            setattr(obj, field, process_object(value))
+        return obj
+    else:
+        return obj
+
+
+def parse_product_page(
+    product_id: str, body: bytes, content_type: Optional[str] = None
+) -> Optional[VinmonopolProduct]:
+    with metrics.stage("parse"):
+        with metrics.stage("decode"):
+            html = decode_page(body, content_type)
+        product = parse_product_html(product_id, html)
+        if product and LEGACY_PAGE_DECODING:
+            # Old path: repair the latin-1 decoded text field by field afterwards
+            with metrics.stage("process_object"):
+                return process_object(product)
+        return product
+
 
 def parse_product_site(product_id: str) -> Optional[VinmonopolProduct]:
-    url = f"{PRODUCT_PAGE_URL}/{product_id}"
-    response = requests.get(url, headers=HEADERS)
+    response = fetch_product_page(product_id)
+    return parse_product_page(
+        product_id, response.content, response.headers.get("Content-Type")
+    )
 
-    soup = bs4.BeautifulSoup(response.text, "html.parser")
-    json_ld_script = soup.find("script", type="application/ld+json")
 
-    if json_ld_script is None:
+def parse_product_html(
+    product_id: str, html: str, extractor: str = HTML_EXTRACTOR
+) -> Optional[VinmonopolProduct]:
+    with metrics.stage("extract"):
+        page = extract_page(html, extractor)
+
+    if page.ld_json is None:
         return None
 
-    product_data = json.loads(json_ld_script.string)
+    with metrics.stage("json"):
+        product_data = json.loads(page.ld_json)
 
     if product_data.get("brand") is None:
         return None
 
-    print(product_data)
-    expired = True if soup.find("div", class_="product-price-expired") else False
-
-    alcohol_match = re.search(
-        r'<strong>Alkohol</strong> <span aria-label="(\d+(?:,\d+)?) prosent">',
-        response.text,
-    )
-
-    alkoholprosent = (
-        float(alcohol_match.group(1).replace(",", ".")) if alcohol_match else 0.0
-    )
+    logger.debug(product_data)
 
-    more_data = soup.find("main", class_="site__body")
-    if more_data is None:
+    if page.react_props is None:
         logger.info(f"Could not find more data for product {product_id}")
 
         return None
 
-    more_data = more_data["data-react-props"]
-
-    json_data = json.loads(more_data)
+    with metrics.stage("json"):
+        json_data = json.loads(page.react_props)
 
-    return VinmonopolProduct(**json_data["product"])
+    with metrics.stage("validate"):
+        return VinmonopolProduct(**json_data["product"])
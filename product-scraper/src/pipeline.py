@@ -0,0 +1,130 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from metrics import metrics
+from page_archive import ArchivedPage, PageArchive
+from parse import parse_product_page
+from vinmonopolet import VinmonopolProduct
+
+logger = logging.getLogger(__name__)
+
+
+# The product on a page, seconds spent parsing it, and the `(stage, seconds)`
+# timings of its parse stages if asked for
+ParseResult = Tuple[Optional[VinmonopolProduct], float, List[Tuple[str, float]]]
+
+
+def parse_page(
+    product_id: str,
+    body: bytes,
+    content_type: Optional[str] = None,
+    timed: bool = False,
+) -> ParseResult:
+    """Parse pool entry point: the product on a fetched page, with its timings.
+
+    Metrics are only recorded in the crawl's own process, so with `timed` the
+    stage timings are collected here and returned for it to record.
+    """
+    start = time.perf_counter()
+    if not timed:
+        product = parse_product_page(product_id, body, content_type)
+        return product, time.perf_counter() - start, []
+    with metrics.collect_stages() as timings:
+        product = parse_product_page(product_id, body, content_type)
+    return product, time.perf_counter() - start, timings
+
+
+def parse_archived(directory: str, page: ArchivedPage) -> ParseResult:
+    """Parse pool entry point for replays: `parse_page` on an archived page.
+
+    A page the parser fails on yields no product, as it is skipped in a crawl,
+    rather than ending the replay.
+    """
+    start = time.perf_counter()
+    body = PageArchive(directory).read(page)
+    try:
+        return parse_page(page.product_id, body, page.content_type)
+    except Exception as e:
+        logger.warning(f"Failed to parse archived product {page.product_id}: {e!r}")
+        return None, time.perf_counter() - start, []
+
+
+def parse_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool for `parse_page`.
+
+    Workers come from a fork server rather than forking the crawl itself,
+    which by then has fetch threads that may hold locks.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("forkserver")
+    )
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size of this process, where the OS reports it."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryCeiling:
+    """Whether the process is over `limit_mb` MiB of resident memory.
+
+    0 means no ceiling, as it does where the OS does not report the process'
+    current memory use.
+    """
+
+    def __init__(self, limit_mb: int = 0):
+        self.limit = limit_mb * 2**20
+        if self.limit and rss_bytes() is None:
+            logger.warning("Cannot read this process' memory use; no memory ceiling")
+            self.limit = 0
+        self.exceeded = False
+
+    def check(self) -> bool:
+        """Update and return `exceeded`."""
+        if self.limit:
+            self.exceeded = (rss_bytes() or 0) > self.limit
+        return self.exceeded
+
+
+@dataclass
+class StageStats:
+    items: int = 0
+    # Seconds spent on items, summed over the stage's workers
+    busy: float = 0.0
+    # Most items in or waiting for the stage at once
+    peak_backlog: int = 0
+
+    def add(self, seconds: float, backlog: int = 0) -> None:
+        self.items += 1
+        self.busy += seconds
+        self.peak_backlog = max(self.peak_backlog, backlog)
+
+
+class PipelineStats:
+    """Items, busy time and backlog of each stage of a pipeline run."""
+
+    def __init__(self, *stages: str):
+        self.stages: Dict[str, StageStats] = {stage: StageStats() for stage in stages}
+        self.start_time = time.perf_counter()
+
+    def __getitem__(self, stage: str) -> StageStats:
+        return self.stages[stage]
+
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+        return "; ".join(
+            f"{stage} {s.items} in {elapsed:.1f} s ({s.items / elapsed:.1f}/s, "
+            f"{s.busy / s.items * 1000:.1f} ms each"
+            + (f", backlog peak {s.peak_backlog})" if s.peak_backlog else ")")
+            for stage, s in self.stages.items()
+            if s.items
+        )
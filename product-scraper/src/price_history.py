@@ -0,0 +1,292 @@
+import argparse
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from storage import ProductStore
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawls (
+    crawled_at REAL PRIMARY KEY,
+    products INTEGER NOT NULL,
+    changed INTEGER NOT NULL
+);
+-- One row per product per change: the state from `valid_from` until the
+-- product's next row
+CREATE TABLE IF NOT EXISTS observations (
+    code TEXT NOT NULL,
+    valid_from REAL NOT NULL,
+    price REAL,
+    expired INTEGER,
+    buyable INTEGER,
+    status TEXT,
+    PRIMARY KEY (code, valid_from)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_by_time ON observations (valid_from);
+-- The current state of every product, and when it last changed
+CREATE TABLE IF NOT EXISTS latest (
+    code TEXT PRIMARY KEY,
+    name TEXT,
+    category TEXT,
+    price REAL,
+    expired INTEGER,
+    buyable INTEGER,
+    status TEXT,
+    changed_at REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS latest_by_change ON latest (changed_at);
+"""
+
+# The tracked fields of a product: price, expired, buyable, status; flags are
+# integers, as SQLite hands them back
+State = Tuple[Optional[float], Optional[int], Optional[int], Optional[str]]
+
+
+class PricePoint(NamedTuple):
+    valid_from: float
+    price: Optional[float]
+    expired: bool
+    buyable: bool
+    status: Optional[str]
+
+
+class PriceChange(NamedTuple):
+    code: str
+    name: str
+    category: str
+    before: float
+    now: float
+    changed_at: float
+
+    @property
+    def change(self) -> float:
+        """Relative change, -0.1 for a 10% drop."""
+        return self.now / self.before - 1 if self.before else 0.0
+
+
+class Expiry(NamedTuple):
+    code: str
+    name: str
+    category: str
+    expired_at: float
+
+
+def _flag(value: Optional[bool]) -> Optional[int]:
+    return None if value is None else int(value)
+
+
+def product_state(record: Dict[str, Any]) -> State:
+    return (
+        (record.get("price") or {}).get("value"),
+        _flag(record.get("expired")),
+        _flag(record.get("buyable")),
+        record.get("status"),
+    )
+
+
+class PriceHistory:
+    """Price and availability of every product across crawls, in SQLite.
+
+    A crawl is ingested as a whole: only products whose price, `expired`,
+    `buyable` or `status` differ from their latest row get a new row, so the
+    database grows with changes rather than with crawls. Crawls must be
+    ingested in the order they were made.
+    """
+
+    def __init__(self, path: Union[str, Path] = "price_history.sqlite3"):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> "PriceHistory":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def last_crawl(self) -> Optional[float]:
+        row = self.connection.execute("SELECT MAX(crawled_at) FROM crawls").fetchone()
+        return row[0]
+
+    def ingest(
+        self, records: Iterable[Dict[str, Any]], crawled_at: Optional[float] = None
+    ) -> int:
+        """Add a crawl's stored records, as of `crawled_at` (default now).
+
+        Records may repeat a code, as a store's log does; the last one wins.
+        Returns the number of products that changed.
+        """
+        crawled_at = time.time() if crawled_at is None else crawled_at
+        last_crawl = self.last_crawl()
+        if last_crawl is not None and crawled_at < last_crawl:
+            raise ValueError(
+                f"Crawl at {crawled_at} is older than the last one ingested "
+                f"({last_crawl}); crawls must be ingested in order"
+            )
+
+        current: Dict[str, Tuple[State, str, str]] = {}
+        for record in records:
+            category = (record.get("mainCategory") or {}).get("name")
+            current[record["code"]] = (
+                product_state(record),
+                record.get("name"),
+                category,
+            )
+        known: Dict[str, Tuple[State, float]] = {
+            code: ((price, expired, buyable, status), changed_at)
+            for code, price, expired, buyable, status, changed_at in (
+                self.connection.execute(
+                    "SELECT code, price, expired, buyable, status, changed_at "
+                    "FROM latest"
+                )
+            )
+        }
+
+        observations = []
+        latest = []
+        for code, (state, name, category) in current.items():
+            previous = known.get(code)
+            if previous is not None and previous[0] == state:
+                changed_at = previous[1]
+            else:
+                changed_at = crawled_at
+                observations.append((code, crawled_at, *state))
+            latest.append((code, name, category, *state, changed_at, crawled_at))
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?, ?, ?)",
+                observations,
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO latest VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                latest,
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO crawls VALUES (?, ?, ?)",
+                (crawled_at, len(current), len(observations)),
+            )
+        logger.info(
+            f"Ingested {len(current)} products into {self.path}, "
+            f"{len(observations)} changed"
+        )
+        return len(observations)
+
+    def price_history(self, code: str) -> List[PricePoint]:
+        """Every state a product has had, oldest first."""
+        rows = self.connection.execute(
+            "SELECT valid_from, price, expired, buyable, status FROM observations "
+            "WHERE code = ? ORDER BY valid_from",
+            (code,),
+        )
+        return [
+            PricePoint(valid_from, price, bool(expired), bool(buyable), status)
+            for valid_from, price, expired, buyable, status in rows
+        ]
+
+    def price_drops(self, since: float, min_drop: float = 0.0) -> List[PriceChange]:
+        """Products now cheaper than at `since` by more than `min_drop`
+        (a fraction), biggest drops first.
+
+        Only products that changed after `since` are looked at, through the
+        `latest_by_change` index.
+        """
+        rows = self.connection.execute(
+            """
+            SELECT l.code, l.name, l.category, o.price, l.price, l.changed_at
+            FROM latest l
+            JOIN observations o ON o.code = l.code AND o.valid_from = (
+                SELECT MAX(valid_from) FROM observations
+                WHERE code = l.code AND valid_from <= ?
+            )
+            WHERE l.changed_at > ? AND l.price < o.price * (1 - ?)
+            """,
+            (since, since, min_drop),
+        )
+        return sorted(map(PriceChange._make, rows), key=lambda c: c.change)
+
+    def expired_since(self, since: float) -> List[Expiry]:
+        """Products that went from available to expired after `since`."""
+        rows = self.connection.execute(
+            """
+            SELECT o.code, l.name, l.category, o.valid_from
+            FROM observations o JOIN latest l ON l.code = o.code
+            WHERE o.valid_from > ? AND o.expired = 1 AND (
+                SELECT p.expired FROM observations p
+                WHERE p.code = o.code AND p.valid_from < o.valid_from
+                ORDER BY p.valid_from DESC LIMIT 1
+            ) = 0
+            ORDER BY o.valid_from
+            """,
+            (since,),
+        )
+        return list(map(Expiry._make, rows))
+
+
+def _timestamp(value: str) -> float:
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _date(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Price and availability history")
+    parser.add_argument("--db", type=Path, default=Path("price_history.sqlite3"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="add a crawl's product store")
+    ingest.add_argument(
+        "store", type=Path, nargs="?", default="vinmonopol_products.json"
+    )
+    ingest.add_argument(
+        "--at", type=_timestamp, help="ISO 8601 time of the crawl; default now"
+    )
+    history = commands.add_parser("history", help="price history of a product")
+    history.add_argument("code")
+    drops = commands.add_parser("drops", help="products whose price dropped")
+    drops.add_argument("--days", type=float, default=7)
+    drops.add_argument("--min-drop", type=float, default=0.0, help="fraction")
+    expired = commands.add_parser("expired", help="products that expired")
+    expired.add_argument("--days", type=float, default=7)
+    args = parser.parse_args()
+
+    with PriceHistory(args.db) as db:
+        start = time.perf_counter()
+        if args.command == "ingest":
+            db.ingest(ProductStore(args.store).iter_raw(), args.at)
+        elif args.command == "history":
+            for point in db.price_history(args.code):
+                price = f"{point.price:.2f}" if point.price is not None else "-"
+                print(
+                    f"{_date(point.valid_from)}  {price:>10}  "
+                    f"{'expired' if point.expired else point.status}"
+                    f"{'' if point.buyable else ', not buyable'}"
+                )
+        elif args.command == "drops":
+            for change in db.price_drops(time.time() - args.days * DAY, args.min_drop):
+                print(
+                    f"{change.code:>8}  {change.before:>9.2f} -> {change.now:>9.2f} "
+                    f"({change.change:+.1%})  {change.name} [{change.category}]"
+                )
+        else:
+            for expiry in db.expired_since(time.time() - args.days * DAY):
+                print(
+                    f"{expiry.code:>8}  {_date(expiry.expired_at)}  "
+                    f"{expiry.name} [{expiry.category}]"
+                )
+        logger.info(f"Done in {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,279 @@
+import argparse
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from dataset import SOURCES, ProductColumns, load_columns, source_stamp
+from storage import ProductStore
+
+logger = logging.getLogger(__name__)
+
+Frame = Dict[str, np.ndarray]
+
+# Columns kept in the index and returned by queries
+RESULT_COLUMNS = (
+    "code",
+    "name",
+    "category",
+    "country",
+    "producer",
+    "vintage",
+    "price",
+    "volume",
+    "alcohol_percentage",
+    "alcohol_per_unit",
+)
+# Columns with a bitmap per distinct value, for equality filters
+BITMAP_COLUMNS = ("category", "country")
+# Columns queries can rank by, and whether best means highest
+SORT_KEYS = {"alcohol_per_unit": True, "price": False}
+# Rows of a sort order checked for matches at a time, so a top-N query over a
+# broad filter stops as soon as it has N rows
+SCAN_CHUNK = 4096
+
+
+def _bitmaps(values: np.ndarray):
+    """Distinct values, sorted, and a packed bitmap of the rows of each."""
+    distinct, inverse = np.unique(values, return_inverse=True)
+    bits = np.zeros((len(distinct), len(values)), dtype=bool)
+    bits[inverse.reshape(-1), np.arange(len(values))] = True
+    return distinct, np.packbits(bits, axis=1)
+
+
+def _sort_order(values: np.ndarray, descending: bool) -> np.ndarray:
+    """Rows with a value, best first; ties keep row order."""
+    rows = np.flatnonzero(~np.isnan(values)).astype(np.int32)
+    keys = -values[rows] if descending else values[rows]
+    return rows[np.argsort(keys, kind="stable")]
+
+
+class ProductIndex:
+    """Read-only filter and top-N index over one crawl's products.
+
+    A directory of memory-mapped `.npy` files, written once by `build`:
+
+    - one file per column in `RESULT_COLUMNS`
+    - `<column>_values.npy` and `<column>_bits.npy`: the distinct values of
+      each column in `BITMAP_COLUMNS` and a packed row bitmap per value
+    - `available_bits.npy`: packed bitmap of the products for sale
+    - `by_<key>.npy`: int32 rows with a value, best first, per `SORT_KEYS`
+    - `price_sorted.npy`: prices in `by_price` order, for range filters
+    - `stamp.npy`: the store stamp the index was built from, written last
+
+    Queries AND bitmaps, cut price ranges out of `by_price` with a binary
+    search and scan a sort order only until they have enough rows, so they
+    touch the pages of a few small arrays rather than the whole dataset.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+
+        def load(name: str) -> np.ndarray:
+            return np.load(self.directory / f"{name}.npy", mmap_mode="r")
+
+        self.stamp = np.load(self.directory / "stamp.npy")
+        self.columns = {name: load(name) for name in RESULT_COLUMNS}
+        self.values = {name: load(f"{name}_values") for name in BITMAP_COLUMNS}
+        # Value to bitmap row; the value arrays are small
+        self.positions = {
+            name: {value: i for i, value in enumerate(values.tolist())}
+            for name, values in self.values.items()
+        }
+        self.bits = {name: load(f"{name}_bits") for name in BITMAP_COLUMNS}
+        self.available_bits = load("available_bits")
+        self.orders = {key: load(f"by_{key}") for key in SORT_KEYS}
+        self.price_sorted = load("price_sorted")
+
+    def __len__(self) -> int:
+        return len(self.columns["code"])
+
+    @classmethod
+    def build(
+        cls, directory: Union[str, Path], columns: ProductColumns, stamp: np.ndarray
+    ) -> "ProductIndex":
+        """Write an index of `columns`, replacing any at `directory`."""
+        directory = Path(directory)
+        tmp_path = directory.with_name(directory.name + ".tmp")
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir(parents=True)
+
+        def save(name: str, array: np.ndarray) -> None:
+            np.save(tmp_path / f"{name}.npy", array)
+
+        for name in RESULT_COLUMNS:
+            save(name, getattr(columns, name))
+        for name in BITMAP_COLUMNS:
+            values, bits = _bitmaps(getattr(columns, name))
+            save(f"{name}_values", values)
+            save(f"{name}_bits", bits)
+        save("available_bits", np.packbits(columns.available))
+        for key, descending in SORT_KEYS.items():
+            save(f"by_{key}", _sort_order(getattr(columns, key), descending))
+        save("price_sorted", columns.price[_sort_order(columns.price, False)])
+        # Marks the index complete; a directory without it is rebuilt
+        save("stamp", stamp)
+
+        if directory.exists():
+            shutil.rmtree(directory)
+        os.replace(tmp_path, directory)
+        logger.info(f"Wrote query index of {len(columns)} products to {directory}")
+        return cls(directory)
+
+    def _unpack(self, bits: np.ndarray) -> np.ndarray:
+        return np.unpackbits(bits, count=len(self)).view(bool)
+
+    def _any_of(self, column: str, wanted: Union[str, Sequence[str]]) -> np.ndarray:
+        """Rows whose `column` is `wanted`, or any of several values."""
+        wanted = [wanted] if isinstance(wanted, str) else wanted
+        rows = [self.positions[column].get(value) for value in wanted]
+        rows = [row for row in rows if row is not None]
+        if not rows:
+            return np.zeros(len(self), dtype=bool)
+        return self._unpack(np.bitwise_or.reduce(self.bits[column][rows], axis=0))
+
+    def mask(
+        self,
+        category: Union[str, Sequence[str], None] = None,
+        country: Union[str, Sequence[str], None] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        available_only: bool = True,
+    ) -> np.ndarray:
+        """Boolean row mask of the products matching every filter given.
+
+        `category` and `country` match exactly, any of several if given a
+        sequence; the price range is inclusive.
+        """
+        mask = (
+            self._unpack(self.available_bits)
+            if available_only
+            else np.ones(len(self), dtype=bool)
+        )
+        if category is not None:
+            mask &= self._any_of("category", category)
+        if country is not None:
+            mask &= self._any_of("country", country)
+        if min_price is not None or max_price is not None:
+            low = (
+                np.searchsorted(self.price_sorted, min_price, "left")
+                if min_price is not None
+                else 0
+            )
+            high = (
+                np.searchsorted(self.price_sorted, max_price, "right")
+                if max_price is not None
+                else len(self.price_sorted)
+            )
+            in_range = np.zeros(len(self), dtype=bool)
+            in_range[self.orders["price"][low:high]] = True
+            mask &= in_range
+        return mask
+
+    def query(
+        self,
+        category: Union[str, Sequence[str], None] = None,
+        country: Union[str, Sequence[str], None] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        available_only: bool = True,
+        order_by: str = "alcohol_per_unit",
+        limit: int = 20,
+    ) -> Frame:
+        """The best `limit` products matching the filters (see `mask`), best
+        first by `order_by`; products without an `order_by` value are left
+        out."""
+        if order_by not in SORT_KEYS:
+            raise ValueError(
+                f"Cannot order by {order_by!r}; choose from {', '.join(SORT_KEYS)}"
+            )
+        mask = self.mask(category, country, min_price, max_price, available_only)
+        order = self.orders[order_by]
+        hits: List[np.ndarray] = []
+        found = 0
+        for start in range(0, len(order), SCAN_CHUNK):
+            if found >= limit:
+                break
+            chunk = order[start : start + SCAN_CHUNK]
+            matches = chunk[mask[chunk]]
+            hits.append(matches)
+            found += len(matches)
+        rows = np.concatenate(hits)[:limit] if hits else np.zeros(0, dtype=np.int32)
+        return {name: column[rows] for name, column in self.columns.items()}
+
+
+def index_path(source: str = "Vinmonopolet", path: Union[str, Path, None] = None):
+    return Path(path or SOURCES[source][0]).with_suffix(".index")
+
+
+def open_index(
+    source: str = "Vinmonopolet",
+    path: Union[str, Path, None] = None,
+    rebuild: bool = False,
+) -> ProductIndex:
+    """The query index of one source's store, rebuilt first when the store
+    changed since the index was written."""
+    default_path, key, _ = SOURCES[source]
+    store = ProductStore(path or default_path, key=key)
+    directory = index_path(source, store.path)
+    stamp = source_stamp(store)
+    if not rebuild and (directory / "stamp.npy").exists():
+        index = ProductIndex(directory)
+        if np.array_equal(index.stamp, stamp):
+            return index
+    return ProductIndex.build(directory, load_columns(source, store.path), stamp)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Filter and rank crawled products")
+    parser.add_argument("--source", choices=list(SOURCES), default="Vinmonopolet")
+    parser.add_argument("--store", type=Path, help="product store; default per source")
+    parser.add_argument("--category", action="append", help="repeat for any of")
+    parser.add_argument("--country", action="append", help="repeat for any of")
+    parser.add_argument("--min-price", type=float)
+    parser.add_argument("--max-price", type=float)
+    parser.add_argument(
+        "--include-unavailable", action="store_true", help="also expired products"
+    )
+    parser.add_argument(
+        "--order-by", choices=list(SORT_KEYS), default="alcohol_per_unit"
+    )
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument(
+        "--list", choices=BITMAP_COLUMNS, help="print the values of a column"
+    )
+    args = parser.parse_args()
+
+    index = open_index(args.source, args.store, args.rebuild)
+    if args.list:
+        for value in index.values[args.list].tolist():
+            print(value or "-")
+    else:
+        start = time.perf_counter()
+        result = index.query(
+            args.category,
+            args.country,
+            args.min_price,
+            args.max_price,
+            not args.include_unavailable,
+            args.order_by,
+            args.top,
+        )
+        elapsed = time.perf_counter() - start
+        for i in range(len(result["code"])):
+            print(
+                f"{result['code'][i]:>8}  {result['price'][i]:>9.2f}  "
+                f"{result['alcohol_per_unit'][i]:>6.3f}  {result['name'][i]} "
+                f"[{result['category'][i]}, {result['country'][i]}]"
+            )
+        logger.info(
+            f"{len(result['code'])} of {len(index)} products in "
+            f"{elapsed * 1000:.2f} ms"
+        )
@@ -0,0 +1,178 @@
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from comparison import Frame, top_products
+from stock_export import iter_stock_entries, parse_timestamps
+from stock_history import SeriesKey, StockHistory, merge_readings
+
+HOUR_MS = 3_600_000
+
+
+@dataclass
+class StockSeries:
+    """Every series in CSR layout: series `i`, with key `keys[i]`, spans
+    `offsets[i]:offsets[i + 1]` of the time-sorted `timestamps` and `levels`."""
+
+    keys: List[SeriesKey]
+    offsets: np.ndarray
+    # Milliseconds since the epoch
+    timestamps: np.ndarray
+    levels: np.ndarray
+
+    @classmethod
+    def from_history(cls, history: StockHistory) -> "StockSeries":
+        return cls(list(history.keys), *history.arrays())
+
+    @classmethod
+    def from_export(cls, export_path: Union[str, Path]) -> "StockSeries":
+        """Load a `mongoexport` of the Stores collection, streaming it."""
+        index: Dict[SeriesKey, int] = {}
+        series, timestamps, levels = [], [], []
+        for entry in iter_stock_entries(export_path):
+            key = (entry.store, entry.product_id)
+            series.append(np.full(len(entry.levels), index.setdefault(key, len(index))))
+            timestamps.append(entry.timestamps)
+            levels.append(entry.levels)
+        if not index:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls([], np.zeros(1, dtype=np.int64), empty, empty.astype(np.int16))
+        return cls(
+            list(index),
+            *merge_readings(
+                np.concatenate(series),
+                np.concatenate(timestamps),
+                np.concatenate(levels),
+                len(index),
+            ),
+        )
+
+    def series_ids(self) -> np.ndarray:
+        """The series of every reading."""
+        counts = np.diff(self.offsets)
+        return np.repeat(np.arange(len(counts)), counts)
+
+
+def stock_metrics(
+    series: StockSeries, min_restock: int = 1, as_of: Optional[int] = None
+) -> Frame:
+    """Sales, restocks and time to sell-out of every series, in one pass.
+
+    Readings are only recorded when the level changes, so every drop is a
+    sale, every rise of at least `min_restock` a restock, and a level holds
+    until the next reading or, after the last one, until `as_of`
+    (milliseconds; the latest reading of any series by default). Hours spent
+    at level 0 are left out of `in_stock_hours`, since nothing could be sold
+    then. `hours_to_sellout` extrapolates the current level at the series'
+    sales rate; it is infinite for series that never sold.
+    """
+    count = len(series.keys)
+    ids = series.series_ids()
+    levels = series.levels.astype(np.int64)
+    timestamps = series.timestamps
+
+    # Steps between consecutive readings of the same series
+    same = ids[1:] == ids[:-1]
+    step_ids = ids[1:][same]
+    change = (levels[1:] - levels[:-1])[same]
+    hours = ((timestamps[1:] - timestamps[:-1]) / HOUR_MS)[same]
+    in_stock = levels[:-1][same] > 0
+
+    def total(weights: Optional[np.ndarray] = None) -> np.ndarray:
+        return np.bincount(step_ids, weights=weights, minlength=count)
+
+    restock = change >= min_restock
+    sold = total(np.where(change < 0, -change, 0))
+    in_stock_hours = total(np.where(in_stock, hours, 0))
+    # Time of the last restock per series: steps are time-sorted per series
+    last_restock = np.full(count, np.datetime64("NaT"), dtype="datetime64[ms]")
+    restock_steps = np.flatnonzero(restock)
+    last_restock[step_ids[restock_steps]] = timestamps[1:][same][restock_steps]
+
+    counts = np.diff(series.offsets)
+    nonempty = counts > 0
+    firsts = series.offsets[:-1][nonempty]
+    lasts = series.offsets[1:][nonempty] - 1
+    first = np.full(count, np.datetime64("NaT"), dtype="datetime64[ms]")
+    last = first.copy()
+    level = np.zeros(count, dtype=np.int64)
+    first[nonempty] = timestamps[firsts]
+    last[nonempty] = timestamps[lasts]
+    level[nonempty] = levels[lasts]
+
+    # The last level holds from the last reading until `as_of`
+    if len(timestamps):
+        as_of = timestamps.max() if as_of is None else as_of
+        tail = np.zeros(count)
+        tail[nonempty] = np.maximum(as_of - timestamps[lasts], 0) / HOUR_MS
+        in_stock_hours = in_stock_hours + np.where(level > 0, tail, 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sales_per_hour = np.where(in_stock_hours > 0, sold / in_stock_hours, np.nan)
+        hours_to_sellout = np.where(
+            level == 0,
+            0.0,
+            np.where(sales_per_hour > 0, level / sales_per_hour, np.inf),
+        )
+
+    return {
+        "store": np.array([key[0] for key in series.keys], dtype=str),
+        "product_id": np.array([key[1] for key in series.keys], dtype=str),
+        "readings": counts,
+        "first": first,
+        "last": last,
+        "level": level,
+        "sold": sold.astype(np.int64),
+        "in_stock_hours": in_stock_hours,
+        "sales_per_hour": sales_per_hour,
+        "restocks": total(restock.astype(np.float64)).astype(np.int64),
+        "restocked": total(np.where(restock, change, 0)).astype(np.int64),
+        "last_restock": last_restock,
+        "hours_to_sellout": hours_to_sellout,
+    }
+
+
+def fastest_moving(metrics: Frame, count: int = 20, per_store: bool = False) -> Frame:
+    """The `count` series selling the most per hour, overall or per store."""
+    return top_products(
+        metrics, count, keys=("store",) if per_store else (), value="sales_per_hour"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stock level analytics")
+    parser.add_argument(
+        "source",
+        type=Path,
+        help="a mongoexport of the Stores collection, or a stock_history directory",
+    )
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--per-store", action="store_true")
+    parser.add_argument(
+        "--as-of",
+        help="ISO-8601 UTC end of the observed period; default the last reading",
+    )
+    args = parser.parse_args()
+
+    series = (
+        StockSeries.from_history(StockHistory(args.source))
+        if args.source.is_dir()
+        else StockSeries.from_export(args.source)
+    )
+    as_of = parse_timestamps([args.as_of])[0] if args.as_of else None
+    metrics = stock_metrics(series, as_of=as_of)
+    print(
+        f"{len(series.keys)} series, {len(series.levels)} readings, "
+        f"{metrics['sold'].sum()} units sold, {metrics['restocks'].sum()} restocks"
+    )
+    top = fastest_moving(metrics, args.top, args.per_store)
+    for i in range(len(top["rank"])):
+        print(
+            f"  {top['rank'][i]:>3}. {top['store'][i]} / {top['product_id'][i]}: "
+            f"{top['sales_per_hour'][i]:.2f}/h, level {top['level'][i]}, "
+            f"sold out in {top['hours_to_sellout'][i]:.0f} h, "
+            f"{top['restocks'][i]} restocks"
+        )
@@ -0,0 +1,220 @@
+import json
+import re
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+# Store fields tried, in order, for the name readings are filed under
+STORE_NAME_FIELDS = ("displayName", "name", "pointOfServiceId")
+# Unread text that may be the rest of a number cut off by the buffer's end
+_NUMBER_TAIL = re.compile(r"[0-9+\-.eE]*\Z")
+
+
+class StockReading(NamedTuple):
+    store: str
+    product_id: str
+    # Milliseconds since the epoch, UTC
+    timestamp: int
+    level: int
+
+
+class StockEntry(NamedTuple):
+    """All readings of one `stockInfo` entry, as arrays."""
+
+    store: str
+    product_id: str
+    timestamps: np.ndarray
+    levels: np.ndarray
+
+
+def parse_timestamps(values: Sequence[str]) -> np.ndarray:
+    """ISO-8601 UTC strings (`...Z`) to int64 milliseconds since the epoch."""
+    return (
+        np.array([v.rstrip("Z") for v in values], dtype="datetime64[ms]")
+        .astype(np.int64)
+        .reshape(-1)
+    )
+
+
+def _number(value: Any) -> int:
+    """A plain or canonical extended JSON (`{"$numberInt": "60"}`) integer."""
+    if isinstance(value, dict):
+        value = next(iter(value.values()))
+    return int(value)
+
+
+def _timestamp(value: Any) -> Union[str, int]:
+    """The ISO string or millisecond count inside an extended JSON date."""
+    if isinstance(value, dict):
+        value = value.get("$date", value)
+    if isinstance(value, dict):
+        # Canonical mode: {"$date": {"$numberLong": "1729238410398"}}
+        return _number(value)
+    return value
+
+
+def entry_readings(entry: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Timestamps (int64 milliseconds) and levels of one `stockInfo` entry."""
+    readings = entry.get("stockLevels") or []
+    stamps = [_timestamp(r["timestamp"]) for r in readings]
+    if all(isinstance(s, str) for s in stamps):
+        timestamps = parse_timestamps(stamps)
+    else:
+        timestamps = np.array(
+            [s if isinstance(s, int) else parse_timestamps([s])[0] for s in stamps],
+            dtype=np.int64,
+        )
+    return timestamps, np.array([_number(r["level"]) for r in readings], dtype=int)
+
+
+def store_name(store: Dict[str, Any]) -> str:
+    for field in STORE_NAME_FIELDS:
+        if store.get(field):
+            return str(store[field])
+    raise ValueError(f"Store without any of {', '.join(STORE_NAME_FIELDS)}")
+
+
+class _Reader:
+    """Incremental JSON tokens from a text file, a chunk at a time.
+
+    Values are decoded with `json.JSONDecoder.raw_decode`; the buffer only
+    ever holds the current value plus one unread chunk.
+    """
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        more = self.f.read(self.chunk_size)
+        self.eof = not more
+        self.buffer = self.buffer[self.position :] + more
+        self.position = 0
+        return bool(more)
+
+    def peek(self) -> str:
+        """The next non-whitespace character, or "" at the end of the file."""
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position] in " \t\r\n"
+            ):
+                self.position += 1
+            if self.position < len(self.buffer) or not self._fill():
+                return self.buffer[self.position : self.position + 1]
+
+    def expect(self, characters: str) -> str:
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(
+                f"Expected one of {characters!r} in export, found {character!r}"
+            )
+        self.position += 1
+        return character
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number cut off by the end of the buffer decodes as a shorter one
+            if _NUMBER_TAIL.match(self.buffer, end) and self._fill():
+                continue
+            self.position = end
+            return value
+
+
+def _store_entries(reader: _Reader) -> Iterator[StockEntry]:
+    """Entries of the store object starting at the reader, one at a time.
+
+    Only the store's other fields and the current `stockInfo` entry are held
+    in memory. Entries seen before `displayName` (which mongoexport writes
+    first) wait for the end of the store, in case it comes later.
+    """
+    reader.expect("{")
+    fields: Dict[str, Any] = {}
+    waiting: List[Dict[str, Any]] = []
+
+    def entry(store: str, info: Dict[str, Any]) -> StockEntry:
+        return StockEntry(store, str(info["productId"]), *entry_readings(info))
+
+    if reader.peek() == "}":
+        reader.expect("}")
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == "stockInfo" and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    info = reader.value()
+                    if fields.get(STORE_NAME_FIELDS[0]):
+                        yield entry(store_name(fields), info)
+                    else:
+                        waiting.append(info)
+                    if reader.expect(",]") == "]":
+                        break
+        else:
+            fields[key] = reader.value()
+        if reader.expect(",}") == "}":
+            break
+    if waiting:
+        store = store_name(fields)
+        for info in waiting:
+            yield entry(store, info)
+
+
+def iter_stock_entries(
+    export_path: Union[str, Path], chunk_size: int = 1 << 20
+) -> Iterator[StockEntry]:
+    """Stream the `stockInfo` entries of a `mongoexport` of the Stores collection.
+
+    Reads both export formats, one document per line (the default) and a
+    JSON array (`--jsonArray`), in relaxed or canonical extended JSON. Memory
+    use is bounded by the largest single entry, not by the export's size.
+    """
+    with open(export_path, "r", encoding="utf-8") as f:
+        reader = _Reader(f, chunk_size)
+        in_array = reader.peek() == "["
+        if in_array:
+            reader.expect("[")
+            if reader.peek() == "]":
+                return
+        while reader.peek():
+            yield from _store_entries(reader)
+            if in_array and reader.expect(",]") == "]":
+                return
+        if in_array:
+            raise ValueError(f"{export_path} ends inside its JSON array")
+
+
+def iter_stock_readings(
+    export_path: Union[str, Path], chunk_size: int = 1 << 20
+) -> Iterator[StockReading]:
+    """Every reading of an export as `(store, product_id, timestamp, level)`."""
+    for entry in iter_stock_entries(export_path, chunk_size):
+        for timestamp, level in zip(entry.timestamps.tolist(), entry.levels.tolist()):
+            yield StockReading(entry.store, entry.product_id, timestamp, level)
@@ -0,0 +1,371 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from stock_export import iter_stock_entries, parse_timestamps
+
+logger = logging.getLogger(__name__)
+
+SeriesKey = Tuple[str, str]
+Readings = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# One reading waiting in the append log, before compaction
+PENDING_DTYPE = np.dtype([("series", "<i4"), ("timestamp", "<i8"), ("level", "<i2")])
+LEVEL_DTYPE = np.int16
+LEVEL_MAX = np.iinfo(LEVEL_DTYPE).max
+
+
+def merge_readings(
+    series: np.ndarray, timestamps: np.ndarray, levels: np.ndarray, series_count: int
+) -> Readings:
+    """Sort readings by series and time into `(offsets, timestamps, levels)`.
+
+    Of several readings for the same series and time, the last one given wins.
+    """
+    order = np.lexsort((np.arange(len(series)), timestamps, series))
+    series, timestamps, levels = series[order], timestamps[order], levels[order]
+    last = np.ones(len(series), dtype=bool)
+    last[:-1] = (series[1:] != series[:-1]) | (timestamps[1:] != timestamps[:-1])
+    series, timestamps, levels = series[last], timestamps[last], levels[last]
+
+    offsets = np.zeros(series_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(series, minlength=series_count), out=offsets[1:])
+    return offsets, timestamps, levels.astype(LEVEL_DTYPE)
+
+
+def decode_timestamps(deltas: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Undo the per-series delta encoding of `deltas` (see `Segment`)."""
+    deltas = np.array(deltas, dtype=np.int64)
+    lengths = np.diff(offsets)
+    firsts, lengths = offsets[:-1][lengths > 0], lengths[lengths > 0]
+
+    # Sum deltas within each series only, then add its absolute start
+    bases = deltas[firsts]
+    deltas[firsts] = 0
+    within = np.cumsum(deltas)
+    return within - np.repeat(within[firsts] - bases, lengths)
+
+
+class Segment:
+    """An immutable block of readings in three memory-mapped `.npy` columns,
+    grouped by series and sorted by time within each series:
+
+    - `offsets.npy`: int64, where each series starts (CSR layout)
+    - `timestamps.npy`: int64 milliseconds, delta-encoded per series (the
+      first reading of a series holds the absolute time)
+    - `levels.npy`: int16
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offsets = np.load(path / "offsets.npy")
+        self.timestamps = np.load(path / "timestamps.npy", mmap_mode="r")
+        self.levels = np.load(path / "levels.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    @classmethod
+    def write(cls, path: Path, readings: Readings) -> "Segment":
+        offsets, timestamps, levels = readings
+        deltas = np.diff(timestamps, prepend=0)
+        firsts = offsets[:-1][np.diff(offsets) > 0]
+        deltas[firsts] = timestamps[firsts]
+        path.mkdir(parents=True)
+        np.save(path / "timestamps.npy", deltas)
+        np.save(path / "levels.npy", levels)
+        np.save(path / "offsets.npy", offsets)
+        return cls(path)
+
+    def series(self, series: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Timestamps and levels of one series."""
+        if series >= len(self.offsets) - 1:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=LEVEL_DTYPE)
+        low, high = self.offsets[series], self.offsets[series + 1]
+        return (
+            decode_timestamps(self.timestamps[low:high], np.array([0, high - low])),
+            np.array(self.levels[low:high]),
+        )
+
+    def readings(self) -> Readings:
+        """Every reading as `(series, timestamps, levels)`."""
+        counts = np.diff(self.offsets)
+        return (
+            np.repeat(np.arange(len(counts), dtype=np.int32), counts),
+            decode_timestamps(self.timestamps, self.offsets),
+            np.array(self.levels),
+        )
+
+
+def _stack(parts: Sequence[Readings]) -> Readings:
+    return tuple(np.concatenate([p[column] for p in parts]) for column in range(3))
+
+
+class StockHistory:
+    """Stock level readings per (store, product), stored column-wise on disk.
+
+    Readings live in immutable `Segment`s listed, oldest first, in
+    `segments.json`. Appends go to a small binary log (`pending.bin`);
+    `compact` writes the log out as a new segment without touching older
+    ones, and merges the smallest neighbouring pair whenever there are more
+    than `max_segments`. Queries read only the slices of one series from
+    each segment, so neither appending nor querying needs the whole history
+    in RAM. Where segments disagree about a reading, the later one wins.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = "stock_history",
+        compact_every: int = 100_000,
+        max_segments: int = 16,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compact_every = compact_every
+        self.max_segments = max_segments
+        self.keys: List[SeriesKey] = []
+        self.index: Dict[SeriesKey, int] = {}
+        series_path = self.directory / "series.json"
+        if series_path.exists():
+            with open(series_path, "r", encoding="utf-8") as f:
+                self.keys = [tuple(key) for key in json.load(f)]
+            self.index = {key: i for i, key in enumerate(self.keys)}
+        self._buffer: List[np.ndarray] = []
+        self._load_segments()
+        self._load_pending()
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    def _load_segments(self) -> None:
+        names = []
+        if self._path("segments.json").exists():
+            with open(self._path("segments.json"), "r", encoding="utf-8") as f:
+                names = json.load(f)
+        self.segments = [Segment(self._path("segments") / name) for name in names]
+
+        # Left behind by a crash before the manifest listed or dropped them
+        if self._path("segments").exists():
+            for path in self._path("segments").iterdir():
+                if path.name not in names:
+                    shutil.rmtree(path)
+
+    def _load_pending(self) -> None:
+        path = self._path("pending.bin")
+        self.pending = (
+            np.fromfile(path, dtype=PENDING_DTYPE)
+            if path.exists()
+            else np.zeros(0, dtype=PENDING_DTYPE)
+        )
+
+    def __enter__(self) -> "StockHistory":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.flush()
+
+    def __len__(self) -> int:
+        """Stored readings, counting a reading repeated across segments twice."""
+        return (
+            sum(map(len, self.segments))
+            + len(self.pending)
+            + sum(map(len, self._buffer))
+        )
+
+    def series_id(self, store: str, product_id: str) -> int:
+        key = (str(store), str(product_id))
+        if key not in self.index:
+            self.index[key] = len(self.keys)
+            self.keys.append(key)
+        return self.index[key]
+
+    def append(
+        self,
+        store: str,
+        product_id: str,
+        timestamps: Union[Sequence[int], np.ndarray],
+        levels: Union[Sequence[int], np.ndarray],
+    ) -> None:
+        """Add readings (int64 milliseconds, levels) for one series."""
+        levels = np.asarray(levels)
+        if len(levels) and (levels.min() < 0 or levels.max() > LEVEL_MAX):
+            raise ValueError(
+                f"Stock levels for {store}/{product_id} outside 0..{LEVEL_MAX}"
+            )
+        readings = np.empty(len(levels), dtype=PENDING_DTYPE)
+        readings["series"] = self.series_id(store, product_id)
+        readings["timestamp"] = timestamps
+        readings["level"] = levels
+        self._buffer.append(readings)
+
+    def flush(self) -> None:
+        """Persist buffered readings to the append log, compacting if it grew."""
+        self._write_pending()
+        if len(self.pending) >= self.compact_every:
+            self.compact()
+
+    def _write_pending(self) -> None:
+        if not self._buffer:
+            return
+        readings = np.concatenate(self._buffer)
+        self._buffer.clear()
+        self._write_json("series.json", self.keys)
+        with open(self._path("pending.bin"), "ab") as f:
+            f.write(readings.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending = np.concatenate([self.pending, readings])
+
+    def _write_json(self, name: str, value: Any) -> None:
+        tmp_path = self._path(f"{name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(name))
+
+    def _write_segment(self, readings: Readings) -> Segment:
+        """Write `(series, timestamps, levels)` as a new, not yet listed segment."""
+        names = [segment.path.name for segment in self.segments]
+        name = f"{int(max(names, default='0')) + 1:08d}"
+        return Segment.write(
+            self._path("segments") / name, merge_readings(*readings, len(self.keys))
+        )
+
+    def _replace_segments(self, segments: List[Segment]) -> None:
+        """List `segments` in the manifest and delete the ones no longer listed."""
+        self._write_json("segments.json", [s.path.name for s in segments])
+        dropped = {s.path for s in self.segments} - {s.path for s in segments}
+        # Drop the memory maps before deleting the files they map
+        self.segments = segments
+        for path in dropped:
+            shutil.rmtree(path)
+
+    def compact(self) -> None:
+        """Write the append log out as a new segment."""
+        self._write_pending()
+        if not len(self.pending):
+            return
+        segment = self._write_segment(
+            (self.pending["series"], self.pending["timestamp"], self.pending["level"])
+        )
+        self._replace_segments(self.segments + [segment])
+        # A crash before this replays the log into an identical later segment
+        self._path("pending.bin").unlink(missing_ok=True)
+        self._load_pending()
+        while len(self.segments) > self.max_segments:
+            self._merge_smallest_pair()
+        logger.info(
+            f"Compacted {len(segment)} readings into {segment.path}, "
+            f"{len(self.segments)} segments in {self.directory}"
+        )
+
+    def _merge_smallest_pair(self) -> None:
+        # Only neighbours are merged, so the newer of two readings still wins
+        sizes = [len(a) + len(b) for a, b in zip(self.segments, self.segments[1:])]
+        i = int(np.argmin(sizes))
+        merged = self._write_segment(
+            _stack([self.segments[i].readings(), self.segments[i + 1].readings()])
+        )
+        self._replace_segments(self.segments[:i] + [merged] + self.segments[i + 2 :])
+
+    def _pending_readings(self) -> np.ndarray:
+        return np.concatenate([self.pending] + self._buffer)
+
+    def arrays(self) -> Readings:
+        """All readings as `(offsets, timestamps, levels)`, pending ones included.
+
+        Series `i` (see `keys`) spans `offsets[i]:offsets[i + 1]` of the
+        decoded, time-sorted `timestamps` and `levels`. Unlike `query`, this
+        loads the whole history.
+        """
+        pending = self._pending_readings()
+        return merge_readings(
+            *_stack(
+                [segment.readings() for segment in self.segments]
+                + [(pending["series"], pending["timestamp"], pending["level"])]
+            ),
+            len(self.keys),
+        )
+
+    def query(
+        self,
+        store: str,
+        product_id: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Readings of one series with `start <= timestamp < end` (milliseconds).
+
+        Returns `(timestamps, levels)` sorted by time.
+        """
+        series = self.index.get((str(store), str(product_id)))
+        if series is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=LEVEL_DTYPE)
+
+        pending = self._pending_readings()
+        pending = pending[pending["series"] == series]
+        parts = [segment.series(series) for segment in self.segments]
+        parts.append((pending["timestamp"], pending["level"]))
+        timestamps = np.concatenate([part[0] for part in parts])
+        levels = np.concatenate([part[1] for part in parts])
+        if len(parts) > 1 or len(pending):
+            _, timestamps, levels = merge_readings(
+                np.zeros(len(timestamps), dtype=np.int32), timestamps, levels, 1
+            )
+
+        low = 0 if start is None else np.searchsorted(timestamps, start)
+        high = len(timestamps) if end is None else np.searchsorted(timestamps, end)
+        return timestamps[low:high], levels[low:high].astype(LEVEL_DTYPE)
+
+    def iter_series(self) -> Iterator[Tuple[SeriesKey, np.ndarray, np.ndarray]]:
+        """Every series as `((store, product_id), timestamps, levels)`."""
+        offsets, timestamps, levels = self.arrays()
+        for i, key in enumerate(self.keys):
+            low, high = offsets[i], offsets[i + 1]
+            yield key, timestamps[low:high], levels[low:high]
+
+
+def import_mongo_export(export_path: Union[str, Path], history: StockHistory) -> int:
+    """Append every reading of a `mongoexport` of the Stores collection."""
+    count = unflushed = 0
+    for entry in iter_stock_entries(export_path):
+        history.append(entry.store, entry.product_id, entry.timestamps, entry.levels)
+        count += len(entry.levels)
+        unflushed += len(entry.levels)
+        if unflushed >= 10_000:
+            history.flush()
+            unflushed = 0
+    history.flush()
+    return count
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Columnar stock level history")
+    parser.add_argument("--directory", default="stock_history")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_command = commands.add_parser("import", help="import a Stores export")
+    import_command.add_argument("export", type=Path)
+    query_command = commands.add_parser("query", help="print one series")
+    query_command.add_argument("store")
+    query_command.add_argument("product_id")
+    query_command.add_argument("--start", help="ISO-8601 time, inclusive")
+    query_command.add_argument("--end", help="ISO-8601 time, exclusive")
+    args = parser.parse_args()
+
+    with StockHistory(args.directory) as history:
+        if args.command == "import":
+            count = import_mongo_export(args.export, history)
+            history.compact()
+            print(f"Imported {count} readings into {len(history.keys)} series")
+        else:
+            start = parse_timestamps([args.start])[0] if args.start else None
+            end = parse_timestamps([args.end])[0] if args.end else None
+            timestamps, levels = history.query(args.store, args.product_id, start, end)
+            for timestamp, level in zip(timestamps.astype("datetime64[ms]"), levels):
+                print(f"{timestamp}Z\t{level}")
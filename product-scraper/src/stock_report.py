@@ -0,0 +1,211 @@
+import argparse
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import matplotlib
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.backends.backend_pdf import PdfPages
+
+from stock_analytics import StockSeries, stock_metrics
+from stock_history import StockHistory
+
+# Headless: reports are rendered in cron jobs and worker processes
+matplotlib.use("Agg")
+
+logger = logging.getLogger(__name__)
+
+
+def slug(text: str) -> str:
+    return re.sub(r"[^\w]+", "-", text, flags=re.UNICODE).strip("-").lower()
+
+
+def render_store(
+    store: str,
+    product_ids: Sequence[str],
+    offsets: np.ndarray,
+    timestamps: np.ndarray,
+    levels: np.ndarray,
+    sales_per_hour: np.ndarray,
+    out_dir: Union[str, Path],
+    per_page: int = 12,
+    columns: int = 3,
+    file_format: str = "pdf",
+) -> List[Path]:
+    """Plot every product of one store as small multiples, `per_page` a page.
+
+    Writes one multi-page PDF, or one PNG per page. Levels are drawn as
+    steps, since a level holds until the next reading. All panels of a store
+    share the time axis so products can be compared at a glance.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    dates = timestamps.astype("datetime64[ms]")
+    span = (dates.min(), dates.max() + np.timedelta64(1, "h")) if len(dates) else None
+    rows = -(-min(per_page, len(product_ids)) // columns)
+    page_count = -(-len(product_ids) // per_page)
+    paths = []
+    pdf = None
+    if file_format == "pdf":
+        paths.append(out_dir / f"{slug(store)}.pdf")
+        pdf = PdfPages(paths[0])
+
+    try:
+        for page in range(page_count):
+            fig, axes = plt.subplots(
+                rows,
+                columns,
+                figsize=(5 * columns, 2.6 * rows),
+                squeeze=False,
+                sharex=True,
+            )
+            first = page * per_page
+            for i, ax in enumerate(axes.flat):
+                series = first + i
+                if series >= len(product_ids):
+                    ax.set_visible(False)
+                    continue
+                low, high = offsets[series], offsets[series + 1]
+                ax.plot(
+                    dates[low:high],
+                    levels[low:high],
+                    drawstyle="steps-post",
+                    marker="o",
+                    markersize=2,
+                    linewidth=1,
+                )
+                rate = sales_per_hour[series]
+                ax.set_title(
+                    f"{product_ids[series]}"
+                    + (f" ({rate:.2f}/h)" if not np.isnan(rate) else ""),
+                    fontsize=9,
+                )
+                ax.set_ylim(bottom=0)
+                if span is not None:
+                    ax.set_xlim(*span)
+                ax.tick_params(labelsize=7)
+                # Panels with no panel below them on this page carry the time
+                # labels
+                last = min(first + per_page, len(product_ids))
+                ax.tick_params(labelbottom=series + columns >= last)
+            locator = mdates.AutoDateLocator()
+            axes[-1, 0].xaxis.set_major_locator(locator)
+            axes[-1, 0].xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+            fig.suptitle(f"Stock levels at {store} ({page + 1}/{page_count})")
+            # Fixed margins: tight_layout measures every tick label, which
+            # took most of the rendering time
+            fig.subplots_adjust(
+                left=0.05,
+                right=0.98,
+                bottom=0.8 / fig.get_figheight(),
+                top=1 - 0.6 / fig.get_figheight(),
+                hspace=0.45,
+                wspace=0.15,
+            )
+            if pdf is not None:
+                pdf.savefig(fig)
+            else:
+                paths.append(out_dir / f"{slug(store)}-{page + 1:03d}.png")
+                fig.savefig(paths[-1], dpi=100)
+            plt.close(fig)
+    finally:
+        if pdf is not None:
+            pdf.close()
+    return paths
+
+
+def render_report(
+    series: StockSeries,
+    out_dir: Union[str, Path] = "stock_reports",
+    stores: Optional[Sequence[str]] = None,
+    workers: Optional[int] = None,
+    **options,
+) -> Dict[str, List[Path]]:
+    """Render every store's products in parallel worker processes.
+
+    Each store becomes one report (see `render_store`), products ordered by
+    sales rate, fastest first. `options` are passed on to `render_store`.
+    """
+    metrics = stock_metrics(series)
+    store_names = metrics["store"]
+    # Fastest movers first within each store; never-sold products last
+    order = np.lexsort(
+        (-np.nan_to_num(metrics["sales_per_hour"], nan=-1.0), store_names)
+    )
+    wanted = set(stores) if stores is not None else None
+
+    jobs = []
+    for store in np.unique(store_names):
+        if wanted is not None and store not in wanted:
+            continue
+        selected = order[store_names[order] == store]
+        lows, highs = series.offsets[selected], series.offsets[selected + 1]
+        offsets = np.zeros(len(selected) + 1, dtype=np.int64)
+        np.cumsum(highs - lows, out=offsets[1:])
+        # Positions of the selected series' readings, in the new order
+        readings = np.arange(offsets[-1]) + np.repeat(lows - offsets[:-1], highs - lows)
+        jobs.append(
+            (
+                str(store),
+                metrics["product_id"][selected].tolist(),
+                offsets,
+                series.timestamps[readings],
+                series.levels[readings],
+                metrics["sales_per_hour"][selected],
+                out_dir,
+            )
+        )
+
+    start_time = time.time()
+    reports = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {
+            job[0]: executor.submit(render_store, *job, **options) for job in jobs
+        }
+        for store, future in futures.items():
+            reports[store] = future.result()
+    logger.info(
+        f"Rendered {sum(map(len, reports.values()))} report files for "
+        f"{len(reports)} stores in {time.time() - start_time:.2f} seconds"
+    )
+    return reports
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Render stock level reports")
+    parser.add_argument(
+        "source",
+        type=Path,
+        help="a mongoexport of the Stores collection, or a stock_history directory",
+    )
+    parser.add_argument("--out", type=Path, default=Path("stock_reports"))
+    parser.add_argument("--store", action="append", help="only these stores")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--per-page", type=int, default=12)
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--format", choices=("pdf", "png"), default="pdf")
+    args = parser.parse_args()
+
+    series = (
+        StockSeries.from_history(StockHistory(args.source))
+        if args.source.is_dir()
+        else StockSeries.from_export(args.source)
+    )
+    reports = render_report(
+        series,
+        args.out,
+        stores=args.store,
+        workers=args.workers,
+        per_page=args.per_page,
+        columns=args.columns,
+        file_format=args.format,
+    )
+    for store, paths in reports.items():
+        print(f"{store}: {', '.join(map(str, paths))}")
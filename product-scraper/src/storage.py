@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+def iter_json_array(
+    path: Union[str, Path], chunk_size: int = 1 << 20
+) -> Iterator[Dict[str, Any]]:
+    """Yield the objects of a JSON array file one at a time.
+
+    Only a chunk of text and the current object are held in memory, so a
+    compacted store can be scanned without materialising the whole list.
+    Elements must be objects: a number split across chunks would not be
+    detected as truncated.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer:
+            return
+        if buffer[0] != "[":
+            raise ValueError(f"{path} does not contain a JSON array")
+        position = 1
+        eof = False
+
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                if position >= len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, position)
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(chunk_size)
+                eof = not more
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            yield item
+
+
+class ProductStore:
+    """Append-only product storage with periodic compaction.
+
+    New products are appended once as JSON Lines to `<name>.jsonl` and made
+    durable in fsync'd batches. Compaction folds the log into the JSON array
+    file (the `vinmonopol_products.json` shape the rest of the repo reads) and
+    truncates the log. Readers see the compacted file followed by the log, with
+    later records for the same key replacing earlier ones.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = "vinmonopol_products.json",
+        key: str = "code",
+        batch_size: int = 100,
+        compact_every: int = 5000,
+    ):
+        self.path = Path(path)
+        self.log_path = self.path.with_suffix(".jsonl")
+        self.key = key
+        self.batch_size = batch_size
+        self.compact_every = compact_every
+        self._buffer: List[str] = []
+        self._since_compaction = 0
+
+    def __enter__(self) -> "ProductStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def append(self, product: Union[BaseModel, Dict[str, Any]]) -> None:
+        if isinstance(product, BaseModel):
+            # By alias, so stored records keep the source API's field names
+            line = product.model_dump_json(by_alias=True)
+        else:
+            line = json.dumps(product, ensure_ascii=False)
+        self._buffer.append(line)
+        if len(self._buffer) >= self.batch_size:
+            self.commit()
+
+    def commit(self) -> None:
+        """Write buffered products to the log and fsync it."""
+        if not self._buffer:
+            return
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(self._buffer) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        logger.debug(f"Committed {len(self._buffer)} products to {self.log_path}")
+        self._since_compaction += len(self._buffer)
+        self._buffer.clear()
+        if self.compact_every and self._since_compaction >= self.compact_every:
+            self.compact()
+
+    def close(self) -> None:
+        self.commit()
+        if self.log_path.exists():
+            self.compact()
+
+    def iter_raw(self) -> Iterator[Dict[str, Any]]:
+        """Yield stored records in write order, including superseded ones."""
+        if self.path.exists():
+            yield from iter_json_array(self.path)
+        if self.log_path.exists():
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash mid-commit can leave a torn final line
+                        logger.warning(
+                            f"Skipping unreadable line {line_number} in {self.log_path}"
+                        )
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Return the latest record per key, in order of first appearance."""
+        records: Dict[Any, Dict[str, Any]] = {}
+        for record in self.iter_raw():
+            records[record.get(self.key)] = record
+        return list(records.values())
+
+    def keys(self) -> List[Any]:
+        return list(dict.fromkeys(record.get(self.key) for record in self.iter_raw()))
+
+    def compact(self) -> None:
+        """Rewrite the JSON array file from file + log, then drop the log.
+
+        Records are spilled to a scratch file as they are read, and only the
+        spill position of each key's latest record is kept, so compaction
+        needs memory per key rather than per stored byte.
+        """
+        # Key order is first appearance; the position is of the latest record
+        latest: Dict[Any, Tuple[int, int]] = {}
+        spill_path = self.path.with_suffix(".json.spill")
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(spill_path, "w+b") as spill:
+            for record in self.iter_raw():
+                # Indented as an element of the array, as json.dump would
+                text = json.dumps(record, ensure_ascii=False, indent=2)
+                data = text.replace("\n", "\n  ").encode("utf-8")
+                latest[record.get(self.key)] = (spill.tell(), len(data))
+                spill.write(data)
+
+            with open(tmp_path, "wb") as f:
+                f.write(b"[")
+                for index, (offset, length) in enumerate(latest.values()):
+                    spill.seek(offset)
+                    f.write(b",\n  " if index else b"\n  ")
+                    f.write(spill.read(length))
+                f.write(b"\n]" if latest else b"]")
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        spill_path.unlink()
+        self.log_path.unlink(missing_ok=True)
+        self._since_compaction = 0
+        logger.info(f"Compacted {len(latest)} products into {self.path}")
+
+    def clear(self) -> None:
+        self._buffer.clear()
+        self._since_compaction = 0
+        self.path.unlink(missing_ok=True)
+        self.log_path.unlink(missing_ok=True)
@@ -92,18 +92,21 @@ class Systembolagetprodukt(BaseModel):
     images: Optional[List[SystembolagetImage]] = Field(default_factory=list)
 
     @computed_field
+    @property
     def full_name(self) -> str:
         if self.product_name_thin:
             return f"{self.product_name_thin} {self.product_name_bold}".strip()
         return self.product_name_bold
 
     @computed_field
+    @property
     def price_per_liter(self) -> Optional[float]:
         if self.price is not None and self.volume is not None and self.volume != 0:
             return round(self.price / (self.volume / 1000), 2)
         return None
 
     @computed_field
+    @property
     def alcohol_per_sek(self) -> Optional[float]:
         if (
             all(
@@ -116,6 +119,7 @@ class Systembolagetprodukt(BaseModel):
         return None
 
     @computed_field
+    @property
     def category(self) -> str:
         categories = [
             self.category_level1,
@@ -126,6 +130,7 @@ class Systembolagetprodukt(BaseModel):
         return " > ".join([cat for cat in categories if cat])
 
     @computed_field
+    @property
     def origin(self) -> str:
         origins = [self.country, self.origin_level1, self.origin_level2]
         return ", ".join([origin for origin in origins if origin])
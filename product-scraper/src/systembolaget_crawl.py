@@ -0,0 +1,196 @@
+import asyncio
+import itertools
+import json
+import logging
+import math
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from pydantic import ValidationError
+
+from checkpoint import Checkpoint
+from config import (
+    SYSTEMBOLAGET_CONCURRENCY,
+    SYSTEMBOLAGET_HEADERS,
+    SYSTEMBOLAGET_PAGE_SIZE,
+    SYSTEMBOLAGET_RATE_LIMIT,
+    SYSTEMBOLAGET_SEARCH_URL,
+)
+from fetch import AsyncFetcher, FetchResult
+from metrics import metrics
+from parse import RETRYABLE_STATUSES
+from storage import ProductStore
+from systembolaget import Systembolagetprodukt
+
+logger = logging.getLogger(__name__)
+
+
+def search_url(page: int, page_size: int = SYSTEMBOLAGET_PAGE_SIZE) -> str:
+    return f"{SYSTEMBOLAGET_SEARCH_URL}?page={page}&size={page_size}"
+
+
+class SearchPage(NamedTuple):
+    products: List[Systembolagetprodukt]
+    # Total number of products the search matches, across all pages
+    doc_count: int
+
+
+def parse_search_page(body: bytes) -> SearchPage:
+    """Validate one page of search results, skipping malformed products."""
+    data = json.loads(body)
+    products = []
+    for record in data.get("products") or []:
+        try:
+            products.append(Systembolagetprodukt(**record))
+        except ValidationError as e:
+            logger.warning(
+                f"Skipping invalid Systembolaget product {record.get('productId')}: "
+                f"{e.error_count()} validation errors"
+            )
+    return SearchPage(products, (data.get("metadata") or {}).get("docCount") or 0)
+
+
+class SystembolagetCrawl:
+    """Refresh `systembolaget_products.json` from the paginated search API.
+
+    Search pages play the role product IDs play in the Vinmonopolet crawl:
+    each page is checkpointed once its products are buffered in the store, so
+    an interrupted refresh resumes with the pages it had not finished.
+    """
+
+    def __init__(
+        self,
+        restart: bool,
+        page_size: int = SYSTEMBOLAGET_PAGE_SIZE,
+        deadline: Optional[float] = None,
+    ):
+        self.store = ProductStore("systembolaget_products.json", key="productId")
+        self.checkpoint = Checkpoint("systembolaget_checkpoint.jsonl")
+        self.page_size = page_size
+        self.deadline = deadline
+        self.product_count = 0
+        self.start_time = time.time()
+
+        if restart:
+            self.checkpoint.reset()
+            # Products that left the assortment would otherwise linger
+            self.store.clear()
+
+    def __enter__(self) -> "SystembolagetCrawl":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.store.close()
+        self.checkpoint.close()
+
+    def in_time(self, *_) -> bool:
+        return self.deadline is None or time.time() < self.deadline
+
+    def record(self, result: FetchResult) -> Optional[SearchPage]:
+        page = result.key
+        if result.error is not None:
+            metrics.count("search_pages_total", outcome="failed")
+            self.checkpoint.failed(page, result.error)
+            return None
+        if result.status in RETRYABLE_STATUSES:
+            metrics.count("search_pages_total", outcome="failed")
+            self.checkpoint.failed(page, f"HTTP {result.status}")
+            return None
+        if not result.ok:
+            metrics.count("search_pages_total", outcome="skipped")
+            self.checkpoint.skipped(page, f"HTTP {result.status}")
+            return None
+        try:
+            search_page = parse_search_page(result.body)
+        except json.JSONDecodeError as e:
+            metrics.count("search_pages_total", outcome="failed")
+            self.checkpoint.failed(page, repr(e))
+            return None
+
+        metrics.count("search_pages_total", outcome="stored")
+        with metrics.stage("store"):
+            for product in search_page.products:
+                self.store.append(product)
+        self.product_count += len(search_page.products)
+        self.checkpoint.completed(page, f"{len(search_page.products)} products")
+        return search_page
+
+    def page_count(self, doc_count: int) -> int:
+        return max(1, math.ceil(doc_count / self.page_size))
+
+    async def fetch_pages(
+        self,
+        pages: List[str],
+        concurrency: int = SYSTEMBOLAGET_CONCURRENCY,
+        rate_limit: float = SYSTEMBOLAGET_RATE_LIMIT,
+    ) -> Optional[int]:
+        """Fetch and record `pages`, returning the largest docCount seen."""
+        doc_count = None
+        async with AsyncFetcher(
+            concurrency=concurrency,
+            rate_limit=rate_limit,
+            headers=SYSTEMBOLAGET_HEADERS,
+        ) as fetcher:
+            requests_ = (
+                (page, search_url(int(page), self.page_size))
+                for page in itertools.takewhile(self.in_time, pages)
+            )
+            async for result in fetcher.fetch_many(requests_):
+                search_page = self.record(result)
+                if search_page is not None:
+                    doc_count = max(doc_count or 0, search_page.doc_count)
+                if not self.in_time():
+                    break
+        return doc_count
+
+    def finish(self, pages: Optional[List[str]] = None) -> Dict[str, int]:
+        """Close the refresh; once every one of `pages` is done, the checkpoint
+        is cleared so the next refresh fetches them all again."""
+        self.store.close()
+        summary = self.checkpoint.summary()
+        if pages and self.checkpoint.is_done(pages):
+            self.checkpoint.reset()
+        elapsed_time = time.time() - self.start_time
+        logger.info(
+            f"Systembolaget refresh stored {self.product_count} products in "
+            f"{elapsed_time:.2f} seconds, pages: {summary}"
+        )
+        metrics.write()
+        return summary
+
+
+def refresh_systembolaget(
+    restart: bool = False,
+    concurrency: int = SYSTEMBOLAGET_CONCURRENCY,
+    rate_limit: float = SYSTEMBOLAGET_RATE_LIMIT,
+    deadline: Optional[float] = None,
+    attempts: int = 3,
+) -> Dict[str, int]:
+    """Fetch every search page, `concurrency` at a time, into the product store.
+
+    The first page is fetched on its own to learn how many pages there are.
+    With a `deadline` (a `time.time()` value) no page is requested after it;
+    the unfinished pages are picked up by the next run.
+    """
+    with SystembolagetCrawl(restart, deadline=deadline) as crawl:
+        doc_count = None
+        for attempt in range(1, attempts + 1):
+            doc_count = asyncio.run(crawl.fetch_pages(["1"], 1, rate_limit))
+            if doc_count is not None or not crawl.in_time():
+                break
+            if attempt < attempts:
+                time.sleep(2**attempt)
+        if doc_count is None and not crawl.in_time():
+            logger.info("Time budget spent before the Systembolaget search began")
+            return crawl.finish()
+        if doc_count is None:
+            raise RuntimeError("Failed to fetch the first Systembolaget search page")
+
+        pages = [str(page) for page in range(1, crawl.page_count(doc_count) + 1)]
+        logger.info(f"Systembolaget search lists {doc_count} products")
+        for batch in crawl.checkpoint.rounds(pages, deadline=deadline):
+            logger.info(f"Fetching {len(batch)}/{len(pages)} search pages")
+            asyncio.run(crawl.fetch_pages(batch, concurrency, rate_limit))
+            crawl.store.commit()
+
+        return crawl.finish(pages)
@@ -0,0 +1,191 @@
+import email.utils
+import heapq
+import itertools
+import logging
+import random
+import time
+from datetime import timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Statuses with which a server asks its clients to slow down
+BACKPRESSURE_STATUSES = {429, 503}
+
+# Smoothing of the response latency average
+LATENCY_ALPHA = 0.2
+# Latency below this much above the baseline is noise, not congestion
+LATENCY_SLACK = 0.05
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header: delay-seconds or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, date.timestamp() - time.time())
+
+
+class AimdLimiter:
+    """Number of requests to keep in flight, adapted to what the server tolerates.
+
+    Until the first sign of trouble every healthy response adds one request
+    (slow start, doubling the limit every round trip); after that each adds
+    `increase / limit`, about `increase` per round trip. A 429 or 503, a
+    server error, a failed request, or latency rising well above the best
+    seen, multiplies the limit by `decrease`, at most once per window:
+    responses to requests sent before a cut say nothing about the new limit.
+    A Retry-After header also pauses new requests until it expires.
+
+    Not thread-safe; the scheduler feeds it from one thread.
+    """
+
+    def __init__(
+        self,
+        initial: int = 2,
+        minimum: int = 1,
+        maximum: int = 32,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+        max_pause: float = 300.0,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.max_pause = max_pause
+        # Smoothed response time, and the best it has been
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        # `time.monotonic()` before which no new request should start
+        self.paused_until = 0.0
+        self._slow_start = True
+        self._last_cut = float("-inf")
+
+    @property
+    def concurrency(self) -> int:
+        return int(self.limit)
+
+    def paused(self, now: Optional[float] = None) -> bool:
+        return (time.monotonic() if now is None else now) < self.paused_until
+
+    def record(
+        self,
+        started: float,
+        status: int,
+        elapsed: float,
+        retry_after: Optional[float] = None,
+        error: bool = False,
+    ) -> None:
+        """Adapt to one response; `started` is the request's `time.monotonic()`."""
+        if retry_after is not None:
+            pause = min(retry_after, self.max_pause)
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+        if status in BACKPRESSURE_STATUSES:
+            self._cut(started, self.decrease, f"HTTP {status}")
+            return
+        if error or status >= 500:
+            self._cut(started, self.decrease, f"HTTP {status}" if status else "error")
+            return
+
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += LATENCY_ALPHA * (elapsed - self.latency)
+        if self.baseline is None or self.latency < self.baseline:
+            self.baseline = self.latency
+        else:
+            # Drift up slowly, so a site that got slower for good is not held
+            # to its best minute forever
+            self.baseline += 0.01 * (self.latency - self.baseline)
+
+        if self.latency > self.latency_tolerance * self.baseline + LATENCY_SLACK:
+            self._cut(started, self.decrease, "latency")
+        elif self._slow_start:
+            self.limit = min(self.maximum, self.limit + self.increase)
+        else:
+            self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+
+    def _cut(self, started: float, factor: float, reason: str) -> None:
+        if started < self._last_cut:
+            return
+        self._last_cut = time.monotonic()
+        self._slow_start = False
+        previous = self.concurrency
+        self.limit = max(self.minimum, self.limit * factor)
+        metrics.count("concurrency_cuts_total", reason=reason)
+        if self.concurrency < previous:
+            logger.info(
+                f"Backing off to {self.concurrency} concurrent requests ({reason})"
+            )
+
+
+class RetryQueue:
+    """Failed requests waiting to be retried, ordered by when they are due.
+
+    Each key is retried at most `max_attempts` times, after the server's
+    Retry-After if it sent one and exponential backoff with jitter otherwise.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.attempts: Dict[str, int] = {}
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._order = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(
+        self, key: str, item: Any, retry_after: Optional[float] = None
+    ) -> bool:
+        """Queue `item` for a retry of `key`; False once it is out of attempts,
+        or if the server asked for a longer wait than `backoff_max`."""
+        attempts = self.attempts.get(key, 0) + 1
+        if attempts > self.max_attempts:
+            return False
+        if retry_after is not None and retry_after > self.backoff_max:
+            return False
+        self.attempts[key] = attempts
+        if retry_after is None:
+            delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+            retry_after = delay * random.uniform(0.5, 1.0)
+        ready_at = time.monotonic() + retry_after
+        heapq.heappush(self._heap, (ready_at, next(self._order), item))
+        return True
+
+    def next_ready(self) -> Optional[float]:
+        """`time.monotonic()` at which the next retry is due."""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_ready(self, now: Optional[float] = None) -> Optional[Any]:
+        now = time.monotonic() if now is None else now
+        if self._heap and self._heap[0][0] <= now:
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    def drain(self) -> List[Any]:
+        """Remove and return every queued item, e.g. when the crawl must stop."""
+        items = [entry[2] for entry in sorted(self._heap)]
+        self._heap.clear()
+        return items
@@ -1,8 +1,12 @@
+from dataclasses import dataclass
 from pydantic import BaseModel, Field, ConfigDict, computed_field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import re
 from humps import camelize
 
+_SIZE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(cl|ml|l)")
+_SIZE_UNITS = {"cl": 100, "ml": 1000, "l": 1}
+
 
 def to_camel(string: str) -> str:
     return camelize(string)
@@ -17,7 +21,25 @@ class BaseModelCamel(BaseModel):
     )
 
     def model_dump_json(self, **kwargs):
-        return super().model_dump_json(by_alias=True, **kwargs)
+        kwargs.setdefault("by_alias", True)
+        return super().model_dump_json(**kwargs)
+
+
+def parse_size(size: str) -> float:
+    """Parse a size string like '75 cl' and return volume in liters."""
+    match = _SIZE.fullmatch(size.lower())
+    if not match:
+        raise ValueError(
+            f"Unable to parse size '{size}'. Expected format: '<amount> <unit>' where unit is one of 'cl', 'ml', 'l'."
+        )
+
+    amount, unit = match.groups()
+    return float(amount.replace(",", ".")) / _SIZE_UNITS[unit]
+
+
+def parse_abv(readable_value: str) -> float:
+    """Parse an alcohol trait like '12,5 prosent' into a percentage."""
+    return float(readable_value.rstrip(" prosent").replace(",", "."))
 
 
 class Characteristic(BaseModelCamel):
@@ -151,24 +173,7 @@ class VinmonopolProduct(BaseModelCamel):
 
     def _parse_size(self) -> float:
         """Parse the size string and return volume in liters."""
-        size = self.volume.formatted_value
-        match = re.fullmatch(r"(\d+(?:[.,]\d+)?)\s*(cl|ml|l)", size.lower())
-        if not match:
-            raise ValueError(
-                f"Unable to parse size '{size}'. Expected format: '<amount> <unit>' where unit is one of 'cl', 'ml', 'l'."
-            )
-
-        amount, unit = match.groups()
-        amount = float(amount.replace(",", "."))
-
-        if unit == "cl":
-            return amount / 100
-        elif unit == "ml":
-            return amount / 1000
-        elif unit == "l":
-            return amount
-        else:
-            raise ValueError(f"Unknown unit: {unit}")
+        return parse_size(self.volume.formatted_value)
 
     @computed_field
     @property
@@ -187,9 +192,7 @@ class VinmonopolProduct(BaseModelCamel):
             (trait for trait in self.content.traits if trait.name == "Alkohol"), None
         )
         if alcohol_trait:
-            abv = float(
-                alcohol_trait.readable_value.rstrip(" prosent").replace(",", ".")
-            )
+            abv = parse_abv(alcohol_trait.readable_value)
             return round((abv / 100) * (self.parsed_size * 1000) / self.price.value, 6)
         return None
 
@@ -197,3 +200,70 @@ class VinmonopolProduct(BaseModelCamel):
     @property
     def absolute_url(self) -> str:
         return f"https://www.vinmonopolet.no{self.url}"
+
+
+@dataclass(frozen=True, slots=True)
+class ProductRecord:
+    """Read-only view of a product we stored ourselves.
+
+    Built straight from the stored dict without validating the nested
+    submodels, so it is only meant for data written by `VinmonopolProduct`.
+    Freshly scraped pages still go through the full model.
+    """
+
+    code: str
+    name: str
+    main_category: str
+    main_country: Optional[str]
+    main_producer: str
+    price: float
+    size: str
+    parsed_size: float
+    price_per_liter: float
+    alcohol_percentage: Optional[float]
+    alcohol_per_nok: Optional[float]
+    expired: bool
+    buyable: bool
+    status: str
+    product_selection: str
+    year: Optional[str]
+    url: str
+
+    @classmethod
+    def from_stored(cls, record: Dict[str, Any]) -> "ProductRecord":
+        alcohol = next(
+            (t for t in record["content"]["traits"] if t["name"] == "Alkohol"), None
+        )
+        size = record["volume"]["formattedValue"]
+        price = record["price"]["value"]
+        # Derived fields are stored alongside the data; only recompute them
+        # for records written before they existed
+        parsed_size = record.get("parsedSize") or parse_size(size)
+        abv = parse_abv(alcohol["readableValue"]) if alcohol else None
+        alcohol_per_nok = record.get("alcoholPerNok")
+        if "alcoholPerNok" not in record and abv is not None:
+            alcohol_per_nok = round((abv / 100) * (parsed_size * 1000) / price, 6)
+        return cls(
+            code=record["code"],
+            name=record["name"],
+            main_category=record["mainCategory"]["name"],
+            main_country=(record.get("mainCountry") or {}).get("name"),
+            main_producer=record["mainProducer"]["name"],
+            price=price,
+            size=size,
+            parsed_size=parsed_size,
+            price_per_liter=record.get("pricePerLiter")
+            or round(price / parsed_size, 2),
+            alcohol_percentage=abv,
+            alcohol_per_nok=alcohol_per_nok,
+            expired=record["expired"],
+            buyable=record["buyable"],
+            status=record["status"],
+            product_selection=record["productSelection"],
+            year=record.get("year"),
+            url=record["url"],
+        )
+
+    @property
+    def absolute_url(self) -> str:
+        return f"https://www.vinmonopolet.no{self.url}"